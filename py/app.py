@@ -1,11 +1,12 @@
 # py/app.py
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import numpy as np
 import traceback
 import datetime
 import os
+import sys
 import json
 import asyncio
 
@@ -13,12 +14,28 @@ import asyncio
 LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "log")
 
 # --- 2. AI 모듈 및 워크플로우 임포트 (수정됨) ---
+# startup 은 import 타이머를 설치하므로 다른 모듈보다 먼저 import 합니다.
+from startup import lazy_import, startup_report
+
 try:
     from gemini_ai import initialize_ai_client, get_embedding_for_text, get_embeddings_batch, query_gemini, query_gemini_with_history, execute_simple_task, DEFAULT_GEMINI_MODEL
+    from gemini_ai import stream_gemini, stream_gemini_with_history, build_task_prompt
     print("'gemini_ai.py' 모듈 로드 성공.")
-    
-    from rag_workflow import build_rag_workflow
-    print("'rag_workflow.py' 모듈 로드 성공.")
+
+    # rag_workflow (langchain, langgraph, chromadb) 는 /api/rag_chat 첫 호출 시 지연 로드합니다.
+
+    from embedding_codec import negotiate_format, encode_embeddings, dumps as dumps_json
+    import warmup
+    from chat_sessions import SESSION_STORE
+    from rate_limiter import RATE_LIMITER, estimate_tokens
+    from model_router import MODEL_ROUTER, route_model
+    from map_reduce import is_long_input, stream_long_task
+    from keyword_extractor import extract_keywords_text, bulk_extract
+    from vector_quant import get_vector_store
+    from embedding_providers import get_embedding_provider
+    from kv_cache import content_hash
+    import worker_pool
+    import gemini_ai
     
 except ImportError as e:
     print(f"CRITICAL - 모듈 import 실패: {e}")
@@ -28,6 +45,26 @@ except ImportError as e:
 app = Flask(__name__)
 CORS(app)
 
+GRAPH_SIMILARITY_THRESHOLD = 0.75
+
+@app.before_request
+def sync_worker_state():
+    # 다중 워커 모드: 다른 워커가 받은 /api/initialize 의 API 키를 이 워커에도 반영합니다.
+    state = worker_pool.poll_state()
+    if state and state.get('api_key') and state['api_key'] != gemini_ai.GEMINI_API_KEY:
+        os.environ['GOOGLE_API_KEY'] = state['api_key']
+        warmup.reset()
+        if initialize_ai_client(state['api_key']):
+            warmup.start_warmup_async()
+    # 다른 워커가 Chroma 에 커밋했으면 이 워커의 컬렉션을 다시 열어 최신 색인을 검색합니다.
+    rag_workflow = sys.modules.get("rag_workflow")
+    if rag_workflow is not None:
+        rag_workflow.sync_index_generation()
+
+def get_rag_workflow():
+    # 컴파일된 그래프는 rag_workflow 안에서 캐시되어 요청 간에 재사용됩니다.
+    return lazy_import("rag_workflow").get_compiled_workflow()
+
 # --- 4. 유틸리티 함수: 로깅 (변경 없음) ---
 def log_api_interaction(log_data):
     try:
@@ -43,6 +80,20 @@ def log_api_interaction(log_data):
 def home():
     return jsonify({"message": "Gemini AI Python 백엔드 서버가 실행 중입니다.", "status": "ok"})
 
+@app.route('/api/startup-report')
+def get_startup_report():
+    return jsonify(startup_report())
+
+@app.route('/api/model-stats')
+def get_model_stats():
+    # 라우팅 테이블 튜닝용: 모델별 지연(p50/p95)과 리미터 상태
+    stats = {"latency": MODEL_ROUTER.stats(), "rate_limits": RATE_LIMITER.stats()}
+    rag_workflow = sys.modules.get("rag_workflow")
+    if rag_workflow is not None:
+        # 추측 답변 생성의 적중률/절약 시간 (RAG_SPECULATIVE_ANSWERS 튜닝용)
+        stats["speculation"] = rag_workflow.speculation_stats()
+    return jsonify(stats)
+
 @app.route('/api/initialize', methods=['POST'])
 def initialize_ai():
     data = request.json
@@ -52,19 +103,46 @@ def initialize_ai():
         return jsonify({'error': 'api_key가 필요합니다.'}), 400
     
     os.environ['GOOGLE_API_KEY'] = api_key
+    warmup.reset()
         
     success = initialize_ai_client(api_key)
     
     if success:
+        worker_pool.publish_state(api_key=api_key)
+        # ✨ 첫 채팅 지연을 없애기 위해 백그라운드에서 워밍업 시작
+        warmup.start_warmup_async()
         return jsonify({'message': 'AI 클라이언트가 성공적으로 초기화되었습니다.'}), 200
     else:
         return jsonify({'error': 'AI 클라이언트 초기화에 실패했습니다.'}), 500
 
+@app.route('/api/index-status')
+def index_status():
+    # 백그라운드 색인 큐 상태: 커밋된 색인 버전, 대기 중인 노트 수 등
+    rag_workflow = sys.modules.get("rag_workflow")
+    if rag_workflow is None:
+        return jsonify({"loaded": False})
+    return jsonify({"loaded": True, **rag_workflow.get_ingest_queue().stats()})
+
+@app.route('/api/warmup', methods=['POST'])
+def api_warmup():
+    status = warmup.run_warmup()
+    return jsonify(status), (200 if status['ready'] else 503)
+
+@app.route('/ready')
+def ready():
+    status = warmup.readiness()
+    return jsonify(status), (200 if status['ready'] else 503)
+
 @app.route('/api/rag_chat', methods=['POST'])
 def rag_chat():
     data = request.json
     if not data or 'query' not in data or 'notes' not in data or 'edges' not in data:
         return jsonify({'error': '잘못된 요청. query, notes, edges가 필요합니다.'}), 400
+    try:
+        # 요청 전체의 마감 시각 (timeout_seconds 는 서버 설정 범위 안으로 맞춤)
+        deadline = lazy_import("rag_workflow").new_deadline(data.get('timeout_seconds'))
+    except ValueError as e:
+        return jsonify({'error': f'잘못된 요청. {e}'}), 400
 
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
@@ -72,7 +150,7 @@ def rag_chat():
     result = {}
 
     try:
-        rag_app = build_rag_workflow()
+        rag_app = get_rag_workflow()
         
         # ✨ messages(대화 기록) 추출
         messages = data.get('messages', [])
@@ -82,6 +160,7 @@ def rag_chat():
             "notes": data['notes'],
             "edges": data['edges'],
             "messages": messages,  # ✨ 대화 기록 추가
+            "deadline": deadline,
         }
         result = rag_app.invoke(inputs)
         
@@ -90,12 +169,17 @@ def rag_chat():
             "api_endpoint": "/api/rag_chat",
             "input_query": data['query'],
             "output_answer": result.get('answer', 'N/A'),
-            "final_context": result.get('final_context', 'N/A')
+            "final_context": result.get('final_context', 'N/A'),
+            "routing": result.get('routing'),  # 건너뛴 LLM 단계와 그 근거
+            "skipped_stages": result.get('skipped_stages', []),
+            "partial": result.get('partial', False)
         })
         
         return jsonify({
             'result': result.get('answer'),
-            'sources': result.get('sources')
+            'sources': result.get('sources'),
+            'skipped_stages': result.get('skipped_stages', []),
+            'partial': result.get('partial', False)
         })
         
     except Exception as e:
@@ -123,12 +207,11 @@ def get_embeddings():
             return jsonify({"error": "잘못된 형식의 데이터입니다."}), 400
         contents = [note.get('content', '') for note in notes_data]
         file_names = [note.get('fileName', '') for note in notes_data]
-        vectors = get_embeddings_batch(contents)
-        embeddings_map = {
-            file_names[i]: vectors[i]
-            for i in range(len(file_names)) if vectors[i]
-        }
-        return jsonify(embeddings_map)
+        vectors = get_embedding_provider().embed_documents(contents)
+        # ✨ ?format=f16 또는 Accept: application/vnd.memordo.embeddings+f16 로 압축 포맷 선택 (기본값 json)
+        fmt = negotiate_format(request.args.get('format'), request.headers.get('Accept'))
+        payload = encode_embeddings(file_names, vectors, fmt)
+        return Response(dumps_json(payload), mimetype='application/json')
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -144,11 +227,20 @@ def api_execute_task():
             return jsonify({"error": "필수 파라미터 누락"}), 400
         
         if task_type == 'chat':
+            # ✨ conversation_id 키가 있으면 서버 측 세션 사용 (클라이언트는 새 메시지만 전송)
+            #    첫 요청은 null 로 보내면 새 id 가 발급되고, 세션이 없으면 messages 로 복원합니다.
+            if 'conversation_id' in data:
+                session = SESSION_STORE.get_or_create(data.get('conversation_id'), seed_messages=messages)
+                result_text = SESSION_STORE.send(session, user_input_ko)
+                return jsonify({"result": result_text, "conversation_id": session.conversation_id})
             # ✨ 대화 기록이 있으면 query_gemini_with_history 사용
             if messages:
                 result_text = query_gemini_with_history(user_input_ko, messages)
             else:
                 result_text = query_gemini(user_input_ko)
+        elif task_type == 'keyword' and not data.get('use_llm'):
+            # ✨ 기본은 로컬 TF-IDF 추출 (API 호출 없음). use_llm=true 이면 기존 LLM 경로 사용
+            result_text = extract_keywords_text(user_input_ko, doc_id=data.get('fileName'))
         elif task_type in ['summarize', 'memo', 'keyword']:
             result_text = execute_simple_task(task_type, user_input_ko)
         else:
@@ -161,27 +253,113 @@ def api_execute_task():
         traceback.print_exc()
         return jsonify({"error": "서버 내부 오류 발생"}), 500
 
+@app.route('/api/execute_task/stream', methods=['POST'])
+def api_execute_task_stream():
+    """
+    /api/execute_task 의 스트리밍 버전입니다.
+    Accept: text/event-stream 이면 SSE, 그 외에는 줄 단위 JSON(NDJSON)으로 조각을 보냅니다.
+    각 이벤트는 {"delta": "..."} 이고 마지막에 {"done": true, "result": "..."} 또는 {"error": "..."} 가 옵니다.
+    긴 입력의 요약/메모/키워드는 /api/execute_task 와 같은 map-reduce 경로로 처리하며, 먼저 조각 요약 진행 상황을
+    {"progress": {"stage": "map"|"reduce", "level", "done", "total"}} 로 보낸 뒤 마지막 단계의 응답을 스트리밍합니다.
+    """
+    data = request.get_json()
+    task_type = data.get('task_type') if data else None
+    user_input_ko = data.get('text') if data else None
+    messages = data.get('messages', []) if data else []
+
+    if not task_type or user_input_ko is None:
+        return jsonify({"error": "필수 파라미터 누락"}), 400
+    if task_type != 'chat' and task_type not in ['summarize', 'memo', 'keyword']:
+        return jsonify({"error": f"지원하지 않는 task_type: {task_type}"}), 400
+
+    use_sse = 'text/event-stream' in request.headers.get('Accept', '')
+    # waitress 는 channel_request_lookahead > 0 일 때 연결 종료 여부를 확인하는 함수를 environ 에 넣어줍니다.
+    client_disconnected = request.environ.get('waitress.client_disconnected')
+    extra = {}
+
+    if task_type == 'chat' and 'conversation_id' in data:
+        session = SESSION_STORE.get_or_create(data.get('conversation_id'), seed_messages=messages)
+        extra['conversation_id'] = session.conversation_id
+        pieces = SESSION_STORE.stream(session, user_input_ko, client_disconnected)
+    elif task_type == 'chat' and messages:
+        pieces = stream_gemini_with_history(user_input_ko, messages, client_disconnected)
+    elif task_type == 'chat':
+        pieces = stream_gemini(user_input_ko, client_disconnected)
+    elif task_type == 'keyword' and not data.get('use_llm'):
+        pieces = iter([extract_keywords_text(user_input_ko, doc_id=data.get('fileName'))])
+    elif is_long_input(user_input_ko):
+        pieces = stream_long_task(task_type, user_input_ko, client_disconnected)
+    else:
+        prompt = build_task_prompt(task_type, user_input_ko)
+        pieces = stream_gemini(prompt, client_disconnected, model_name=route_model(task_type, estimate_tokens(prompt)))
+
+    def encode(event: dict) -> str:
+        body = json.dumps(event, ensure_ascii=False)
+        return f"data: {body}\n\n" if use_sse else body + "\n"
+
+    def generate():
+        collected = []
+        try:
+            for piece in pieces:
+                if isinstance(piece, dict):  # map-reduce 진행 이벤트
+                    yield encode({"progress": piece})
+                    continue
+                collected.append(piece)
+                yield encode({"delta": piece})
+            yield encode({"done": True, "result": "".join(collected).strip(), **extra})
+        except Exception as e:
+            print(f"'/api/execute_task/stream'에서 에러 발생: {e}")
+            traceback.print_exc()
+            yield encode({"error": f"Error: {type(e).__name__} - {e}", **extra})
+        finally:
+            # 클라이언트가 연결을 끊으면 WSGI 서버가 이 제너레이터를 닫고, 그 종료가 Gemini 스트림 취소로 전파됩니다.
+            if hasattr(pieces, 'close'):
+                pieces.close()
+
+    mimetype = 'text/event-stream' if use_sse else 'application/x-ndjson'
+    return Response(stream_with_context(generate()), mimetype=mimetype,
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/keywords/bulk', methods=['POST'])
+def api_bulk_keywords():
+    """[{fileName, content}] 전체를 코퍼스 색인에 반영하고 노트별 `키워드: 점수` 결과를 반환합니다 (API 호출 없음)."""
+    try:
+        notes_data = request.get_json()
+        if not notes_data or not isinstance(notes_data, list):
+            return jsonify({"error": "잘못된 형식의 데이터입니다."}), 400
+        top_k = request.args.get('top_k', default=5, type=int)
+        return jsonify(bulk_extract(notes_data, top_k=top_k))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/chat_session/<conversation_id>', methods=['DELETE'])
+def delete_chat_session(conversation_id):
+    if SESSION_STORE.drop(conversation_id):
+        return jsonify({"message": "세션이 삭제되었습니다."})
+    return jsonify({"error": "세션을 찾을 수 없습니다."}), 404
+
 @app.route('/api/generate-graph-data', methods=['POST'])
 def generate_graph_data():
     try:
         notes_data = request.get_json()
         if not notes_data: return jsonify({"error": "데이터 없음"}), 400
-        embeddings = {}
-        for note in notes_data:
-            file_name, content = note.get('fileName'), note.get('content')
-            if file_name and content:
-                vector = get_embedding_for_text(content)
-                if vector: embeddings[file_name] = vector
-        if not embeddings: return jsonify({"nodes": [], "edges": []})
-        nodes = [{"id": fn} for fn in embeddings.keys()]
-        edges = []
-        file_names = list(embeddings.keys())
-        for i in range(len(file_names)):
-            for j in range(i + 1, len(file_names)):
-                v_a, v_b = np.array(embeddings[file_names[i]]), np.array(embeddings[file_names[j]])
-                cos_sim = np.dot(v_a, v_b) / (np.linalg.norm(v_a) * np.linalg.norm(v_b))
-                if cos_sim > 0.75:
-                    edges.append({"from": file_names[i], "to": file_names[j], "similarity": cos_sim})
+        notes = {note['fileName']: note['content'] for note in notes_data if note.get('fileName') and note.get('content')}
+        # ✨ 임베딩은 내용 해시로 양자화 저장소에 캐시하고, 바뀐 노트만 배치로 새로 임베딩합니다.
+        store = get_vector_store()
+        provider = get_embedding_provider()
+        file_names = list(notes)
+        keys = [content_hash(provider.key, notes[fn]) for fn in file_names]
+        cached = store.get_quantized(keys)
+        missing = [(key, notes[fn]) for fn, key in zip(file_names, keys) if key not in cached]
+        if missing:
+            vectors = provider.embed_documents([content for _, content in missing])
+            store.put_many({key: vector for (key, _), vector in zip(missing, vectors)})
+
+        matrix = store.load_matrix(file_names, keys)
+        if not matrix.ids: return jsonify({"nodes": [], "edges": []})
+        nodes = [{"id": fn} for fn in matrix.ids]
+        # 양자화 벡터로 모든 쌍을 블록 단위로 계산하고, 원래 정밀도 벡터를 저장해 둔 경우(EMBEDDING_STORE_FULL=1) 임계값 근처 쌍만 다시 확인합니다.
+        edges = [{"from": a, "to": b, "similarity": sim} for a, b, sim in matrix.pairs_above(GRAPH_SIMILARITY_THRESHOLD)]
         return jsonify({"nodes": nodes, "edges": edges})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
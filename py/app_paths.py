@@ -0,0 +1,20 @@
+# py/app_paths.py
+
+import os
+import platform
+from pathlib import Path
+
+
+def get_notes_dir() -> Path:
+    """실행 중인 OS를 감지하여 Memordo 노트 폴더 경로를 반환합니다."""
+    home_dir = Path.home()
+    if platform.system() == "Darwin": # macOS
+        return home_dir / "Memordo_Notes"
+    return home_dir / "Documents" / "Memordo_Notes" # Windows, Linux 등
+
+
+def get_cache_dir() -> str:
+    """요약/키워드/번역 등 로컬 캐시를 저장할 디렉토리를 반환합니다 (MEMORDO_CACHE_DIR 로 변경 가능)."""
+    cache_dir = os.getenv("MEMORDO_CACHE_DIR") or str(get_notes_dir() / "cache")
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
@@ -0,0 +1,100 @@
+# py/bench_chunking.py
+"""
+text_chunker 의 청킹 처리량(MB/초)과 청크 크기 분포를 이전 방식(글자 단위로 문장을 이어 붙이던 청킹)과 비교합니다.
+
+사용법:
+    python bench_chunking.py                        # 1/4/16MB 합성 마크다운 문서
+    python bench_chunking.py --sizes 8 --max-tokens 256 --overlap 32
+    python bench_chunking.py --file ../Doc/big.md   # 실제 문서로 측정
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from text_chunker import chunk_text, estimate_tokens, iter_file_chunks
+
+WORDS = ["문서", "검색", "임베딩", "번역", "모델", "데이터", "결과", "청크", "속도", "메모리", "설정", "파일",
+         "index", "vector", "query", "cache", "batch", "token"]
+ENDINGS = ["입니다.", "합니다.", "했다.", "이다", "하나요?", "됩니다!", "있어요."]
+
+
+def synthetic_markdown(megabytes: float, seed: int) -> str:
+    rng = random.Random(seed)
+    target = int(megabytes * 1024 * 1024)
+    parts, size = [], 0
+    while size < target:
+        section = [f"## {rng.choice(WORDS)} {rng.choice(WORDS)} 정리", ""]
+        for _ in range(rng.randint(2, 5)):
+            sentences = [" ".join(rng.choices(WORDS, k=rng.randint(4, 14))) + " " + rng.choice(ENDINGS)
+                         for _ in range(rng.randint(2, 8))]
+            section.append(" ".join(sentences))
+            section.append("")
+        section += [f"- {' '.join(rng.choices(WORDS, k=rng.randint(3, 8)))}" for _ in range(rng.randint(0, 4))]
+        if rng.random() < 0.3:
+            section += ["", "```python", "for item in batch:", "    index.add(item)", "```"]
+        text = "\n".join(section) + "\n\n"
+        parts.append(text)
+        size += len(text.encode("utf-8"))
+    return "".join(parts)
+
+
+def legacy_chunk(text: str, sentences_per_chunk: int = 7) -> list[str]:
+    """비교 기준: 이전 trans-ai.py 의 chunk_text_by_sentences (글자 단위 누적, 문장 수 고정)."""
+    sentences, current = [], ""
+    for char in text:
+        current += char
+        if char in ".!?\n":
+            if current.strip():
+                sentences.append(current.strip())
+            current = ""
+    if current.strip():
+        sentences.append(current.strip())
+    return [" ".join(sentences[i:i + sentences_per_chunk]) for i in range(0, len(sentences), sentences_per_chunk)]
+
+
+def measure(name: str, megabytes: float, fn):
+    started = time.perf_counter()
+    chunks = list(fn())
+    elapsed = time.perf_counter() - started
+    tokens = sorted(estimate_tokens(chunk) for chunk in chunks) or [0]
+    print(f"{name:<8} {megabytes:>6.1f} {elapsed * 1000:>9.0f} {megabytes / elapsed:>8.2f} {len(chunks):>8} "
+          f"{sum(tokens) / len(tokens):>8.1f} {tokens[len(tokens) // 2]:>6} {tokens[-1]:>6}")
+
+
+def run(path: str, max_tokens: int, overlap: int):
+    megabytes = os.path.getsize(path) / (1024 * 1024)
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    measure("legacy", megabytes, lambda: legacy_chunk(text))
+    measure("string", megabytes, lambda: chunk_text(text, max_tokens, overlap))
+    measure("stream", megabytes, lambda: iter_file_chunks(path, False, max_tokens, overlap))
+    measure("mmap", megabytes, lambda: iter_file_chunks(path, True, max_tokens, overlap))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="문서 청킹 처리량 벤치마크")
+    parser.add_argument("--file", help="측정할 마크다운 파일 (없으면 합성 문서 사용)")
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 4, 16], help="합성 문서 크기(MB)")
+    parser.add_argument("--max-tokens", type=int, default=200)
+    parser.add_argument("--overlap", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"max_tokens={args.max_tokens} overlap={args.overlap}")
+    print(f"{'method':<8} {'MB':>6} {'ms':>9} {'MB/s':>8} {'chunks':>8} {'avg tok':>8} {'p50':>6} {'max':>6}")
+    if args.file:
+        run(args.file, args.max_tokens, args.overlap)
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        for megabytes in args.sizes:
+            path = os.path.join(tmp, f"synthetic_{megabytes}mb.md")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(synthetic_markdown(megabytes, args.seed))
+            run(path, args.max_tokens, args.overlap)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# py/bench_embeddings.py
+"""
+축소 차원 / 양자화 저장 방식의 검색 품질과 메모리/디스크 사용량을 원래 정밀도(float32, 전체 차원)와 비교합니다.
+mem/vec 는 메모리의 양자화 행렬 크기, disk/vec 는 VectorStore(SQLite)에 실제로 저장했을 때 노트 하나의 크기이고
+(키, 페이지 오버헤드 포함, rescore=True 는 float32 벡터도 저장), vs f32 는 전체 차원 float32 JSON 저장 대신 쓰는 디스크 비율입니다.
+
+사용법:
+    python bench_embeddings.py                       # 합성 데이터 (클러스터형 768차원 벡터)
+    python bench_embeddings.py --vectors notes.npy   # 실제 임베딩 행렬 (n, d) 로 측정
+    python bench_embeddings.py --dims 768 256 128 --k 10
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+
+from kv_cache import content_hash
+from vector_quant import QuantizedMatrix, VectorStore, normalize_rows, reduce_dimension
+
+
+def synthetic_vectors(n: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """앞쪽 차원일수록 분산이 큰 (Matryoshka 임베딩과 비슷한) 클러스터형 벡터를 만듭니다."""
+    rng = np.random.default_rng(seed)
+    decay = 1.0 / np.sqrt(1.0 + np.arange(dim) / 64.0)
+    centers = rng.normal(size=(clusters, dim)) * decay
+    labels = rng.integers(0, clusters, size=n)
+    vectors = centers[labels] + rng.normal(scale=0.6, size=(n, dim)) * decay
+    return normalize_rows(vectors.astype(np.float32))
+
+
+def exact_top_k(corpus: np.ndarray, queries: np.ndarray, k: int) -> list[set]:
+    scores = queries @ corpus.T
+    return [set(np.argpartition(-row, k - 1)[:k].tolist()) for row in scores]
+
+
+def recall_at_k(truth: list[set], found: list[list[str]]) -> float:
+    hits = sum(len(expected & {int(doc_id) for doc_id in result}) for expected, result in zip(truth, found))
+    return hits / sum(len(expected) for expected in truth)
+
+
+def disk_bytes_per_vector(tmp: str, ids: list[str], vectors: np.ndarray, tier: str, store_full: bool) -> float:
+    store = VectorStore(os.path.join(tmp, f"{tier}_{vectors.shape[1]}_{int(store_full)}.sqlite3"), tier, store_full)
+    keys = [content_hash(doc_id) for doc_id in ids]  # 실제 저장소와 같은 64자 해시 키
+    for start in range(0, len(ids), 1000):
+        store.put_many(dict(zip(keys[start:start + 1000], vectors[start:start + 1000])))
+    return store.nbytes_per_row()
+
+
+def run(corpus: np.ndarray, queries: np.ndarray, dims: list[int], k: int, tmp: str):
+    full_dim = corpus.shape[1]
+    truth = exact_top_k(normalize_rows(corpus), normalize_rows(queries), k)
+    ids = [str(i) for i in range(len(corpus))]
+    # 비교 기준: 전체 차원 float32 를 VectorStore 에 저장했을 때의 노트당 크기
+    baseline_disk = disk_bytes_per_vector(tmp, ids, corpus, "f32", False)
+
+    print(f"corpus={len(corpus)} queries={len(queries)} dim={full_dim} k={k} baseline disk/vec={baseline_disk:.0f}")
+    print(f"{'dim':>5} {'tier':>4} {'rescore':>7} {'recall@k':>9} {'mem/vec':>8} {'disk/vec':>9} {'vs f32':>7} "
+          f"{'ms/query':>9}")
+    for dim in dims:
+        reduced = np.asarray([reduce_dimension(vec, dim) for vec in corpus], dtype=np.float32) \
+            if dim < full_dim else corpus
+        reduced_queries = np.asarray([reduce_dimension(vec, dim) for vec in queries], dtype=np.float32) \
+            if dim < full_dim else queries
+        # 재채점은 같은 축소 차원의 float32 벡터로 합니다 (EMBEDDING_STORE_FULL=1 일 때 저장소의 full 열과 동일).
+        full_lookup = lambda doc_ids, reduced=reduced: {doc_id: reduced[int(doc_id)] for doc_id in doc_ids}
+        for tier in ("f32", "f16", "i8"):
+            for rescore in ((False, True) if tier != "f32" else (False,)):
+                matrix = QuantizedMatrix.from_vectors(ids, reduced, tier, full_lookup if rescore else None)
+                started = time.perf_counter()
+                found = [[doc_id for doc_id, _ in matrix.search(query, k, rescore=rescore)] for query in reduced_queries]
+                elapsed_ms = (time.perf_counter() - started) * 1000 / len(reduced_queries)
+                per_vector = matrix.nbytes() / len(ids)
+                disk = disk_bytes_per_vector(tmp, ids, reduced, tier, rescore)
+                print(f"{dim:>5} {tier:>4} {str(rescore):>7} {recall_at_k(truth, found):>9.3f} "
+                      f"{per_vector:>8.0f} {disk:>9.0f} {baseline_disk / disk:>6.1f}x {elapsed_ms:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="임베딩 축소/양자화 recall@k 벤치마크")
+    parser.add_argument("--vectors", help="(n, d) float 임베딩 행렬 .npy 파일 (없으면 합성 데이터 사용)")
+    parser.add_argument("--n", type=int, default=20000, help="합성 데이터 문서 수")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dims", type=int, nargs="+", default=[768, 512, 256, 128])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.vectors:
+        vectors = np.load(args.vectors).astype(np.float32)
+        rng = np.random.default_rng(args.seed)
+        query_idx = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+        # 질의 벡터는 코퍼스에서 뽑아 약간의 잡음을 더해, 자기 자신만 찾는 상황을 피합니다.
+        queries = vectors[query_idx] + rng.normal(scale=0.01, size=(len(query_idx), vectors.shape[1]))
+        corpus = vectors
+    else:
+        data = synthetic_vectors(args.n + args.queries, 768, clusters=max(8, args.n // 200), seed=args.seed)
+        corpus, queries = data[:args.n], data[args.n:]
+
+    dims = [dim for dim in args.dims if dim <= corpus.shape[1]]
+    with tempfile.TemporaryDirectory() as tmp:
+        run(corpus, queries.astype(np.float32), dims, args.k, tmp)
+
+
+if __name__ == "__main__":
+    main()
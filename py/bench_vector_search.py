@@ -0,0 +1,111 @@
+# py/bench_vector_search.py
+"""
+정확 검색 색인(flat_index.FlatIndex)과 Chroma(HNSW)의 검색 지연과 recall@k 를 비교합니다.
+recall 기준은 numpy 전수 계산 결과입니다.
+
+사용법:
+    python bench_vector_search.py                      # 5천/2만/5만 문서, 768차원 합성 데이터
+    python bench_vector_search.py --sizes 1000 10000 --dim 384 --queries 200
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+import numpy as np
+
+from flat_index import FlatIndex
+
+
+def make_data(n: int, dim: int, queries: int, seed: int):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(8, n // 250), dim))
+    corpus = centers[rng.integers(0, len(centers), n)] + rng.normal(scale=0.7, size=(n, dim))
+    query = centers[rng.integers(0, len(centers), queries)] + rng.normal(scale=0.7, size=(queries, dim))
+    corpus /= np.linalg.norm(corpus, axis=1, keepdims=True)
+    query /= np.linalg.norm(query, axis=1, keepdims=True)
+    return corpus.astype(np.float32), query.astype(np.float32)
+
+
+def exact_ids(corpus: np.ndarray, queries: np.ndarray, k: int) -> list[set]:
+    scores = queries @ corpus.T
+    return [set(np.argpartition(-row, k - 1)[:k].tolist()) for row in scores]
+
+
+def recall(truth: list[set], found: list[list[int]]) -> float:
+    return sum(len(t & set(f)) for t, f in zip(truth, found)) / sum(len(t) for t in truth)
+
+
+def timed_queries(search, queries) -> tuple[list, list[float]]:
+    results, latencies = [], []
+    for query in queries:
+        started = time.perf_counter()
+        results.append(search(query))
+        latencies.append((time.perf_counter() - started) * 1000)
+    return results, latencies
+
+
+def summarize(name: str, n: int, open_ms: float, latencies: list[float], rec: float):
+    ordered = sorted(latencies)
+    p50 = ordered[len(ordered) // 2]
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f"{name:<8} {n:>7} {open_ms:>9.1f} {p50:>8.2f} {p95:>8.2f} {rec:>9.3f}")
+
+
+def bench_flat(directory: str, corpus, queries, k: int):
+    FlatIndex(directory).upsert([str(i) for i in range(len(corpus))], corpus)
+    started = time.perf_counter()
+    index = FlatIndex(directory)  # 요청 처리 프로세스가 색인을 처음 여는 비용
+    open_ms = (time.perf_counter() - started) * 1000
+    results, latencies = timed_queries(lambda q: [int(doc_id) for doc_id, _ in index.search(q, k)], queries)
+    return open_ms, results, latencies
+
+
+def bench_chroma(directory: str, corpus, queries, k: int):
+    import chromadb
+
+    client = chromadb.PersistentClient(path=directory)
+    collection = client.create_collection("bench", metadata={"hnsw:space": "cosine"})
+    for start in range(0, len(corpus), 5000):
+        end = min(len(corpus), start + 5000)
+        collection.add(ids=[str(i) for i in range(start, end)], embeddings=corpus[start:end].tolist())
+    del collection, client
+
+    started = time.perf_counter()
+    collection = chromadb.PersistentClient(path=directory).get_collection("bench")
+    collection.query(query_embeddings=[queries[0].tolist()], n_results=k)  # HNSW 로드 포함
+    open_ms = (time.perf_counter() - started) * 1000
+    results, latencies = timed_queries(
+        lambda q: [int(doc_id) for doc_id in collection.query(query_embeddings=[q.tolist()], n_results=k)["ids"][0]],
+        queries)
+    return open_ms, results, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="정확 검색 vs Chroma HNSW 벤치마크")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5000, 20000, 50000])
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'backend':<8} {'docs':>7} {'open_ms':>9} {'p50_ms':>8} {'p95_ms':>8} {'recall@k':>9}")
+    for n in args.sizes:
+        corpus, queries = make_data(n, args.dim, args.queries, args.seed)
+        truth = exact_ids(corpus, queries, args.k)
+        workdir = tempfile.mkdtemp(prefix="memordo-bench-")
+        try:
+            open_ms, results, latencies = bench_flat(f"{workdir}/flat", corpus, queries, args.k)
+            summarize("flat", n, open_ms, latencies, recall(truth, results))
+            try:
+                open_ms, results, latencies = bench_chroma(f"{workdir}/chroma", corpus, queries, args.k)
+                summarize("chroma", n, open_ms, latencies, recall(truth, results))
+            except ImportError:
+                print(f"{'chroma':<8} {n:>7}  (chromadb 미설치, 건너뜀)")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+# py/chat_sessions.py
+
+import os
+import time
+import uuid
+import threading
+import traceback
+from collections import OrderedDict
+
+import gemini_ai
+from rate_limiter import rate_limited, estimate_tokens
+from model_router import route_model, record_latency
+from kv_cache import get_cache
+
+# --- 1. 설정 ---
+MAX_LIVE_SESSIONS = int(os.getenv("CHAT_MAX_SESSIONS", "64"))         # LRU로 유지할 세션 수
+HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "3000"))  # 요약 + 최근 대화 토큰 상한
+MIN_RECENT_TURNS = 4  # 예산을 넘어도 요약하지 않고 남겨둘 최근 메시지 수
+CACHE_NAMESPACE = "chat_session"  # 워커 간 공유/재시작 후 복원을 위해 요약과 최근 메시지를 SQLite 캐시에 저장
+
+SUMMARY_PROMPT = """다음은 사용자와 AI 비서 사이의 이전 대화 요약과, 그 뒤에 이어진 대화입니다.
+두 내용을 합쳐 이후 대화에 필요한 사실, 사용자 선호, 결정 사항, 미해결 질문이 빠지지 않도록 한국어로 간결하게 요약해주세요.
+다른 설명 없이 요약문만 답변해주세요.
+
+--- 이전 요약 ---
+[SUMMARY]
+
+--- 이어진 대화 ---
+[TURNS]
+"""
+
+
+def _to_gemini_role(role: str) -> str:
+    # Gemini는 'user'와 'model'만 지원 (assistant -> model)
+    return 'model' if role in ('assistant', 'model') else 'user'
+
+
+class ChatSession:
+    """대화 하나의 서버 측 상태: 누적 요약 + 요약되지 않은 최근 메시지 + 살아있는 SDK 채팅 객체."""
+
+    def __init__(self, conversation_id: str):
+        self.conversation_id = conversation_id
+        self.summary = ""
+        self.turns = []  # [{'role': 'user'/'model', 'content': '...'}]
+        self.chat = None  # genai.ChatSession (요약이 바뀌거나 라우팅된 모델이 바뀔 때마다 다시 만듦)
+        self.chat_model = None  # self.chat 이 묶여 있는 모델
+        self.lock = threading.Lock()
+        self.last_used = time.time()
+        self.version = 0  # 저장소에 기록된 버전 (다른 워커가 더 새 버전을 쓰면 다시 읽음)
+
+    def history_tokens(self) -> int:
+        return estimate_tokens(self.summary) + sum(estimate_tokens(turn['content']) for turn in self.turns)
+
+    def _gemini_history(self) -> list:
+        history = []
+        if self.summary:
+            history.append({'role': 'user', 'parts': [f"[지금까지의 대화 요약]\n{self.summary}"]})
+            history.append({'role': 'model', 'parts': ["네, 이전 대화 내용을 참고하겠습니다."]})
+        for turn in self.turns:
+            history.append({'role': turn['role'], 'parts': [turn['content']]})
+        return history
+
+    def rebuild_chat(self, model_name: str):
+        self.chat = gemini_ai.get_model_client(model_name).start_chat(history=self._gemini_history())
+        self.chat_model = model_name
+
+    def prepare_chat(self, current_input: str) -> tuple[str, int]:
+        """이번 턴의 모델을 'chat' 라우팅 규칙으로 고르고, 채팅 객체가 없거나 다른 모델에 묶여 있으면 다시 만듭니다."""
+        prompt_tokens = self.history_tokens() + estimate_tokens(current_input)
+        model_name = route_model("chat", prompt_tokens)
+        if self.chat is None or self.chat_model != model_name:
+            self.rebuild_chat(model_name)
+        return model_name, prompt_tokens
+
+    def load(self, persisted: dict):
+        self.summary = persisted.get('summary', "")
+        self.turns = list(persisted.get('turns', []))
+        self.version = persisted.get('version', 0)
+        self.chat = None
+
+
+class ChatSessionStore:
+    """
+    conversation_id -> ChatSession 의 LRU 저장소입니다.
+    클라이언트는 새 메시지만 보내고, 토큰 예산을 넘는 오래된 대화는 누적 요약으로 접힙니다.
+    """
+
+    def __init__(self, max_sessions: int = MAX_LIVE_SESSIONS, token_budget: int = HISTORY_TOKEN_BUDGET):
+        self.max_sessions = max_sessions
+        self.token_budget = token_budget
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_create(self, conversation_id: str | None, seed_messages: list | None = None) -> ChatSession:
+        """
+        세션을 가져오거나 새로 만듭니다.
+        서버 재시작 등으로 세션이 없을 때 클라이언트가 messages를 함께 보내면 그 기록으로 세션을 복원합니다.
+        """
+        persisted = get_cache().get(CACHE_NAMESPACE, conversation_id) if conversation_id else None
+        with self._lock:
+            if conversation_id and conversation_id in self._sessions:
+                self._sessions.move_to_end(conversation_id)
+                session = self._sessions[conversation_id]
+                if persisted and persisted.get('version', 0) > session.version:
+                    # 다중 워커 모드에서 다른 워커가 이어간 대화입니다.
+                    with session.lock:
+                        session.load(persisted)
+                return session
+
+            session = ChatSession(conversation_id or uuid.uuid4().hex)
+            if persisted:
+                session.load(persisted)
+                seed_messages = None
+            for msg in seed_messages or []:
+                content = msg.get('content', '')
+                if content:
+                    session.turns.append({'role': _to_gemini_role(msg.get('role', 'user')), 'content': content})
+            self._sessions[session.conversation_id] = session
+            while len(self._sessions) > self.max_sessions:
+                evicted_id, _ = self._sessions.popitem(last=False)
+                print(f"[정보] 채팅 세션 LRU 제거: {evicted_id}")
+            return session
+
+    def drop(self, conversation_id: str) -> bool:
+        cache = get_cache()
+        existed = cache.get(CACHE_NAMESPACE, conversation_id) is not None
+        cache.delete(CACHE_NAMESPACE, conversation_id)
+        with self._lock:
+            return (self._sessions.pop(conversation_id, None) is not None) or existed
+
+    def _persist(self, session: ChatSession):
+        session.version += 1
+        get_cache().set(CACHE_NAMESPACE, session.conversation_id,
+                        {'summary': session.summary, 'turns': session.turns, 'version': session.version})
+
+    def send(self, session: ChatSession, current_input: str) -> str:
+        """세션에 새 메시지를 보내고 응답을 반환합니다. 성공한 턴만 기록에 남깁니다."""
+        gemini_ai.ensure_llm_client()
+        with session.lock:
+            session.last_used = time.time()
+            try:
+                if session.history_tokens() > self.token_budget:
+                    self._compact(session)
+                model_name, prompt_tokens = session.prepare_chat(current_input)
+                print(f"[DEBUG] 세션 '{session.conversation_id}' 요청 - 최근 메시지 수: {len(session.turns)}, 예상 토큰: {prompt_tokens}")
+                start = time.perf_counter()
+                response = rate_limited(model_name, lambda: session.chat.send_message(current_input), prompt_tokens)
+                record_latency(model_name, time.perf_counter() - start)
+                result_text = gemini_ai.extract_response_text(response)
+            except Exception as e:
+                error_msg = f"Gemini API (session) 호출 중 예외 발생: {type(e).__name__} - {e}"
+                print(f"[오류] {error_msg}")
+                traceback.print_exc()
+                # 실패한 요청이 SDK 채팅 기록에 남지 않도록 다음 요청에서 다시 만듭니다.
+                session.chat = None
+                return f"Error: {error_msg}"
+
+            if result_text.startswith("Error:"):
+                session.chat = None
+                return result_text
+
+            session.turns.append({'role': 'user', 'content': current_input})
+            session.turns.append({'role': 'model', 'content': result_text})
+            self._persist(session)
+            return result_text
+
+    def stream(self, session: ChatSession, current_input: str, should_cancel=None):
+        """send()의 스트리밍 버전입니다. 끝까지 생성된 턴만 기록에 남깁니다."""
+        gemini_ai.ensure_llm_client()
+        with session.lock:
+            session.last_used = time.time()
+            if session.history_tokens() > self.token_budget:
+                self._compact(session)
+            model_name, prompt_tokens = session.prepare_chat(current_input)
+            pieces = []
+            completed = False
+            try:
+                for piece in gemini_ai.timed_stream(model_name, lambda: session.chat.send_message(current_input, stream=True),
+                                                    prompt_tokens, should_cancel):
+                    pieces.append(piece)
+                    yield piece
+                completed = not (should_cancel and should_cancel())
+            finally:
+                if completed and pieces:
+                    session.turns.append({'role': 'user', 'content': current_input})
+                    session.turns.append({'role': 'model', 'content': "".join(pieces).strip()})
+                    self._persist(session)
+                else:
+                    # 중단/실패한 스트림은 SDK 채팅 기록을 어긋나게 하므로 다음 요청에서 다시 만듭니다.
+                    session.chat = None
+
+    def _compact(self, session: ChatSession):
+        """
+        오래된 메시지를 누적 요약으로 접습니다. 매 턴마다 요약 호출이 생기지 않도록 예산의 절반까지 줄입니다.
+        요약에 실패하면 기록을 그대로 둡니다.
+        """
+        to_fold = []
+        low_water_mark = self.token_budget // 2
+        while len(session.turns) > MIN_RECENT_TURNS and session.history_tokens() > low_water_mark:
+            to_fold.append(session.turns.pop(0))
+        # user/model 쌍이 깨지지 않도록 model 메시지로 시작하는 경우 하나 더 접습니다.
+        if session.turns and session.turns[0]['role'] == 'model':
+            to_fold.append(session.turns.pop(0))
+        if not to_fold:
+            return
+
+        turns_text = "\n".join(f"{'사용자' if turn['role'] == 'user' else 'AI'}: {turn['content']}" for turn in to_fold)
+        prompt = SUMMARY_PROMPT.replace("[SUMMARY]", session.summary or "(없음)").replace("[TURNS]", turns_text)
+        new_summary = gemini_ai.query_gemini(prompt, model_name=route_model("conversation_summary", estimate_tokens(prompt)))
+        if new_summary.startswith("Error:"):
+            print(f"[경고] 대화 요약 실패, 기록을 그대로 유지합니다: {new_summary}")
+            session.turns[:0] = to_fold
+            return
+
+        session.summary = new_summary
+        session.chat = None
+        print(f"[정보] 세션 '{session.conversation_id}' 메시지 {len(to_fold)}개를 요약으로 압축 (현재 예상 토큰: {session.history_tokens()})")
+
+
+SESSION_STORE = ChatSessionStore()
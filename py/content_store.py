@@ -0,0 +1,130 @@
+# py/content_store.py
+
+import os
+import mmap
+import sqlite3
+import threading
+
+from kv_cache import content_hash
+from worker_pool import interprocess_lock
+
+PACK_FILENAME = "content.pack"
+INDEX_FILENAME = "content_index.sqlite3"
+
+
+class ContentStore:
+    """
+    노트 본문을 내용 해시(sha256)로 저장하는 저장소입니다. 같은 내용은 한 번만 저장됩니다.
+    본문은 하나의 pack 파일 끝에 덧붙이고 (hash -> offset, length) 는 SQLite에 두며, 읽기는 mmap 으로 합니다.
+    벡터 저장소 메타데이터에는 본문 대신 해시만 넣고, 실제 본문은 최종 상위 문서에 대해서만 읽습니다.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.pack_path = os.path.join(directory, PACK_FILENAME)
+        self.index_path = os.path.join(directory, INDEX_FILENAME)
+        self._local = threading.local()
+        self._map_lock = threading.Lock()
+        self._mm = None
+        open(self.pack_path, "ab").close()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS blobs (hash TEXT PRIMARY KEY, offset INTEGER NOT NULL, length INTEGER NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.index_path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _lookup(self, hashes: list[str]) -> dict:
+        result = {}
+        conn = self._connect()
+        for start in range(0, len(hashes), 500):
+            batch = hashes[start:start + 500]
+            rows = conn.execute(
+                f"SELECT hash, offset, length FROM blobs WHERE hash IN ({','.join('?' * len(batch))})", batch
+            ).fetchall()
+            result.update({digest: (offset, length) for digest, offset, length in rows})
+        return result
+
+    # --- 쓰기 ---
+    def put_many(self, texts: list[str]) -> list[str]:
+        """본문들을 저장하고 각 해시를 반환합니다. 이미 있는 내용은 다시 쓰지 않습니다."""
+        hashes = [content_hash(text) for text in texts]
+        missing = {}
+        existing = self._lookup(list(set(hashes)))
+        for digest, text in zip(hashes, texts):
+            if digest not in existing:
+                missing[digest] = text
+        if not missing:
+            return hashes
+
+        # 여러 워커 프로세스가 같은 pack 파일 끝에 동시에 쓰지 않도록 잠급니다.
+        with interprocess_lock(self.pack_path + ".lock"):
+            # 잠금을 기다리는 동안 다른 프로세스가 같은 내용을 썼을 수 있습니다.
+            already = self._lookup(list(missing))
+            rows = []
+            with open(self.pack_path, "ab") as pack:
+                offset = pack.tell()
+                for digest, text in missing.items():
+                    if digest in already:
+                        continue
+                    data = text.encode("utf-8")
+                    pack.write(data)
+                    rows.append((digest, offset, len(data)))
+                    offset += len(data)
+                pack.flush()
+                os.fsync(pack.fileno())
+            with self._connect() as conn:
+                conn.executemany("INSERT OR IGNORE INTO blobs (hash, offset, length) VALUES (?, ?, ?)", rows)
+        return hashes
+
+    def put(self, text: str) -> str:
+        return self.put_many([text])[0]
+
+    # --- 읽기 ---
+    def _mapped(self, end: int) -> mmap.mmap | None:
+        """
+        pack 파일의 mmap 을 반환합니다. 파일이 그 뒤로 커졌으면 다시 매핑합니다.
+        다른 스레드가 다시 매핑하면서 이전 mmap 을 닫으므로, 반드시 _map_lock 을 잡은 채로 호출하고 읽어야 합니다.
+        """
+        if self._mm is None or len(self._mm) < end:
+            if self._mm is not None:
+                self._mm.close()
+                self._mm = None
+            if os.path.getsize(self.pack_path) == 0:
+                return None
+            with open(self.pack_path, "rb") as pack:
+                self._mm = mmap.mmap(pack.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mm
+
+    def get_many(self, hashes: list[str]) -> dict:
+        """{hash: 본문}. 없는 해시는 결과에서 빠집니다."""
+        locations = self._lookup([digest for digest in set(hashes) if digest])
+        if not locations:
+            return {}
+        # 잘라 읽는 동안 다른 스레드가 mmap 을 바꾸지 못하도록 잠근 채로 복사합니다 (복사 자체는 짧음).
+        with self._map_lock:
+            mm = self._mapped(max(offset + length for offset, length in locations.values()))
+            if mm is None:
+                return {}
+            raw = {digest: mm[offset:offset + length] for digest, (offset, length) in locations.items()}
+        return {digest: data.decode("utf-8") for digest, data in raw.items()}
+
+    def get(self, digest: str) -> str | None:
+        return self.get_many([digest]).get(digest)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_content_store(directory: str) -> ContentStore:
+    with _stores_lock:
+        if directory not in _stores:
+            _stores[directory] = ContentStore(directory)
+        return _stores[directory]
@@ -0,0 +1,113 @@
+# py/embedding_codec.py
+
+import base64
+import json
+import numpy as np
+
+from vector_quant import quantize
+
+try:
+    import orjson  # 선택 의존성: 설치되어 있으면 JSON 봉투 직렬화에 사용
+except ImportError:
+    orjson = None
+
+# --- 1. 지원 포맷 ---
+# json        : 기존 형식 {fileName: [float, ...]} (기본값, 하위 호환)
+# f32 / f16   : {fileName: base64(little-endian float32/float16)}
+# matrix-f32 / matrix-f16 : ids 목록 + 하나로 묶은 행렬(row-major) base64
+# i8 / matrix-i8 : int8 양자화 값 base64 + 행별 scales (복원: code * scale)
+SUPPORTED_FORMATS = ("json", "f32", "f16", "i8", "matrix-f32", "matrix-f16", "matrix-i8")
+ACCEPT_MEDIA_PREFIX = "application/vnd.memordo.embeddings+"
+
+_DTYPES = {
+    "f32": np.dtype("<f4"),
+    "f16": np.dtype("<f2"),
+    "i8": np.dtype("i1"),
+}
+
+
+def negotiate_format(query_format: str | None, accept_header: str | None) -> str:
+    """
+    ?format= 쿼리 파라미터를 우선하고, 없으면 Accept 헤더
+    (예: application/vnd.memordo.embeddings+f16)에서 포맷을 고릅니다.
+    """
+    if query_format:
+        fmt = query_format.strip().lower()
+        return fmt if fmt in SUPPORTED_FORMATS else "json"
+    if accept_header:
+        for media_range in accept_header.split(","):
+            media_type = media_range.split(";")[0].strip().lower()
+            if media_type.startswith(ACCEPT_MEDIA_PREFIX):
+                fmt = media_type[len(ACCEPT_MEDIA_PREFIX):]
+                if fmt in SUPPORTED_FORMATS:
+                    return fmt
+    return "json"
+
+
+def _b64(array: np.ndarray) -> str:
+    return base64.b64encode(array.tobytes()).decode("ascii")
+
+
+def encode_embeddings(file_names: list[str], vectors: list, fmt: str) -> dict:
+    """빈 벡터를 제외한 (fileName, vector) 쌍을 요청된 포맷의 dict로 인코딩합니다."""
+    pairs = [(name, vec) for name, vec in zip(file_names, vectors) if vec is not None and len(vec)]
+
+    if fmt == "json":
+        return {name: list(vec) for name, vec in pairs}
+
+    dtype = _DTYPES[fmt.split("-")[-1]]
+    if not pairs:
+        return {"format": fmt, "dim": 0, "ids": [], "data": ""} if fmt.startswith("matrix") \
+            else {"format": fmt, "dim": 0, "embeddings": {}}
+
+    if dtype.kind == "i":
+        matrix, scales = quantize([vec for _, vec in pairs], "i8")
+    else:
+        matrix, scales = np.asarray([vec for _, vec in pairs], dtype=dtype), None
+    dim = int(matrix.shape[1])
+
+    if fmt.startswith("matrix"):
+        payload = {
+            "format": fmt,
+            "dim": dim,
+            "ids": [name for name, _ in pairs],
+            "data": _b64(np.ascontiguousarray(matrix)),
+        }
+        if scales is not None:
+            payload["scales"] = scales.tolist()
+        return payload
+    payload = {
+        "format": fmt,
+        "dim": dim,
+        "embeddings": {name: _b64(matrix[i]) for i, (name, _) in enumerate(pairs)},
+    }
+    if scales is not None:
+        payload["scales"] = {name: float(scales[i]) for i, (name, _) in enumerate(pairs)}
+    return payload
+
+
+def decode_embeddings(payload: dict) -> dict[str, np.ndarray]:
+    """encode_embeddings의 역변환 (클라이언트 구현 참고 및 검증용)."""
+    fmt = payload.get("format", "json")
+    if fmt == "json":
+        return {name: np.asarray(vec, dtype=np.float32) for name, vec in payload.items()}
+
+    dtype = _DTYPES[fmt.split("-")[-1]]
+    if fmt.startswith("matrix"):
+        if not payload["ids"]:
+            return {}
+        matrix = np.frombuffer(base64.b64decode(payload["data"]), dtype=dtype).reshape(len(payload["ids"]), payload["dim"])
+        scales = payload.get("scales") or [1.0] * len(payload["ids"])
+        return {name: matrix[i].astype(np.float32) * scales[i] for i, name in enumerate(payload["ids"])}
+    scales = payload.get("scales") or {}
+    return {
+        name: np.frombuffer(base64.b64decode(data), dtype=dtype).astype(np.float32) * scales.get(name, 1.0)
+        for name, data in payload["embeddings"].items()
+    }
+
+
+def dumps(payload) -> bytes:
+    """orjson이 있으면 사용하고, 없으면 표준 json으로 직렬화합니다."""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
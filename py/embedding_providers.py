@@ -0,0 +1,109 @@
+# py/embedding_providers.py
+
+import os
+import re
+import threading
+
+import gemini_ai
+from vector_quant import EMBEDDING_OUTPUT_DIM
+from sbert_encoder import SbertEncoder
+
+# --- 1. 설정 ---
+# EMBEDDING_PROVIDER: gemini (기본, 네트워크) / local (sentence-transformers, CPU)
+# LOCAL_EMBEDDING_MODEL: local 공급자가 쓸 sentence-transformers 모델 (trans-ai.py 와 같은 기본값)
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "gemini").lower()
+LOCAL_EMBEDDING_MODEL = os.getenv("LOCAL_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+LOCAL_EMBEDDING_BATCH_SIZE = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "64"))
+GEMINI_EMBED_BATCH_SIZE = 100  # embed_content 한 번에 보낼 수 있는 최대 텍스트 수
+
+
+class EmbeddingProvider:
+    """
+    임베딩 공급자 인터페이스입니다.
+    모델이 다르면 벡터 공간도 다르므로, 공급자마다 고유한 key(캐시 키/Chroma 컬렉션 이름에 사용)를 가집니다.
+    """
+
+    name = "base"
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    @property
+    def key(self) -> str:
+        """벡터 공간을 구분하는 식별자입니다. 이 값이 같을 때만 벡터를 서로 비교할 수 있습니다."""
+        return f"{self.name}:{self.model_name}"
+
+    def collection_name(self) -> str:
+        # Chroma 컬렉션 이름은 영문/숫자/._- 만 허용됩니다.
+        return re.sub(r"[^A-Za-z0-9._-]+", "_", f"{self.name}_{self.model_name}").strip("._-")[:63]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        raise NotImplementedError
+
+    def embed_query(self, text: str) -> list[float]:
+        raise NotImplementedError
+
+
+class GeminiEmbeddingProvider(EmbeddingProvider):
+    """text-embedding-004 를 네트워크로 호출합니다. 호출은 모두 rate_limiter 를 거칩니다."""
+
+    name = "gemini"
+
+    def __init__(self, model_name: str = gemini_ai.EMBEDDING_MODEL):
+        super().__init__(model_name)
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}:{self.model_name}:{EMBEDDING_OUTPUT_DIM or 0}"
+
+    def collection_name(self) -> str:
+        # 기존 사용자의 Chroma 데이터를 그대로 쓰도록 LangChain 기본 컬렉션 이름을 유지합니다.
+        # EMBEDDING_OUTPUT_DIM 을 직접 설정한 경우에만 차원이 다른 벡터를 별도 컬렉션에 둡니다.
+        return f"langchain_d{EMBEDDING_OUTPUT_DIM}" if EMBEDDING_OUTPUT_DIM else "langchain"
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        vectors = []
+        for start in range(0, len(texts), GEMINI_EMBED_BATCH_SIZE):
+            vectors.extend(gemini_ai.get_embeddings_batch(texts[start:start + GEMINI_EMBED_BATCH_SIZE], self.model_name))
+        return vectors
+
+    def embed_query(self, text: str) -> list[float]:
+        return gemini_ai.get_embedding_for_text(text, task_type="retrieval_query")
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """sentence-transformers 모델을 CPU에서 배치로 실행합니다. API 키와 네트워크가 필요 없습니다."""
+
+    name = "local"
+
+    def __init__(self, model_name: str = LOCAL_EMBEDDING_MODEL, batch_size: int = LOCAL_EMBEDDING_BATCH_SIZE):
+        super().__init__(model_name)
+        self.encoder = SbertEncoder(model_name, batch_size=batch_size, normalize=True, device="cpu")
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        # 길이순 배치 인코딩 (sbert_encoder). LangChain 인터페이스가 리스트를 요구하므로 여기서 변환합니다.
+        return self.encoder.encode_batch(texts).tolist() if texts else []
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.encoder.encode_query(text).tolist()
+
+
+PROVIDERS = {
+    "gemini": GeminiEmbeddingProvider,
+    "local": LocalEmbeddingProvider,
+}
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def get_embedding_provider(name: str | None = None) -> EmbeddingProvider:
+    """설정(EMBEDDING_PROVIDER) 또는 이름으로 공급자를 골라 프로세스 단위로 재사용합니다."""
+    name = (name or EMBEDDING_PROVIDER).lower()
+    if name not in PROVIDERS:
+        print(f"[경고] 알 수 없는 EMBEDDING_PROVIDER '{name}', gemini 를 사용합니다.")
+        name = "gemini"
+    with _providers_lock:
+        if name not in _providers:
+            _providers[name] = PROVIDERS[name]()
+        return _providers[name]
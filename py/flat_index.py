@@ -0,0 +1,237 @@
+# py/flat_index.py
+
+import os
+import json
+import threading
+import numpy as np
+
+# --- 1. 설정 ---
+# RETRIEVAL_BACKEND: auto (기본, 문서 수로 선택) / flat (항상 정확 검색) / chroma (항상 HNSW)
+# FLAT_INDEX_MAX_DOCS: auto 일 때 이 수 이하이면 정확 검색을 사용합니다.
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "auto").lower()
+FLAT_INDEX_MAX_DOCS = int(os.getenv("FLAT_INDEX_MAX_DOCS", "50000"))
+BLOCK_ROWS = 16384          # 한 번에 곱할 행 수 (캐시에 맞춰 블록 단위로 계산)
+INITIAL_CAPACITY = 1024
+COMPACT_MIN_TOMBSTONES = 256
+COMPACT_RATIO = 0.2         # 삭제 표시된 행이 이 비율을 넘으면 압축
+
+VECTORS_FILENAME = "vectors.f32"
+META_FILENAME = "meta.json"
+
+
+def use_flat_index(doc_count: int) -> bool:
+    if RETRIEVAL_BACKEND == "flat":
+        return True
+    if RETRIEVAL_BACKEND == "chroma":
+        return False
+    return doc_count <= FLAT_INDEX_MAX_DOCS
+
+
+class FlatIndex:
+    """
+    정규화된 임베딩을 메모리 매핑된 float32 행렬에 두고, 블록 단위 행렬-벡터 곱 + argpartition 으로 정확한 top-k 를 찾습니다.
+    갱신은 끝에 덧붙이고 이전 행은 삭제 표시(tombstone)만 하며, 삭제 비율이 커지면 압축합니다.
+    메타데이터(행 -> id)는 원자적으로 교체되므로 다른 프로세스는 파일 변경을 보고 다시 읽습니다.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()
+        self._matrix = None
+        self._ids = []          # 행 번호 -> id (삭제된 행은 None)
+        self._rows = {}         # id -> 행 번호
+        self._dead = np.zeros(0, dtype=bool)
+        self.dim = None
+        self.version = 0
+        self._meta_mtime = None
+        self._load()
+
+    # --- 파일 ---
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.directory, VECTORS_FILENAME)
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.directory, META_FILENAME)
+
+    def _load(self):
+        if not os.path.exists(self._meta_path):
+            return
+        with open(self._meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        self.dim = meta["dim"]
+        self.version = meta["version"]
+        self._ids = meta["ids"]
+        self._rows = {doc_id: row for row, doc_id in enumerate(self._ids) if doc_id is not None}
+        # 아직 쓰지 않은 뒤쪽 행도 검색에서 빠지도록 용량 전체를 기준으로 삭제 표시를 만듭니다.
+        self._dead = np.ones(meta["capacity"], dtype=bool)
+        self._dead[:len(self._ids)] = [doc_id is None for doc_id in self._ids]
+        self._matrix = self._open(meta["capacity"]) if self.dim else None
+        self._meta_mtime = os.stat(self._meta_path).st_mtime_ns
+
+    def _open(self, capacity: int) -> np.memmap:
+        return np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def _write_meta(self):
+        self.version += 1
+        tmp_path = self._meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "version": self.version, "capacity": self.capacity, "ids": self._ids}, f)
+        os.replace(tmp_path, self._meta_path)
+        self._meta_mtime = os.stat(self._meta_path).st_mtime_ns
+
+    def _maybe_reload(self):
+        """다른 워커 프로세스가 색인을 갱신했으면 다시 읽습니다."""
+        try:
+            mtime = os.stat(self._meta_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self._meta_mtime:
+            self._load()
+
+    @property
+    def capacity(self) -> int:
+        return 0 if self._matrix is None else self._matrix.shape[0]
+
+    def _ensure_capacity(self, rows: int):
+        if rows <= self.capacity:
+            return
+        capacity = max(INITIAL_CAPACITY, self.capacity)
+        while capacity < rows:
+            capacity *= 2
+        if self._matrix is not None:
+            self._matrix.flush()
+            del self._matrix
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(capacity * self.dim * 4)
+        self._matrix = self._open(capacity)
+        self._dead = np.concatenate([self._dead, np.ones(capacity - len(self._dead), dtype=bool)])
+
+    # --- 쓰기 ---
+    def upsert(self, ids: list[str], vectors):
+        """새 벡터를 끝에 덧붙이고, 같은 id 의 이전 행은 삭제 표시합니다."""
+        if not ids:
+            return
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix = matrix / norms
+        with self._lock:
+            self._maybe_reload()
+            if self.dim is None:
+                self.dim = matrix.shape[1]
+            elif matrix.shape[1] != self.dim:
+                raise ValueError(f"차원이 다릅니다: {matrix.shape[1]} != {self.dim}")
+            self._mark_dead(ids)
+            start = len(self._ids)
+            self._ensure_capacity(start + len(ids))
+            self._matrix[start:start + len(ids)] = matrix
+            self._matrix.flush()
+            self._ids.extend(ids)
+            self._dead[start:start + len(ids)] = False
+            self._rows.update({doc_id: start + i for i, doc_id in enumerate(ids)})
+            self._write_meta()
+            self._maybe_compact()
+
+    def delete(self, ids: list[str]):
+        with self._lock:
+            self._maybe_reload()
+            if self._mark_dead(ids):
+                self._write_meta()
+                self._maybe_compact()
+
+    def _mark_dead(self, ids) -> int:
+        removed = 0
+        for doc_id in ids:
+            row = self._rows.pop(doc_id, None)
+            if row is not None:
+                self._ids[row] = None
+                self._dead[row] = True
+                removed += 1
+        return removed
+
+    def _maybe_compact(self):
+        tombstones = len(self._ids) - len(self._rows)
+        if tombstones >= COMPACT_MIN_TOMBSTONES and tombstones > COMPACT_RATIO * len(self._ids):
+            self.compact()
+
+    def compact(self):
+        """삭제 표시된 행을 제거한 새 파일을 만들어 교체합니다."""
+        with self._lock:
+            live = [row for row, doc_id in enumerate(self._ids) if doc_id is not None]
+            capacity = max(INITIAL_CAPACITY, len(live))
+            tmp_path = self._vectors_path + ".tmp"
+            compacted = np.memmap(tmp_path, dtype=np.float32, mode="w+", shape=(capacity, self.dim))
+            for start in range(0, len(live), BLOCK_ROWS):
+                rows = live[start:start + BLOCK_ROWS]
+                compacted[start:start + len(rows)] = self._matrix[rows]
+            compacted.flush()
+            del compacted
+            self._matrix.flush()
+            del self._matrix
+            os.replace(tmp_path, self._vectors_path)
+            self._ids = [self._ids[row] for row in live]
+            self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+            self._matrix = self._open(capacity)
+            self._dead = np.ones(capacity, dtype=bool)
+            self._dead[:len(self._ids)] = False
+            self._write_meta()
+            print(f"[정보] 정확 검색 색인 압축: {len(live)}개 행 유지")
+
+    def rebuild(self, ids: list[str], vectors):
+        """저장된 벡터 전체로 색인을 새로 만듭니다 (Chroma 와 어긋났을 때)."""
+        with self._lock:
+            self._matrix = None
+            self._ids, self._rows = [], {}
+            self._dead = np.zeros(0, dtype=bool)
+            self.dim = None
+            for path in (self._vectors_path, self._meta_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            if ids:
+                self.upsert(ids, vectors)
+
+    # --- 읽기 ---
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def ids(self) -> set:
+        with self._lock:
+            self._maybe_reload()
+            return set(self._rows)
+
+    def search(self, query, k: int = 10) -> list[tuple[str, float]]:
+        """코사인 유사도 상위 k 개를 (id, 점수)로 반환합니다."""
+        query = np.asarray(query, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        with self._lock:
+            self._maybe_reload()
+            used = len(self._ids)
+            if not self._rows or used == 0:
+                return []
+            candidate_scores, candidate_rows = [], []
+            for start in range(0, used, BLOCK_ROWS):
+                end = min(used, start + BLOCK_ROWS)
+                scores = np.asarray(self._matrix[start:end] @ query)
+                scores[self._dead[start:end]] = -np.inf
+                top = min(k, len(scores))
+                idx = np.argpartition(-scores, top - 1)[:top]
+                candidate_scores.append(scores[idx])
+                candidate_rows.append(idx + start)
+            scores = np.concatenate(candidate_scores)
+            rows = np.concatenate(candidate_rows)
+            order = np.argsort(-scores)[:k]
+            return [(self._ids[rows[i]], float(scores[i])) for i in order if np.isfinite(scores[i])]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_flat_index(directory: str) -> FlatIndex:
+    with _indexes_lock:
+        if directory not in _indexes:
+            _indexes[directory] = FlatIndex(directory)
+        return _indexes[directory]
@@ -1,15 +1,39 @@
 import os
 import json
 import datetime
+import time
 import traceback
-import google.generativeai as genai
+from rate_limiter import rate_limited, estimate_tokens
+from model_router import route_model, record_latency
+from vector_quant import reduce_dimension
 
 # --- 1. 초기 설정 (동적 초기화 방식 유지) ---
 GEMINI_API_KEY = None
 LLM_CLIENT = None
+MODEL_CLIENTS = {}  # 모델명 -> GenerativeModel (라우팅된 모델마다 하나씩 재사용)
 
 DEFAULT_GEMINI_MODEL = "gemini-2.5-flash"
 EMBEDDING_MODEL = "models/text-embedding-004"
+# 부하 테스트 등에서 mock_llm_server.py 같은 다른 엔드포인트로 보낼 때 설정합니다. 예: http://127.0.0.1:8089
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
+
+# google.generativeai 는 grpc/protobuf 를 끌어와 로드가 느리므로 첫 사용 시점에 import 합니다.
+genai = None
+
+
+def _load_genai():
+    global genai
+    if genai is None:
+        import google.generativeai as _genai
+        genai = _genai
+    return genai
+
+
+def transport_options() -> dict:
+    """GEMINI_API_ENDPOINT 가 있으면 SDK/LangChain 클라이언트가 REST 로 그 주소를 호출하도록 하는 인자를 반환합니다."""
+    if not GEMINI_API_ENDPOINT:
+        return {}
+    return {"transport": "rest", "client_options": {"api_endpoint": GEMINI_API_ENDPOINT}}
 
 
 def initialize_ai_client(api_key: str) -> bool:
@@ -23,8 +47,11 @@ def initialize_ai_client(api_key: str) -> bool:
         return False
         
     try:
-        genai.configure(api_key=api_key)
+        _load_genai()
+        genai.configure(api_key=api_key, **transport_options())
         LLM_CLIENT = genai.GenerativeModel(DEFAULT_GEMINI_MODEL)
+        MODEL_CLIENTS.clear()
+        MODEL_CLIENTS[DEFAULT_GEMINI_MODEL] = LLM_CLIENT
         GEMINI_API_KEY = api_key
         
         print(f"✅ Gemini AI 클라이언트 초기화 성공 (API 키: {api_key[:5]}...).")
@@ -52,13 +79,14 @@ def get_embedding_for_text(text: str, task_type: str = "retrieval_document") ->
         print("[경고] 임베딩할 텍스트가 비어있습니다.")
         return None
     try:
-        result = genai.embed_content(
+        _load_genai()
+        result = rate_limited(EMBEDDING_MODEL, lambda: genai.embed_content(
             model=EMBEDDING_MODEL,
             content=text,
             task_type=task_type,
             title="Memordo Document"
-        )
-        return result['embedding']
+        ), estimate_tokens(text))
+        return reduce_dimension(result['embedding'])
     except Exception as e:
         print(f"[오류] Gemini 임베딩 생성 중 오류: {e}")
         traceback.print_exc()
@@ -78,21 +106,19 @@ def get_embeddings_batch(texts: list[str], model_name: str = EMBEDDING_MODEL, ta
 
     try:
         processed_texts = [text if text.strip() else " " for text in texts]
-        result = genai.embed_content(
+        _load_genai()
+        result = rate_limited(model_name, lambda: genai.embed_content(
             model=model_name,
             content=processed_texts,
             task_type=task_type
-        )
-        return result['embedding']
+        ), sum(estimate_tokens(text) for text in processed_texts))
+        return [reduce_dimension(vector) for vector in result['embedding']]
     except Exception as e:
         print(f"배치 임베딩 중 오류 발생: {e}")
         return [[] for _ in texts]
 
-def query_gemini(prompt: str, model_name: str = DEFAULT_GEMINI_MODEL) -> str:
-    """
-    초기화된 전역 생성 모델 클라이언트를 사용하여 프롬프트를 보내고 응답을 받습니다.
-    대화 기록 없이 단일 프롬프트만 처리합니다.
-    """
+def ensure_llm_client():
+    """LLM_CLIENT가 없으면 저장된 API 키(또는 GOOGLE_API_KEY)로 재초기화를 시도하고 클라이언트를 반환합니다."""
     global LLM_CLIENT, GEMINI_API_KEY
     if not LLM_CLIENT:
         api_key = GEMINI_API_KEY or os.getenv("GOOGLE_API_KEY")
@@ -104,18 +130,107 @@ def query_gemini(prompt: str, model_name: str = DEFAULT_GEMINI_MODEL) -> str:
 
     if not LLM_CLIENT:
         raise ValueError("AI client could not be initialized.")
+    return LLM_CLIENT
+
+def get_model_client(model_name: str = DEFAULT_GEMINI_MODEL):
+    """모델별로 캐시된 GenerativeModel을 반환합니다. 기본 모델은 LLM_CLIENT를 그대로 사용합니다."""
+    ensure_llm_client()
+    client = MODEL_CLIENTS.get(model_name)
+    if client is None:
+        client = MODEL_CLIENTS.setdefault(model_name, genai.GenerativeModel(model_name))
+    return client
+
+def _timed_call(model_name: str, fn, estimated_tokens: int):
+    """리미터를 거쳐 호출하고, 성공한 호출의 지연을 라우터에 기록합니다."""
+    start = time.perf_counter()
+    result = rate_limited(model_name, fn, estimated_tokens)
+    record_latency(model_name, time.perf_counter() - start)
+    return result
+
+def timed_stream(model_name: str, start_stream, estimated_tokens: int, should_cancel=None):
+    """
+    리미터를 거쳐 스트리밍 요청을 시작하고 조각을 내보냅니다.
+    끝까지 받은 스트림만 전체 생성 시간을 라우터에 기록합니다 (중간에 끊긴 스트림의 시간은 지연이 아님).
+    """
+    start = time.perf_counter()
+    # 리미터는 요청 시작(RPM/TPM 기록)까지만 감쌉니다. 이후 조각 수신은 동시성 슬롯을 점유하지 않습니다.
+    response = rate_limited(model_name, start_stream, estimated_tokens)
+    cancelled = False
+
+    def _should_cancel():
+        nonlocal cancelled
+        cancelled = cancelled or bool(should_cancel and should_cancel())
+        return cancelled
+
+    yield from iter_response_stream(response, _should_cancel)
+    if not cancelled:
+        record_latency(model_name, time.perf_counter() - start)
+
+def _history_tokens(chat_history: list) -> int:
+    return sum(estimate_tokens(msg['parts'][0]) for msg in chat_history)
+
+def extract_response_text(response) -> str:
+    """generate_content / send_message 응답에서 텍스트를 꺼내고, 차단되거나 비어있으면 'Error:' 문자열을 반환합니다."""
+    if response.parts:
+        return response.text.strip()
+    elif response.prompt_feedback and response.prompt_feedback.block_reason:
+        error_msg = f"콘텐츠 생성 차단됨. 이유: {response.prompt_feedback.block_reason}"
+        print(f"[오류] {error_msg}")
+        return f"Error: {error_msg}"
+    else:
+        return "Error: Gemini API로부터 비어있는 응답을 받았습니다."
+
+def to_gemini_history(messages: list) -> list:
+    """[{'role': 'user'/'assistant', 'content': '...'}] 형식을 Gemini Chat API 형식으로 변환합니다."""
+    # Gemini는 'user'와 'model'만 지원 (assistant -> model)
+    return [
+        {'role': 'model' if msg.get('role', 'user') == 'assistant' else 'user', 'parts': [msg.get('content', '')]}
+        for msg in messages
+    ]
+
+def _cancel_stream(response):
+    """스트리밍 응답의 하위 gRPC/HTTP 스트림을 닫아 더 이상 토큰이 생성(과금)되지 않도록 합니다."""
+    iterator = getattr(response, "_iterator", None)
+    for closer in ("cancel", "close"):
+        if iterator is not None and hasattr(iterator, closer):
+            try:
+                getattr(iterator, closer)()
+            except Exception as e:
+                print(f"[경고] 스트림 취소 중 오류: {e}")
+            return
+
+def iter_response_stream(response, should_cancel=None):
+    """
+    stream=True 응답에서 텍스트 조각을 차례로 내보냅니다.
+    should_cancel()이 True를 반환하거나 호출자가 제너레이터를 닫으면(클라이언트 연결 종료) 스트림을 취소합니다.
+    """
+    completed = False
+    try:
+        for chunk in response:
+            if should_cancel and should_cancel():
+                print("[정보] 클라이언트 연결이 끊겨 스트리밍 생성을 중단합니다.")
+                return
+            if chunk.parts:
+                yield chunk.text
+        completed = True
+        if response.prompt_feedback and response.prompt_feedback.block_reason:
+            raise ValueError(f"콘텐츠 생성 차단됨. 이유: {response.prompt_feedback.block_reason}")
+    finally:
+        if not completed:
+            _cancel_stream(response)
+
+def query_gemini(prompt: str, model_name: str | None = None) -> str:
+    """
+    초기화된 전역 생성 모델 클라이언트를 사용하여 프롬프트를 보내고 응답을 받습니다.
+    대화 기록 없이 단일 프롬프트만 처리합니다. model_name 이 없으면 'chat' 라우팅 규칙으로 고릅니다.
+    """
+    model_name = model_name or route_model("chat", estimate_tokens(prompt))
+    client = get_model_client(model_name)
 
     try:
-        response = LLM_CLIENT.generate_content(prompt)
+        response = _timed_call(model_name, lambda: client.generate_content(prompt), estimate_tokens(prompt))
         
-        if response.parts:
-            return response.text.strip()
-        elif response.prompt_feedback and response.prompt_feedback.block_reason:
-            error_msg = f"콘텐츠 생성 차단됨. 이유: {response.prompt_feedback.block_reason}"
-            print(f"[오류] {error_msg}")
-            return f"Error: {error_msg}"
-        else:
-            return "Error: Gemini API로부터 비어있는 응답을 받았습니다."
+        return extract_response_text(response)
 
     except Exception as e:
         error_msg = f"Gemini API 호출 중 예외 발생: {type(e).__name__} - {e}"
@@ -124,43 +239,21 @@ def query_gemini(prompt: str, model_name: str = DEFAULT_GEMINI_MODEL) -> str:
         return f"Error: {error_msg}"
 
 
-def query_gemini_with_history(current_input: str, messages: list, model_name: str = DEFAULT_GEMINI_MODEL) -> str:
+def query_gemini_with_history(current_input: str, messages: list, model_name: str | None = None) -> str:
     """
     ✨ [새 함수] 대화 기록을 포함하여 Gemini에 요청합니다.
     
     Args:
         current_input: 현재 사용자 입력
         messages: 대화 기록 [{'role': 'user'/'assistant', 'content': '...'}]
-        model_name: 사용할 모델명
+        model_name: 사용할 모델명 (없으면 'chat' 라우팅 규칙으로 선택)
     
     Returns:
         AI 응답 텍스트
     """
-    global LLM_CLIENT, GEMINI_API_KEY
-    if not LLM_CLIENT:
-        api_key = GEMINI_API_KEY or os.getenv("GOOGLE_API_KEY")
-        if api_key:
-            print("[정보] LLM_CLIENT가 없어 재초기화를 시도합니다.")
-            initialize_ai_client(api_key)
-        else:
-            raise ValueError("AI client has not been initialized and no API key found.")
-
-    if not LLM_CLIENT:
-        raise ValueError("AI client could not be initialized.")
-
     try:
         # Gemini Chat API를 위한 메시지 형식 변환
-        chat_history = []
-        for msg in messages:
-            role = msg.get('role', 'user')
-            content = msg.get('content', '')
-            
-            # Gemini는 'user'와 'model'만 지원 (assistant -> model)
-            gemini_role = 'model' if role == 'assistant' else 'user'
-            chat_history.append({
-                'role': gemini_role,
-                'parts': [content]
-            })
+        chat_history = to_gemini_history(messages)
         
         # 현재 입력 추가
         chat_history.append({
@@ -171,17 +264,13 @@ def query_gemini_with_history(current_input: str, messages: list, model_name: st
         print(f"[DEBUG] 대화 기록 포함 요청 - 메시지 수: {len(chat_history)}")
         
         # Chat 세션 생성 및 응답 받기
-        chat = LLM_CLIENT.start_chat(history=chat_history[:-1])  # 마지막 메시지 제외
-        response = chat.send_message(current_input)
+        history_tokens = _history_tokens(chat_history)
+        model_name = model_name or route_model("chat", history_tokens)
+        client = get_model_client(model_name)
+        chat = client.start_chat(history=chat_history[:-1])  # 마지막 메시지 제외
+        response = _timed_call(model_name, lambda: chat.send_message(current_input), history_tokens)
         
-        if response.parts:
-            return response.text.strip()
-        elif response.prompt_feedback and response.prompt_feedback.block_reason:
-            error_msg = f"콘텐츠 생성 차단됨. 이유: {response.prompt_feedback.block_reason}"
-            print(f"[오류] {error_msg}")
-            return f"Error: {error_msg}"
-        else:
-            return "Error: Gemini API로부터 비어있는 응답을 받았습니다."
+        return extract_response_text(response)
 
     except Exception as e:
         error_msg = f"Gemini API (with history) 호출 중 예외 발생: {type(e).__name__} - {e}"
@@ -190,6 +279,24 @@ def query_gemini_with_history(current_input: str, messages: list, model_name: st
         return f"Error: {error_msg}"
 
 
+def stream_gemini(prompt: str, should_cancel=None, model_name: str | None = None):
+    """query_gemini의 스트리밍 버전입니다. 응답 텍스트 조각을 생성되는 대로 내보냅니다."""
+    prompt_tokens = estimate_tokens(prompt)
+    model_name = model_name or route_model("chat", prompt_tokens)
+    client = get_model_client(model_name)
+    yield from timed_stream(model_name, lambda: client.generate_content(prompt, stream=True), prompt_tokens, should_cancel)
+
+
+def stream_gemini_with_history(current_input: str, messages: list, should_cancel=None, model_name: str | None = None):
+    """query_gemini_with_history의 스트리밍 버전입니다."""
+    chat_history = to_gemini_history(messages)
+    history_tokens = _history_tokens(chat_history) + estimate_tokens(current_input)
+    model_name = model_name or route_model("chat", history_tokens)
+    chat = get_model_client(model_name).start_chat(history=chat_history)
+    yield from timed_stream(model_name, lambda: chat.send_message(current_input, stream=True), history_tokens,
+                            should_cancel)
+
+
 # --- 3. 작업별 유틸리티 함수 (변경 없음) ---
 task_prompts = {
     "summarize": "다음 텍스트를 핵심 내용 중심으로 세 문장으로 간결하게 요약해주세요:\n\n\"\"\"\n[TEXT]\n\"\"\"",
@@ -210,12 +317,21 @@ task_prompts = {
 \"\"\""""
 }
 
+def build_task_prompt(task_type: str, text: str) -> str:
+    return task_prompts[task_type].replace("[TEXT]", text)
+
 def execute_simple_task(task_type: str, text: str) -> str:
     if task_type not in task_prompts:
         return f"Error: 지원하지 않는 작업 유형입니다: {task_type}"
     
-    prompt = task_prompts[task_type].replace("[TEXT]", text)
-    return query_gemini(prompt)
+    # ✨ 긴 입력은 문단 단위로 나눠 병렬 요약 후 합치는 map-reduce 경로로 처리
+    from map_reduce import is_long_input, execute_long_task
+    if is_long_input(text):
+        return execute_long_task(task_type, text)
+
+    prompt = build_task_prompt(task_type, text)
+    # ✨ 작업 유형과 입력 크기에 따라 모델 선택 (짧은 키워드/요약은 flash-lite)
+    return query_gemini(prompt, model_name=route_model(task_type, estimate_tokens(prompt)))
 
 
 # --- 메인 실행 블록 (테스트용 코드 통합 및 강화) ---
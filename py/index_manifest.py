@@ -0,0 +1,93 @@
+# py/index_manifest.py
+
+import os
+import json
+import sqlite3
+import threading
+
+MANIFEST_FILENAME = "index_manifest.sqlite3"
+
+
+class ManifestEntry:
+    def __init__(self, path: str, mtime_ns: int, size: int, content_hash: str, chunk_hashes: list):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.content_hash = content_hash
+        self.chunk_hashes = chunk_hashes  # 청크 순번별 내용 해시 (색인에 실패한 청크는 None)
+
+    @property
+    def complete(self) -> bool:
+        return None not in self.chunk_hashes
+
+
+class ChangePlan:
+    def __init__(self, changed: list, removed: list, unchanged: int):
+        self.changed = changed      # [(path, os.stat_result, 이전 ManifestEntry 또는 None)] 새로 생겼거나 바뀌었을 수 있는 파일
+        self.removed = removed      # [ManifestEntry] 디렉터리에서 사라진 파일
+        self.unchanged = unchanged  # 크기와 수정 시각이 같아 읽지도 않은 파일 수
+
+
+class IndexManifest:
+    """
+    문서 디렉터리 색인 상태(파일 경로, 수정 시각, 크기, 내용 해시, 청크별 해시)를 SQLite에 기록합니다.
+    크기와 수정 시각이 같은 파일은 읽지 않고 건너뛰므로, 바뀌지 않은 큰 디렉터리도 stat 만으로 확인이 끝납니다.
+    """
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, MANIFEST_FILENAME)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL, "
+                "content_hash TEXT NOT NULL, chunk_hashes TEXT NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def entries(self) -> dict:
+        rows = self._connect().execute("SELECT path, mtime_ns, size, content_hash, chunk_hashes FROM files").fetchall()
+        return {row[0]: ManifestEntry(row[0], row[1], row[2], row[3], json.loads(row[4])) for row in rows}
+
+    def plan(self, paths) -> ChangePlan:
+        """현재 파일 목록과 기록을 비교합니다. 내용 해시 비교는 changed 파일을 읽을 때 호출자가 합니다."""
+        entries = self.entries()
+        changed, unchanged, seen = [], 0, set()
+        for path in paths:
+            path = str(path)
+            seen.add(path)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entry = entries.get(path)
+            if entry and entry.complete and entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size:
+                unchanged += 1
+                continue
+            changed.append((path, stat, entry))
+        removed = [entry for path, entry in entries.items() if path not in seen]
+        return ChangePlan(changed=changed, removed=removed, unchanged=unchanged)
+
+    def record_many(self, entries: list[ManifestEntry]):
+        if not entries:
+            return
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO files (path, mtime_ns, size, content_hash, chunk_hashes) VALUES (?, ?, ?, ?, ?)",
+                [(e.path, e.mtime_ns, e.size, e.content_hash, json.dumps(e.chunk_hashes)) for e in entries],
+            )
+
+    def remove_many(self, paths: list[str]):
+        if not paths:
+            return
+        with self._connect() as conn:
+            conn.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in paths])
@@ -0,0 +1,157 @@
+# py/ingest_queue.py
+
+import os
+import time
+import threading
+import traceback
+from collections import OrderedDict
+
+from kv_cache import content_hash
+
+# --- 1. 설정 ---
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "128"))        # 한 번에 쓰는 최대 노트 수
+INGEST_BATCH_WAIT = float(os.getenv("INGEST_BATCH_WAIT_SECONDS", "0.5"))  # 배치를 모으기 위해 기다리는 시간
+INGEST_INITIAL_WAIT = float(os.getenv("INGEST_INITIAL_WAIT_SECONDS", "60"))  # 색인이 완전히 비어 있을 때만 기다림
+
+
+class IngestionQueue:
+    """
+    벡터 저장소 쓰기를 전담하는 단일 writer 스레드입니다.
+    요청 스레드는 바뀐 노트를 submit() 으로 넘기고 바로 돌아가며, 검색은 마지막으로 커밋된 색인을 그대로 읽습니다.
+    같은 노트의 대기 중인 갱신은 마지막 것 하나로 합쳐지고, 커밋할 때마다 색인 버전이 1씩 증가합니다.
+    """
+
+    def __init__(self, write_batch, load_committed, batch_size: int = INGEST_BATCH_SIZE,
+                 batch_wait: float = INGEST_BATCH_WAIT):
+        """
+        write_batch(notes): 노트 목록을 저장소에 upsert 합니다. 실제로 쓴 노트 수를 반환할 수 있습니다
+            (이미 저장된 노트를 건너뛴 경우, None 이면 전부 쓴 것으로 셉니다).
+        load_committed(): 이미 저장된 {doc_id: 원본 내용 해시} 를 반환합니다 (처음 한 번만 호출).
+        """
+        self.write_batch = write_batch
+        self.load_committed = load_committed
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self._pending = OrderedDict()  # doc_id -> (hash, note)
+        self._committed = None         # doc_id -> hash
+        self._cond = threading.Condition()
+        self._version = 0              # 커밋된 색인 버전
+        self._submitted = 0            # submit 으로 받은 갱신 수 (통계용)
+        self._written = 0
+        self._in_flight = False        # writer 가 지금 쓰고 있는 배치가 있는지
+        self._last_error = None
+        self._thread = None
+
+    def _ensure_started(self):
+        # 호출자가 이미 self._cond 를 잡고 있어야 합니다.
+        if self._committed is None:
+            self._committed = dict(self.load_committed())
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="memordo-ingest", daemon=True)
+            self._thread.start()
+
+    # --- 요청 스레드 쪽 ---
+    def submit(self, notes: list[dict]) -> int:
+        """
+        저장된 내용과 다른 노트만 대기열에 넣고, 그 노트들이 모두 반영될 색인 버전을 반환합니다.
+        바뀐 노트가 없으면 현재 버전을 반환합니다.
+        """
+        with self._cond:
+            self._ensure_started()
+            queued = 0
+            for note in notes:
+                doc_id, content = note.get('fileName'), note.get('content')
+                if not doc_id or not content:
+                    continue
+                digest = content_hash(content)
+                pending = self._pending.get(doc_id)
+                if self._committed.get(doc_id) == digest and pending is None:
+                    continue
+                if pending is not None and pending[0] == digest:
+                    continue
+                # 같은 노트의 이전 갱신은 버리고 마지막 내용만 씁니다.
+                self._pending.pop(doc_id, None)
+                self._pending[doc_id] = (digest, note)
+                queued += 1
+            if not queued:
+                return self._version
+            self._submitted += queued
+            self._cond.notify_all()
+            # 쓰는 중인 배치와 대기 중인 노트가 모두 커밋되려면 그 배치 수만큼 버전이 올라가야 합니다.
+            return self._version + int(self._in_flight) + -(-len(self._pending) // self.batch_size)
+
+    def is_empty(self) -> bool:
+        with self._cond:
+            self._ensure_started()
+            return not self._committed
+
+    def wait_for(self, version: int, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._version < version:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "version": self._version,
+                "pending": len(self._pending),
+                "committed_docs": len(self._committed or {}),
+                "submitted": self._submitted,
+                "written": self._written,
+                "last_error": self._last_error,
+            }
+
+    # --- writer 스레드 ---
+    def _take_batch(self) -> list:
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            # 짧은 시간 동안 더 모아서 큰 배치로 씁니다 (저장소 쓰기/임베딩 호출 횟수 절감).
+            deadline = time.monotonic() + self.batch_wait
+            while len(self._pending) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = []
+            while self._pending and len(batch) < self.batch_size:
+                doc_id, (digest, note) = self._pending.popitem(last=False)
+                batch.append((doc_id, digest, note))
+            self._in_flight = True
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            started = time.perf_counter()
+            try:
+                written = self.write_batch([note for _, _, note in batch])
+            except Exception as e:
+                print(f"[오류] 색인 배치 쓰기 실패 ({len(batch)}개): {e}")
+                traceback.print_exc()
+                with self._cond:
+                    self._last_error = str(e)
+                    # 실패한 노트는 committed 에 남기지 않으므로 다음 요청의 submit 에서 다시 들어옵니다.
+                    self._version += 1
+                    self._in_flight = False
+                    self._cond.notify_all()
+                continue
+
+            with self._cond:
+                for doc_id, digest, _ in batch:
+                    self._committed[doc_id] = digest
+                self._written += len(batch) if written is None else written
+                self._version += 1
+                self._in_flight = False
+                self._last_error = None
+                self._cond.notify_all()
+            print(f"[정보] 색인 버전 {self._version}: 노트 {len(batch)}개 반영 ({time.perf_counter() - started:.2f}초)")
@@ -0,0 +1,219 @@
+# py/keyword_extractor.py
+
+import os
+import re
+import math
+import json
+import sqlite3
+import threading
+from collections import Counter
+
+from app_paths import get_cache_dir
+from kv_cache import content_hash
+
+# --- 1. 토큰화 설정 ---
+# 형태소 분석기 없이 동작하도록, 한글 어절 끝의 조사/어미를 긴 것부터 떼어내는 규칙 기반 방식을 씁니다.
+KOREAN_SUFFIXES = sorted([
+    "으로부터", "에서부터", "이라고", "라고", "이라는", "라는", "에게서", "한테서", "으로서", "으로써",
+    "에서", "에게", "한테", "께서", "까지", "부터", "으로", "처럼", "보다", "이나", "이며", "이고",
+    "입니다", "합니다", "했다", "한다", "하는", "하고", "하여", "해서", "했던", "되는", "된다", "됩니다",
+    "시키는", "시키다", "시킨", "하다", "이다", "하게", "하기", "했고", "에는", "에도", "와의", "과의",
+    "로서", "로써", "들은", "들이", "들을", "들의", "들",
+    "은", "는", "이", "가", "을", "를", "의", "에", "와", "과", "도", "만", "로", "나", "며", "고",
+], key=len, reverse=True)
+MAX_SUFFIX_STRIPS = 2  # '회의에서는' -> '회의에서' -> '회의' 처럼 조사가 겹친 경우
+
+STOPWORDS = {
+    # 한국어
+    "그리고", "그러나", "하지만", "그래서", "또한", "및", "등", "것", "수", "때", "더", "또", "이런", "저런", "그런",
+    "이것", "저것", "그것", "여기", "거기", "우리", "저희", "나", "너", "있다", "없다", "하다", "되다", "같다",
+    "위해", "대한", "통해", "관련", "경우", "정도", "지금", "오늘", "내일", "어제", "다시", "매우", "가장", "모든",
+    # 영어
+    "the", "a", "an", "and", "or", "but", "of", "to", "in", "on", "for", "with", "is", "are", "was", "were",
+    "be", "been", "it", "this", "that", "these", "those", "as", "at", "by", "from", "we", "you", "they", "i",
+}
+
+_TOKEN_PATTERN = re.compile(r"[가-힣]+|[A-Za-z][A-Za-z0-9+#.\-]*[A-Za-z0-9+#]|[A-Za-z]|\d+[A-Za-z가-힣]*")
+_CODE_FENCE = re.compile(r"```.*?```", re.DOTALL)
+_LINK = re.compile(r"https?://\S+")
+
+MIN_PHRASE_COUNT = 2  # 문서 안에서 이 횟수 이상 함께 나온 인접 토큰 쌍을 구(phrase)로 인정
+TOP_K = 5
+
+
+def _strip_suffix(word: str) -> str:
+    if not re.fullmatch(r"[가-힣]+", word):
+        return word
+    for _ in range(MAX_SUFFIX_STRIPS):
+        for suffix in KOREAN_SUFFIXES:
+            if len(word) > len(suffix) + 1 and word.endswith(suffix):
+                word = word[:-len(suffix)]
+                break
+        else:
+            break
+    return word
+
+
+def _is_predicate(word: str) -> bool:
+    # 조사/어미를 떼고도 '-다'로 끝나는 3자 이상의 한글 어절은 대부분 서술어(중요하다, 필요했다 등)입니다.
+    return len(word) > 2 and word.endswith("다") and re.fullmatch(r"[가-힣]+", word) is not None
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    텍스트를 색인어 목록으로 변환합니다.
+    문장 경계(줄바꿈/구두점)는 None 으로 표시해, 구 탐지가 문장을 넘어 이어지지 않도록 합니다.
+    """
+    text = _LINK.sub(" ", _CODE_FENCE.sub(" ", text or ""))
+    tokens = []
+    for segment in re.split(r"[\n.!?;:()\[\]{}\"'`|]+", text):
+        for raw in _TOKEN_PATTERN.findall(segment):
+            word = _strip_suffix(raw.lower())
+            if len(word) < 2 or word in STOPWORDS or word.isdigit() or _is_predicate(word):
+                tokens.append(None)
+                continue
+            tokens.append(word)
+        tokens.append(None)
+    return tokens
+
+
+def extract_terms(text: str) -> Counter:
+    """단일어와, 문서 안에서 반복되는 인접 2단어 구의 빈도를 함께 셉니다."""
+    tokens = tokenize(text)
+    counts = Counter(token for token in tokens if token)
+    bigrams = Counter(
+        f"{first} {second}" for first, second in zip(tokens, tokens[1:]) if first and second and first != second
+    )
+    for phrase, count in bigrams.items():
+        if count >= MIN_PHRASE_COUNT:
+            counts[phrase] = count
+    return counts
+
+
+# --- 2. 코퍼스 IDF 색인 (증분 갱신) ---
+class CorpusIndex:
+    """
+    사용자의 노트 전체에 대한 문서 빈도(df)를 SQLite에 유지합니다.
+    노트가 바뀌면 이전 용어 집합을 빼고 새 용어 집합을 더하는 방식으로 증분 갱신합니다.
+    """
+
+    def __init__(self, path: str | None = None):
+        self.path = path or os.path.join(get_cache_dir(), "keyword_index.sqlite3")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS docs (doc_id TEXT PRIMARY KEY, hash TEXT, terms TEXT)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS df (term TEXT PRIMARY KEY, count INTEGER NOT NULL)")
+
+    def _apply(self, terms: set, delta: int):
+        self._conn.executemany(
+            "INSERT INTO df (term, count) VALUES (?, ?) ON CONFLICT(term) DO UPDATE SET count = count + excluded.count",
+            [(term, delta) for term in terms],
+        )
+
+    def upsert(self, doc_id: str, text: str) -> bool:
+        """노트를 색인에 반영합니다. 내용이 바뀌지 않았으면 아무것도 하지 않고 False 를 반환합니다."""
+        doc_hash = content_hash(text)
+        with self._lock:
+            row = self._conn.execute("SELECT hash, terms FROM docs WHERE doc_id = ?", (doc_id,)).fetchone()
+            if row and row[0] == doc_hash:
+                return False
+            new_terms = set(extract_terms(text))
+            with self._conn:
+                if row:
+                    self._apply(set(json.loads(row[1])), -1)
+                self._apply(new_terms, +1)
+                self._conn.execute("DELETE FROM df WHERE count <= 0")
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO docs (doc_id, hash, terms) VALUES (?, ?, ?)",
+                    (doc_id, doc_hash, json.dumps(sorted(new_terms), ensure_ascii=False)),
+                )
+            return True
+
+    def remove(self, doc_id: str):
+        with self._lock:
+            row = self._conn.execute("SELECT terms FROM docs WHERE doc_id = ?", (doc_id,)).fetchone()
+            if not row:
+                return
+            with self._conn:
+                self._apply(set(json.loads(row[0])), -1)
+                self._conn.execute("DELETE FROM df WHERE count <= 0")
+                self._conn.execute("DELETE FROM docs WHERE doc_id = ?", (doc_id,))
+
+    def idf(self, terms: list[str]) -> dict:
+        with self._lock:
+            total_docs = self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+            doc_freq = {}
+            for start in range(0, len(terms), 500):
+                batch = terms[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT term, count FROM df WHERE term IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                doc_freq.update(rows)
+        # 스무딩된 IDF: 코퍼스가 비어 있어도 0 이 되지 않도록 합니다.
+        return {term: math.log((1 + total_docs) / (1 + doc_freq.get(term, 0))) + 1.0 for term in terms}
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_corpus_index() -> CorpusIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = CorpusIndex()
+        return _index
+
+
+# --- 3. 키워드 추출 ---
+def extract_keywords(text: str, top_k: int = TOP_K, index: CorpusIndex | None = None) -> list[tuple[str, float]]:
+    """TF-IDF 점수가 높은 키워드(구 포함)를 (키워드, 0~1 점수) 목록으로 반환합니다."""
+    counts = extract_terms(text)
+    if not counts:
+        return []
+    idf = (index or get_corpus_index()).idf(list(counts))
+    max_count = max(counts.values())
+    scores = {}
+    for term, count in counts.items():
+        # 증강 TF(0.5 + 0.5 * tf/max_tf)로 긴 문서에서 빈도가 과도하게 커지는 것을 막고, 구는 가중치를 더 줍니다.
+        tf = 0.5 + 0.5 * count / max_count
+        phrase_boost = 1.5 if " " in term else 1.0
+        scores[term] = tf * idf[term] * phrase_boost
+
+    ranked = []
+    for term, score in sorted(scores.items(), key=lambda item: item[1], reverse=True):
+        # 이미 고른 구에 포함된 단일어, 또는 이미 고른 단일어로 이루어진 구는 중복으로 봅니다.
+        if any(term in chosen.split(" ") or chosen in term.split(" ") for chosen, _ in ranked):
+            continue
+        ranked.append((term, score))
+        if len(ranked) == top_k:
+            break
+
+    best = ranked[0][1]
+    return [(term, round(score / best, 2)) for term, score in ranked]
+
+
+def format_keywords(keywords: list[tuple[str, float]]) -> str:
+    """LLM 키워드 작업과 같은 `키워드: 점수` 줄 형식으로 만듭니다."""
+    return "\n".join(f"{term}: {score:.2f}" for term, score in keywords)
+
+
+def extract_keywords_text(text: str, doc_id: str | None = None, top_k: int = TOP_K) -> str:
+    index = get_corpus_index()
+    if doc_id:
+        index.upsert(doc_id, text)
+    return format_keywords(extract_keywords(text, top_k, index))
+
+
+def bulk_extract(notes: list[dict], top_k: int = TOP_K) -> dict:
+    """
+    [{'fileName': ..., 'content': ...}] 전체를 먼저 색인에 반영한 뒤 노트별 키워드를 뽑습니다.
+    API 호출 없이 볼트 전체를 태깅할 때 사용합니다.
+    """
+    index = get_corpus_index()
+    valid = [note for note in notes if note.get('fileName') and note.get('content')]
+    for note in valid:
+        index.upsert(note['fileName'], note['content'])
+    return {note['fileName']: format_keywords(extract_keywords(note['content'], top_k, index)) for note in valid}
@@ -0,0 +1,97 @@
+# py/kv_cache.py
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+from app_paths import get_cache_dir
+
+CACHE_DB_FILENAME = "memordo_cache.sqlite3"
+
+
+def content_hash(*parts: str) -> str:
+    """캐시 키로 쓸 sha256 해시를 만듭니다. 여러 조각은 구분자를 넣어 이어 붙입니다."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x1f")
+    return digest.hexdigest()
+
+
+class KVCache:
+    """
+    SQLite 기반의 영속 키-값 캐시입니다. (namespace, key) -> JSON 값.
+    WAL 모드를 사용하므로 여러 스레드/프로세스가 같은 파일을 안전하게 공유할 수 있습니다.
+    """
+
+    def __init__(self, path: str | None = None):
+        self.path = path or os.path.join(get_cache_dir(), CACHE_DB_FILENAME)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS kv ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, updated_at REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 연결은 스레드 간에 공유하지 않고 스레드마다 하나씩 엽니다.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace: str, key: str, default=None):
+        row = self._connect().execute(
+            "SELECT value FROM kv WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def get_many(self, namespace: str, keys: list[str]) -> dict:
+        result = {}
+        conn = self._connect()
+        # SQLite 변수 개수 제한(기본 999)을 넘지 않도록 나눠서 조회합니다.
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                f"SELECT key, value FROM kv WHERE namespace = ? AND key IN ({placeholders})", (namespace, *batch)
+            ).fetchall()
+            result.update({key: json.loads(value) for key, value in rows})
+        return result
+
+    def set(self, namespace: str, key: str, value):
+        self.set_many(namespace, {key: value})
+
+    def set_many(self, namespace: str, items: dict):
+        if not items:
+            return
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO kv (namespace, key, value, updated_at) VALUES (?, ?, ?, ?)",
+                [(namespace, key, json.dumps(value, ensure_ascii=False), now) for key, value in items.items()],
+            )
+
+    def delete(self, namespace: str, key: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key))
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_cache() -> KVCache:
+    """프로세스 전역 캐시를 처음 사용할 때 엽니다."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = KVCache()
+        return _default_cache
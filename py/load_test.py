@@ -0,0 +1,195 @@
+# py/load_test.py
+"""
+run_server.py 에 실제와 비슷한 요청 혼합을 보내고 엔드포인트별 처리량과 꼬리 지연을 보고합니다.
+보통 mock_llm_server.py 와 함께 사용합니다.
+
+사용법:
+    python mock_llm_server.py --port 8089 &
+    GEMINI_API_ENDPOINT=http://127.0.0.1:8089 python run_server.py &
+    python load_test.py --target http://127.0.0.1:5001 --duration 60 --concurrency 16 \\
+        --mix rag_chat=1,execute_task=6,graph=1
+"""
+
+import argparse
+import random
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+TOPICS = ["프로젝트 일정", "분기 예산", "채용 계획", "데이터 파이프라인", "온보딩 개선", "캐시 정책", "모바일 앱 출시",
+          "고객 인터뷰", "보안 점검", "성능 측정"]
+SENTENCES = [
+    "{topic}에 대해 회의에서 논의했다.",
+    "{topic} 관련 결정 사항은 다음 주까지 정리하기로 했다.",
+    "담당자는 {topic}의 위험 요소를 다시 검토한다.",
+    "{topic}은 지난 분기보다 진행 속도가 빨라졌다.",
+    "{topic} 문서에 수치와 근거를 추가해야 한다.",
+    "다음 회의에서는 {topic}의 우선순위를 정한다.",
+]
+QUESTIONS = ["{topic}에 대해 정리해줘", "{topic}의 결정 사항은 뭐였지?", "{topic} 관련해서 남은 일은?"]
+
+
+# --- 1. 합성 데이터 ---
+def make_notes(count: int, seed: int) -> list[dict]:
+    rng = random.Random(seed)
+    notes = []
+    for i in range(count):
+        topic = rng.choice(TOPICS)
+        # 짧은 메모(보강 대상)와 긴 메모를 섞습니다.
+        length = rng.choice([1, 2, 8, 20, 40])
+        content = " ".join(rng.choice(SENTENCES).format(topic=topic) for _ in range(length))
+        notes.append({"fileName": f"note_{i:04d}.md", "content": content})
+    return notes
+
+
+def make_edges(notes: list[dict], rng: random.Random) -> list[dict]:
+    return [{"from": rng.choice(notes)["fileName"], "to": rng.choice(notes)["fileName"], "similarity": 0.8}
+            for _ in range(len(notes) // 2)]
+
+
+# --- 2. 요청 종류 ---
+def req_rag_chat(rng: random.Random, notes: list[dict]) -> tuple[str, str, dict]:
+    sample = rng.sample(notes, min(len(notes), rng.randint(5, 30)))
+    question = rng.choice(QUESTIONS).format(topic=rng.choice(TOPICS))
+    return "rag_chat", "/api/rag_chat", {"query": question, "notes": sample, "edges": make_edges(sample, rng)}
+
+
+def req_execute_task(rng: random.Random, notes: list[dict]) -> tuple[str, str, dict]:
+    task_type = rng.choices(["chat", "summarize", "memo", "keyword"], weights=[4, 2, 1, 3])[0]
+    note = rng.choice(notes)
+    payload = {"task_type": task_type, "text": note["content"], "fileName": note["fileName"]}
+    if task_type == "chat":
+        payload["text"] = rng.choice(QUESTIONS).format(topic=rng.choice(TOPICS))
+    if task_type == "keyword" and rng.random() < 0.2:
+        payload["use_llm"] = True
+    return f"execute_task:{task_type}", "/api/execute_task", payload
+
+
+def req_graph(rng: random.Random, notes: list[dict]) -> tuple[str, str, dict]:
+    return "graph", "/api/generate-graph-data", rng.sample(notes, min(len(notes), rng.randint(20, 100)))
+
+
+def req_embeddings(rng: random.Random, notes: list[dict]) -> tuple[str, str, dict]:
+    return "embeddings", "/api/get-embeddings?format=f16", rng.sample(notes, min(len(notes), 50))
+
+
+REQUEST_KINDS = {
+    "rag_chat": req_rag_chat,
+    "execute_task": req_execute_task,
+    "graph": req_graph,
+    "embeddings": req_embeddings,
+}
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip() not in REQUEST_KINDS:
+            raise SystemExit(f"알 수 없는 요청 종류: {name} (가능: {', '.join(REQUEST_KINDS)})")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+# --- 3. 실행 / 집계 ---
+class Results:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.status = defaultdict(lambda: defaultdict(int))
+        self.lock = threading.Lock()
+
+    def record(self, name: str, seconds: float, status):
+        with self.lock:
+            self.latencies[name].append(seconds)
+            self.status[name][status] += 1
+            if status != 200:
+                self.errors[name] += 1
+
+
+def percentile(ordered: list[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def worker(args, notes, weights, results, deadline, worker_id):
+    rng = random.Random(args.seed + worker_id)
+    session = requests.Session()
+    kinds, kind_weights = list(weights), list(weights.values())
+    while time.perf_counter() < deadline:
+        name, path, payload = REQUEST_KINDS[rng.choices(kinds, weights=kind_weights)[0]](rng, notes)
+        started = time.perf_counter()
+        try:
+            response = session.post(args.target + path, json=payload, timeout=args.timeout)
+            status = response.status_code
+        except requests.RequestException as e:
+            status = type(e).__name__
+        results.record(name, time.perf_counter() - started, status)
+        if args.think_ms:
+            time.sleep(rng.expovariate(1000.0 / args.think_ms))
+
+
+def report(results: Results, elapsed: float):
+    print(f"\n=== 결과 ({elapsed:.1f}초) ===")
+    print(f"{'endpoint':<24} {'count':>6} {'err':>5} {'rps':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    total = 0
+    for name in sorted(results.latencies):
+        ordered = sorted(results.latencies[name])
+        total += len(ordered)
+        print(f"{name:<24} {len(ordered):>6} {results.errors[name]:>5} {len(ordered) / elapsed:>7.2f} "
+              f"{percentile(ordered, 0.50):>8.3f} {percentile(ordered, 0.95):>8.3f} "
+              f"{percentile(ordered, 0.99):>8.3f} {ordered[-1]:>8.3f}")
+    print(f"{'TOTAL':<24} {total:>6} {sum(results.errors.values()):>5} {total / elapsed:>7.2f}")
+    for name in sorted(results.status):
+        codes = dict(results.status[name])
+        if set(codes) != {200}:
+            print(f"  {name} 상태 코드: {codes}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memordo AI 서버 부하 테스트")
+    parser.add_argument("--target", default="http://127.0.0.1:5001")
+    parser.add_argument("--duration", type=float, default=30.0, help="측정 시간(초)")
+    parser.add_argument("--warmup", type=float, default=5.0, help="측정 전 워밍업 시간(초), 결과에서 제외")
+    parser.add_argument("--concurrency", type=int, default=8, help="동시 클라이언트 수")
+    parser.add_argument("--mix", default="rag_chat=1,execute_task=6,graph=1", help="요청 종류=가중치 목록")
+    parser.add_argument("--notes", type=int, default=200, help="합성 노트 수")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="클라이언트별 요청 간 평균 대기(지수분포)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--api-key", default="mock-key", help="/api/initialize 에 보낼 키 (모의 서버는 검사하지 않음)")
+    parser.add_argument("--no-init", action="store_true", help="/api/initialize 호출 생략")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    weights = parse_mix(args.mix)
+    notes = make_notes(args.notes, args.seed)
+
+    if not args.no_init:
+        response = requests.post(f"{args.target}/api/initialize", json={"api_key": args.api_key}, timeout=30)
+        print(f"/api/initialize -> {response.status_code}")
+        requests.post(f"{args.target}/api/warmup", timeout=300)
+
+    for phase, seconds in (("워밍업", args.warmup), ("측정", args.duration)):
+        if seconds <= 0:
+            continue
+        print(f"{phase} {seconds:.0f}초, 동시성 {args.concurrency}, 혼합 {weights}")
+        results = Results()
+        started = time.perf_counter()
+        deadline = started + seconds
+        threads = [threading.Thread(target=worker, args=(args, notes, weights, results, deadline, i), daemon=True)
+                   for i in range(args.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if phase == "측정":  # 워밍업 결과는 보고하지 않습니다.
+            report(results, time.perf_counter() - started)
+    if args.duration <= 0:
+        print("측정 시간이 0초라 보고할 결과가 없습니다 (--duration 을 지정하세요).")
+
+
+if __name__ == "__main__":
+    main()
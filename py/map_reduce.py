@@ -0,0 +1,219 @@
+# py/map_reduce.py
+
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import gemini_ai
+from kv_cache import get_cache, content_hash
+from model_router import route_model
+from rate_limiter import estimate_tokens
+
+# --- 1. 설정 ---
+# 입력이 이 토큰 수를 넘으면 한 번에 프롬프트로 보내지 않고 map-reduce 로 처리합니다.
+LONG_INPUT_THRESHOLD = int(os.getenv("LONG_INPUT_THRESHOLD_TOKENS", "6000"))
+PIECE_TOKENS = int(os.getenv("MAP_PIECE_TOKENS", "3000"))  # 조각 하나(및 reduce 묶음 하나)의 최대 토큰 수
+# 조각 경계는 문단 내용의 해시로 정하고(content-defined), 이 토큰 수보다 짧은 조각은 만들지 않습니다 (0 이면 최대값의 1/4).
+PIECE_MIN_TOKENS = int(os.getenv("MAP_PIECE_MIN_TOKENS", "0"))
+MAP_WORKERS = 4  # 동시 map 호출 수 (실제 동시성은 rate_limiter가 한 번 더 제한)
+CACHE_NAMESPACE = "map_summary"
+
+MAP_PROMPT = """다음은 긴 문서의 일부입니다. 이 부분의 핵심 내용, 결정 사항, 고유명사와 수치를 빠뜨리지 말고 한국어로 간결하게 요약해주세요.
+다른 설명 없이 요약문만 답변해주세요.
+
+\"\"\"
+[TEXT]
+\"\"\""""
+
+REDUCE_PROMPT = """다음은 하나의 긴 문서를 순서대로 나눈 부분별 요약입니다.
+중복을 없애고 흐름이 이어지도록 하나의 요약으로 합쳐주세요. 핵심 내용, 결정 사항, 고유명사와 수치는 유지해주세요.
+다른 설명 없이 요약문만 답변해주세요.
+
+\"\"\"
+[TEXT]
+\"\"\""""
+
+_PARAGRAPH_SPLIT = re.compile(r"\n\s*\n")
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?。])\s+|\n")
+
+
+def is_long_input(text: str) -> bool:
+    return estimate_tokens(text) > LONG_INPUT_THRESHOLD
+
+
+# --- 2. 분할 ---
+def _hard_split(text: str, max_tokens: int) -> list[str]:
+    """문장 단위로도 나눌 수 없는 긴 덩어리는 토큰 추정치에 맞춰 글자 수로 자릅니다."""
+    pieces = []
+    current = ""
+    for sentence in filter(None, (s.strip() for s in _SENTENCE_SPLIT.split(text))):
+        if current and estimate_tokens(current + " " + sentence) > max_tokens:
+            pieces.append(current)
+            current = ""
+        current = f"{current} {sentence}".strip()
+    if current:
+        pieces.append(current)
+
+    result = []
+    max_chars = max_tokens * 3  # estimate_tokens 의 역산
+    for piece in pieces:
+        result.extend(piece[i:i + max_chars] for i in range(0, len(piece), max_chars))
+    return result
+
+
+def _is_boundary(paragraph: str, paragraph_tokens: int, average_tokens: int) -> bool:
+    """
+    문단 내용의 해시로 이 문단 뒤에서 조각을 끊을지 정합니다.
+    긴 문단일수록 끊길 확률이 커지도록 (paragraph_tokens / average_tokens) 확률을 쓰므로, 조각 길이의 기댓값은 문단 구성과 무관하게 average_tokens 근처입니다.
+    """
+    return int(content_hash(paragraph)[:8], 16) < 0x100000000 * min(1.0, paragraph_tokens / average_tokens)
+
+
+def split_by_tokens(text: str, max_tokens: int | None = None, min_tokens: int | None = None) -> list[str]:
+    """
+    문단 경계를 지키며 min_tokens 이상, max_tokens(기본값 PIECE_TOKENS) 이하의 조각으로 나눕니다.
+    조각은 내용 해시가 조건을 만족하는 문단 뒤에서 끊기므로(content-defined), 문서 중간의 문단을 고쳐도
+    그 근처 조각만 바뀌고 다음 해시 경계부터는 이전과 같은 조각이 나와 캐시를 그대로 씁니다.
+    """
+    max_tokens = max_tokens or PIECE_TOKENS
+    min_tokens = min(min_tokens or PIECE_MIN_TOKENS or max_tokens // 4, max_tokens)
+    average_tokens = max(1, max_tokens // 2)
+    pieces = []
+    current = []
+    current_tokens = 0
+
+    def flush():
+        nonlocal current, current_tokens
+        if current:
+            pieces.append("\n\n".join(current))
+            current, current_tokens = [], 0
+
+    for paragraph in filter(None, (p.strip() for p in _PARAGRAPH_SPLIT.split(text))):
+        paragraph_tokens = estimate_tokens(paragraph)
+        if paragraph_tokens > max_tokens:
+            flush()
+            pieces.extend(_hard_split(paragraph, max_tokens))
+            continue
+        if current and current_tokens + paragraph_tokens > max_tokens:
+            flush()  # 해시 경계를 만나기 전에 최대 크기에 닿으면 강제로 끊습니다.
+        current.append(paragraph)
+        current_tokens += paragraph_tokens
+        if current_tokens >= min_tokens and _is_boundary(paragraph, paragraph_tokens, average_tokens):
+            flush()
+    flush()
+    return pieces
+
+
+# --- 3. map / reduce ---
+def _summarize_cached(prompt_template: str, text: str, model_name: str) -> str:
+    cache = get_cache()
+    key = content_hash(model_name, prompt_template, text)
+    cached = cache.get(CACHE_NAMESPACE, key)
+    if cached is not None:
+        return cached
+    summary = gemini_ai.query_gemini(prompt_template.replace("[TEXT]", text), model_name=model_name)
+    if summary.startswith("Error:"):
+        raise RuntimeError(summary)
+    cache.set(CACHE_NAMESPACE, key, summary)
+    return summary
+
+
+def _iter_parallel_summaries(prompt_template: str, texts: list[str], task_type: str, progress: dict):
+    """
+    조각들을 병렬로 요약하면서 하나가 끝날 때마다 진행 이벤트(progress + done/total)를 내보내고,
+    입력 순서대로의 요약 목록을 반환합니다 (yield from 의 값). 도중에 닫히면 아직 시작하지 않은 조각은 취소합니다.
+    """
+    if not texts:
+        return []
+    model_name = route_model(task_type, PIECE_TOKENS)
+    executor = ThreadPoolExecutor(max_workers=min(MAP_WORKERS, len(texts)))
+    try:
+        futures = [executor.submit(_summarize_cached, prompt_template, text, model_name) for text in texts]
+        for done, future in enumerate(as_completed(futures), 1):
+            future.result()  # 실패한 조각이 있으면 나머지를 기다리지 않고 바로 알립니다.
+            yield {**progress, "done": done, "total": len(texts)}
+        return [future.result() for future in futures]
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _drain(events):
+    """진행 이벤트는 버리고 생성기의 반환값만 얻습니다."""
+    while True:
+        try:
+            next(events)
+        except StopIteration as stop:
+            return stop.value
+
+
+def _group_by_tokens(texts: list[str], max_tokens: int) -> list[str]:
+    groups, current, current_tokens = [], [], 0
+    for text in texts:
+        tokens = estimate_tokens(text)
+        if current and current_tokens + tokens > max_tokens:
+            groups.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        groups.append("\n\n".join(current))
+    return groups
+
+
+def iter_reduce_text(text: str):
+    """
+    긴 텍스트를 조각별로 병렬 요약(map)한 뒤, 한 조각 크기에 들어올 때까지 요약을 묶어 다시 요약(reduce)합니다.
+    조각별 결과는 내용 해시로 캐시되어, 수정된 문서를 다시 요약할 때는 바뀐 조각만 다시 호출합니다.
+    단계 진행 이벤트({"stage": "map"|"reduce", "level", "done", "total"})를 내보내고 줄인 텍스트를 반환합니다.
+    """
+    pieces = split_by_tokens(text)
+    print(f"[정보] 긴 입력 map-reduce: 약 {estimate_tokens(text)} 토큰 -> {len(pieces)}개 조각")
+    summaries = yield from _iter_parallel_summaries(MAP_PROMPT, pieces, "map_summary", {"stage": "map", "level": 0})
+
+    level = 1
+    while len(summaries) > 1 and estimate_tokens("\n\n".join(summaries)) > PIECE_TOKENS:
+        groups = _group_by_tokens(summaries, PIECE_TOKENS)
+        if len(groups) == len(summaries):
+            # 요약 하나하나가 이미 조각 크기만큼 길면 두 개씩 강제로 묶어 진행을 보장합니다.
+            groups = ["\n\n".join(summaries[i:i + 2]) for i in range(0, len(summaries), 2)]
+        print(f"[정보] reduce 단계 {level}: {len(summaries)}개 요약 -> {len(groups)}개")
+        summaries = yield from _iter_parallel_summaries(REDUCE_PROMPT, groups, "reduce_summary",
+                                                        {"stage": "reduce", "level": level})
+        level += 1
+    return "\n\n".join(summaries)
+
+
+def reduce_text(text: str) -> str:
+    return _drain(iter_reduce_text(text))
+
+
+def execute_long_task(task_type: str, text: str) -> str:
+    """긴 입력을 reduce_text 로 줄인 뒤 원래 작업 프롬프트(요약/메모/키워드)를 적용합니다."""
+    try:
+        reduced = reduce_text(text)
+    except RuntimeError as e:
+        return str(e)
+    prompt = gemini_ai.build_task_prompt(task_type, reduced)
+    return gemini_ai.query_gemini(prompt, model_name=route_model(task_type, estimate_tokens(prompt)))
+
+
+def stream_long_task(task_type: str, text: str, should_cancel=None):
+    """
+    execute_long_task 의 스트리밍 버전입니다. map/reduce 진행 이벤트(dict)를 조각이 끝날 때마다 내보낸 뒤,
+    줄인 텍스트에 원래 작업 프롬프트를 적용한 마지막 호출의 응답 조각(str)을 생성되는 대로 내보냅니다.
+    map 단계가 실패하면 RuntimeError 를 그대로 올려 호출자가 오류 이벤트로 알리게 합니다.
+    """
+    events = iter_reduce_text(text)
+    while True:
+        try:
+            event = next(events)
+        except StopIteration as stop:
+            reduced = stop.value
+            break
+        yield event
+        if should_cancel and should_cancel():
+            events.close()
+            print("[정보] 클라이언트 연결이 끊겨 map-reduce 를 중단합니다.")
+            return
+    prompt = gemini_ai.build_task_prompt(task_type, reduced)
+    yield from gemini_ai.stream_gemini(prompt, should_cancel, model_name=route_model(task_type, estimate_tokens(prompt)))
@@ -0,0 +1,231 @@
+# py/mock_llm_server.py
+"""
+부하 테스트용 로컬 Gemini / Ollama 대역 서버입니다. 실제 API 키나 Ollama 없이 run_server.py 를 측정할 수 있습니다.
+
+- Gemini REST: POST /v1beta/models/{model}:generateContent | :streamGenerateContent | :embedContent
+               | :batchEmbedContents | :countTokens
+- Ollama     : POST /api/generate (stream true/false), GET /api/tags
+
+사용법:
+    python mock_llm_server.py --port 8089 --latency-ms 400 --jitter-ms 200 --error-rate 0.01 --rate-limit-rate 0.02
+    GEMINI_API_ENDPOINT=http://127.0.0.1:8089 OLLAMA_API_URL=http://127.0.0.1:8089/api/generate python run_server.py
+"""
+
+import argparse
+import datetime
+import hashlib
+import json
+import random
+import time
+
+import numpy as np
+from flask import Flask, Response, jsonify, request
+
+app = Flask(__name__)
+
+CONFIG = {
+    "latency_ms": 300.0,       # 응답 하나의 평균 지연
+    "jitter_ms": 150.0,        # 지연의 표준편차 (정규분포, 0 미만은 0)
+    "embed_latency_ms": 60.0,  # 임베딩 요청 지연
+    "chunk_delay_ms": 40.0,    # 스트리밍 청크 사이 지연
+    "error_rate": 0.0,         # 500 INTERNAL 비율
+    "rate_limit_rate": 0.0,    # 429 RESOURCE_EXHAUSTED 비율
+    "dim": 768,                # 임베딩 차원
+    "seed": None,
+}
+
+LOREM_KO = [
+    "노트에 따르면 이번 분기의 핵심 목표는 사용자 온보딩 개선입니다.",
+    "회의에서는 예산 조정과 일정 재검토가 결정되었습니다.",
+    "관련 메모를 종합하면 데이터 파이프라인의 병목은 임베딩 단계입니다.",
+    "추가로 검토가 필요한 항목은 캐시 정책과 재시도 전략입니다.",
+    "요약하면 현재 구조를 유지하되 배치 처리를 늘리는 것이 좋습니다.",
+    "참고한 노트에는 구체적인 수치와 담당자가 함께 기록되어 있습니다.",
+]
+
+
+# --- 1. 공통 동작 (지연 / 오류 주입 / 응답 생성) ---
+def _sleep(mean_ms: float):
+    delay = max(0.0, random.gauss(mean_ms, CONFIG["jitter_ms"] if mean_ms else 0.0))
+    time.sleep(delay / 1000.0)
+
+
+def _injected_error():
+    roll = random.random()
+    if roll < CONFIG["rate_limit_rate"]:
+        return jsonify({"error": {"code": 429, "message": "Resource has been exhausted (e.g. check quota).",
+                                  "status": "RESOURCE_EXHAUSTED"}}), 429
+    if roll < CONFIG["rate_limit_rate"] + CONFIG["error_rate"]:
+        return jsonify({"error": {"code": 500, "message": "Internal error encountered.", "status": "INTERNAL"}}), 500
+    return None
+
+
+def _prompt_text(body: dict) -> str:
+    parts = []
+    for content in body.get("contents", []):
+        for part in content.get("parts", []):
+            parts.append(part.get("text", ""))
+    return "\n".join(parts)
+
+
+def _canned_answer(prompt: str) -> str:
+    """Memordo 프롬프트 종류에 맞춰, 후속 파싱이 실제처럼 동작하는 응답을 돌려줍니다."""
+    if "도움이 되는 문서 번호" in prompt:
+        count = prompt.count("문서 번호:")
+        return ", ".join(str(i) for i in range(min(count, 2))) or "None"
+    if "키워드" in prompt and "점수" in prompt:
+        return "\n".join(f"키워드{i}: {0.9 - i * 0.1:.2f}" for i in range(5))
+    if "키워드 구문" in prompt:
+        return "프로젝트 일정 예산 회의 결정 사항"
+    if "재작성된 질문" in prompt:
+        return "노트에 기록된 프로젝트 일정과 예산 결정 사항은 무엇인가요?"
+    sentences = random.randint(2, 6)
+    return " ".join(random.choice(LOREM_KO) for _ in range(sentences))
+
+
+def _candidate(text: str) -> dict:
+    return {"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP", "index": 0}
+
+
+def _usage(prompt: str, answer: str) -> dict:
+    prompt_tokens, answer_tokens = max(1, len(prompt) // 3), max(1, len(answer) // 3)
+    return {"promptTokenCount": prompt_tokens, "candidatesTokenCount": answer_tokens,
+            "totalTokenCount": prompt_tokens + answer_tokens}
+
+
+def _embedding(text: str) -> list[float]:
+    # 같은 텍스트는 항상 같은 벡터가 나오도록 내용 해시로 시드를 정합니다 (캐시 동작 측정용).
+    seed = int.from_bytes(hashlib.sha256((text or "").encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).normal(size=CONFIG["dim"]).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def _content_text(content: dict) -> str:
+    return "\n".join(part.get("text", "") for part in (content or {}).get("parts", []))
+
+
+# --- 2. Gemini REST ---
+@app.route("/<version>/models/<path:model_action>", methods=["POST"])
+def gemini_model_action(version, model_action):
+    model, _, action = model_action.partition(":")
+    body = request.get_json(silent=True) or {}
+
+    if action in ("embedContent", "batchEmbedContents"):
+        _sleep(CONFIG["embed_latency_ms"])
+        error = _injected_error()
+        if error:
+            return error
+        if action == "embedContent":
+            return jsonify({"embedding": {"values": _embedding(_content_text(body.get("content")))}})
+        return jsonify({"embeddings": [{"values": _embedding(_content_text(req.get("content")))}
+                                       for req in body.get("requests", [])]})
+
+    if action == "countTokens":
+        return jsonify({"totalTokens": max(1, len(_prompt_text(body)) // 3)})
+
+    if action not in ("generateContent", "streamGenerateContent"):
+        return jsonify({"error": {"code": 404, "message": f"unknown action {action}", "status": "NOT_FOUND"}}), 404
+
+    prompt = _prompt_text(body)
+    answer = _canned_answer(prompt)
+
+    if action == "generateContent":
+        _sleep(CONFIG["latency_ms"])
+        error = _injected_error()
+        if error:
+            return error
+        return jsonify({"candidates": [_candidate(answer)], "usageMetadata": _usage(prompt, answer),
+                        "modelVersion": model})
+
+    # 첫 청크까지의 지연(TTFT)을 latency_ms 로 보고, 이후 청크는 chunk_delay_ms 간격으로 보냅니다.
+    _sleep(CONFIG["latency_ms"])
+    error = _injected_error()
+    if error:
+        return error
+    words = answer.split(" ")
+    chunks = [" ".join(words[i:i + 3]) + (" " if i + 3 < len(words) else "") for i in range(0, len(words), 3)]
+    sse = request.args.get("alt") == "sse"
+
+    def generate():
+        if not sse:
+            yield "["
+        for i, chunk in enumerate(chunks):
+            if i:
+                time.sleep(CONFIG["chunk_delay_ms"] / 1000.0)
+            payload = {"candidates": [_candidate(chunk)]}
+            if i == len(chunks) - 1:
+                payload["usageMetadata"] = _usage(prompt, answer)
+            if sse:
+                yield f"data: {json.dumps(payload, ensure_ascii=False)}\r\n\r\n"
+            else:
+                yield ("," if i else "") + json.dumps(payload, ensure_ascii=False)
+        if not sse:
+            yield "]"
+
+    return Response(generate(), mimetype="text/event-stream" if sse else "application/json")
+
+
+# --- 3. Ollama ---
+@app.route("/api/generate", methods=["POST"])
+def ollama_generate():
+    body = request.get_json(silent=True) or {}
+    model = body.get("model", "mock")
+    answer = _canned_answer(body.get("prompt", ""))
+    started = time.perf_counter()
+    _sleep(CONFIG["latency_ms"])
+    error = _injected_error()
+    if error:
+        return jsonify({"error": "mock injected error"}), error[1]
+
+    def record(response: str, done: bool) -> dict:
+        item = {"model": model, "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                "response": response, "done": done}
+        if done:
+            item["total_duration"] = int((time.perf_counter() - started) * 1e9)
+            item["eval_count"] = max(1, len(answer) // 3)
+        return item
+
+    if body.get("stream") is False:
+        return jsonify(record(answer, True))
+
+    def generate():
+        for word in answer.split(" "):
+            time.sleep(CONFIG["chunk_delay_ms"] / 1000.0)
+            yield json.dumps(record(word + " ", False), ensure_ascii=False) + "\n"
+        yield json.dumps(record("", True), ensure_ascii=False) + "\n"
+
+    return Response(generate(), mimetype="application/x-ndjson")
+
+
+@app.route("/api/tags", methods=["GET"])
+def ollama_tags():
+    return jsonify({"models": [{"name": "llama3.1:8b", "model": "llama3.1:8b"}]})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memordo 부하 테스트용 Gemini/Ollama 모의 서버")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--threads", type=int, default=64)
+    parser.add_argument("--latency-ms", type=float, default=CONFIG["latency_ms"])
+    parser.add_argument("--jitter-ms", type=float, default=CONFIG["jitter_ms"])
+    parser.add_argument("--embed-latency-ms", type=float, default=CONFIG["embed_latency_ms"])
+    parser.add_argument("--chunk-delay-ms", type=float, default=CONFIG["chunk_delay_ms"])
+    parser.add_argument("--error-rate", type=float, default=CONFIG["error_rate"])
+    parser.add_argument("--rate-limit-rate", type=float, default=CONFIG["rate_limit_rate"])
+    parser.add_argument("--dim", type=int, default=CONFIG["dim"])
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    for key in CONFIG:
+        CONFIG[key] = getattr(args, key)
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    from waitress import serve
+    print(f"모의 LLM 서버 시작: http://{args.host}:{args.port} (설정: {CONFIG})")
+    serve(app, host=args.host, port=args.port, threads=args.threads)
+
+
+if __name__ == "__main__":
+    main()
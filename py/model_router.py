@@ -0,0 +1,136 @@
+# py/model_router.py
+
+import os
+import json
+import threading
+from collections import deque
+
+# --- 1. 라우팅 테이블 ---
+# 작업 유형별로 입력 토큰 구간마다 후보 모델(선호 순서)과 지연 목표(초)를 정합니다.
+# 구간은 max_input_tokens 오름차순으로 검사하며, 마지막 구간은 None(상한 없음)으로 둡니다.
+# GEMINI_ROUTING_TABLE 환경변수(JSON)로 작업 유형 단위로 덮어쓸 수 있습니다.
+# 예: GEMINI_ROUTING_TABLE='{"summarize": [{"max_input_tokens": null, "models": ["gemini-2.5-flash"], "latency_target": 10}]}'
+DEFAULT_ROUTING_TABLE = {
+    "keyword": [
+        {"max_input_tokens": 8000, "models": ["gemini-2.5-flash-lite", "gemini-2.5-flash"], "latency_target": 3},
+        {"max_input_tokens": None, "models": ["gemini-2.5-flash"], "latency_target": 10},
+    ],
+    "summarize": [
+        {"max_input_tokens": 2000, "models": ["gemini-2.5-flash-lite", "gemini-2.5-flash"], "latency_target": 4},
+        {"max_input_tokens": None, "models": ["gemini-2.5-flash"], "latency_target": 20},
+    ],
+    "memo": [
+        {"max_input_tokens": 2000, "models": ["gemini-2.5-flash-lite", "gemini-2.5-flash"], "latency_target": 4},
+        {"max_input_tokens": None, "models": ["gemini-2.5-flash"], "latency_target": 20},
+    ],
+    "chat": [
+        {"max_input_tokens": None, "models": ["gemini-2.5-flash"], "latency_target": 10},
+    ],
+    "expand_note": [
+        {"max_input_tokens": None, "models": ["gemini-2.5-flash-lite", "gemini-2.5-flash"], "latency_target": 2},
+    ],
+    "expand_question": [
+        {"max_input_tokens": None, "models": ["gemini-2.5-flash-lite", "gemini-2.5-flash"], "latency_target": 2},
+    ],
+    "validate_documents": [
+        {"max_input_tokens": None, "models": ["gemini-2.5-flash-lite", "gemini-2.5-flash"], "latency_target": 3},
+    ],
+    "rag_answer": [
+        {"max_input_tokens": None, "models": ["gemini-2.5-flash"], "latency_target": 15},
+    ],
+    "map_summary": [
+        {"max_input_tokens": None, "models": ["gemini-2.5-flash-lite", "gemini-2.5-flash"], "latency_target": 6},
+    ],
+    "reduce_summary": [
+        {"max_input_tokens": None, "models": ["gemini-2.5-flash"], "latency_target": 15},
+    ],
+    "conversation_summary": [
+        {"max_input_tokens": None, "models": ["gemini-2.5-flash-lite", "gemini-2.5-flash"], "latency_target": 5},
+    ],
+    "default": [
+        {"max_input_tokens": None, "models": ["gemini-2.5-flash"], "latency_target": 15},
+    ],
+}
+
+LATENCY_WINDOW = 50   # 모델별로 보관할 최근 지연 샘플 수
+MIN_SAMPLES = 5       # 이보다 샘플이 적으면 지연 목표 비교 없이 선호 순서대로 고름
+
+
+def _load_routing_table() -> dict:
+    table = dict(DEFAULT_ROUTING_TABLE)
+    override = os.getenv("GEMINI_ROUTING_TABLE")
+    if override:
+        try:
+            table.update(json.loads(override))
+        except (json.JSONDecodeError, TypeError, ValueError) as e:
+            print(f"[경고] GEMINI_ROUTING_TABLE 파싱 실패, 기본 라우팅 테이블을 사용합니다: {e}")
+    return table
+
+
+# --- 2. 라우터 ---
+class ModelRouter:
+    """작업 유형, 입력 토큰 수, 지연 목표를 보고 호출마다 모델을 고르고, 모델별 지연을 기록합니다."""
+
+    def __init__(self, routing_table: dict | None = None):
+        self.routing_table = routing_table or _load_routing_table()
+        self._latencies = {}  # model_name -> deque[seconds]
+        self._counts = {}     # model_name -> 호출 수
+        self._lock = threading.Lock()
+
+    def _median_latency(self, model_name: str) -> float | None:
+        samples = self._latencies.get(model_name)
+        if not samples or len(samples) < MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[len(ordered) // 2]
+
+    def route(self, task_type: str, input_tokens: int = 0, latency_target: float | None = None) -> str:
+        routes = self.routing_table.get(task_type) or self.routing_table["default"]
+        rule = routes[-1]
+        for candidate in routes:
+            limit = candidate.get("max_input_tokens")
+            if limit is None or input_tokens <= limit:
+                rule = candidate
+                break
+
+        models = rule["models"]
+        target = latency_target if latency_target is not None else rule.get("latency_target")
+        if target is None or len(models) == 1:
+            return models[0]
+
+        with self._lock:
+            medians = {model: self._median_latency(model) for model in models}
+        # 선호 순서대로 지연 목표를 만족하는(또는 아직 측정되지 않은) 첫 모델을 고릅니다.
+        for model in models:
+            if medians[model] is None or medians[model] <= target:
+                return model
+        # 모두 목표를 넘으면 가장 빠른 모델로 보냅니다.
+        return min(models, key=lambda model: medians[model])
+
+    def record(self, model_name: str, seconds: float):
+        with self._lock:
+            self._latencies.setdefault(model_name, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+            self._counts[model_name] = self._counts.get(model_name, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            result = {}
+            for model_name, samples in self._latencies.items():
+                ordered = sorted(samples)
+                result[model_name] = {
+                    "calls": self._counts.get(model_name, 0),
+                    "p50_seconds": round(ordered[len(ordered) // 2], 3),
+                    "p95_seconds": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+                }
+            return result
+
+
+MODEL_ROUTER = ModelRouter()
+
+
+def route_model(task_type: str, input_tokens: int = 0, latency_target: float | None = None) -> str:
+    return MODEL_ROUTER.route(task_type, input_tokens, latency_target)
+
+
+def record_latency(model_name: str, seconds: float):
+    MODEL_ROUTER.record(model_name, seconds)
@@ -0,0 +1,220 @@
+# py/ollama_client.py
+
+import os
+import json
+import time
+import asyncio
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# --- 1. 설정 ---
+# OLLAMA_KEEP_ALIVE      : 마지막 요청 후 모델을 메모리에 유지하는 시간 (예: "30m", "-1" 이면 계속 유지)
+# OLLAMA_OPTIONS         : 모델 옵션 JSON (예: '{"num_ctx": 4096, "temperature": 0.2}')
+# OLLAMA_POOL_SIZE       : 재사용하는 HTTP 연결 수 (동시에 보낼 수 있는 요청 수)
+# OLLAMA_CONNECT_TIMEOUT : 연결 시간 제한(초)
+# OLLAMA_READ_TIMEOUT    : 토큰 사이 최대 대기 시간(초). 스트리밍이므로 전체 생성 시간이 아니라 응답이 멈춘 시간에 걸립니다.
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_POOL_SIZE = int(os.getenv("OLLAMA_POOL_SIZE", "8"))
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "180"))
+
+
+def _load_options() -> dict:
+    raw = os.getenv("OLLAMA_OPTIONS")
+    if not raw:
+        return {}
+    try:
+        options = json.loads(raw)
+        if not isinstance(options, dict):
+            raise ValueError("JSON 객체가 아닙니다")
+        return options
+    except ValueError as e:
+        print(f"[경고] OLLAMA_OPTIONS 파싱 실패, 기본 옵션을 사용합니다: {e}")
+        return {}
+
+
+OLLAMA_OPTIONS = _load_options()
+
+
+class OllamaError(Exception):
+    """Ollama 서버가 오류를 반환했을 때 발생합니다."""
+
+
+class OllamaClient:
+    """
+    Ollama /api/generate 클라이언트입니다.
+    HTTP 연결은 세션 풀로 재사용하고, 모든 요청은 스트리밍으로 받아 첫 토큰부터 바로 내보냅니다.
+    매 요청에 keep_alive 를 보내 요청 사이에 모델이 내려가 다시 로드되는 일을 막습니다.
+    비동기 메서드(agenerate, agenerate_many)는 httpx 로 여러 요청을 한 이벤트 루프에서 동시에 보냅니다.
+    """
+
+    def __init__(self, url: str, keep_alive: str = OLLAMA_KEEP_ALIVE, options: dict | None = None,
+                 pool_size: int = OLLAMA_POOL_SIZE):
+        self.url = url
+        self.keep_alive = keep_alive
+        self.options = dict(OLLAMA_OPTIONS if options is None else options)
+        self.pool_size = pool_size
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._async_client = None
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "errors": 0, "first_token_seconds": 0.0, "load_seconds": 0.0, "tokens": 0}
+
+    def _payload(self, prompt: str, model: str, options: dict | None) -> dict:
+        payload = {"model": model, "prompt": prompt, "stream": True, "keep_alive": self.keep_alive}
+        merged = {**self.options, **(options or {})}
+        if merged:
+            payload["options"] = merged
+        return payload
+
+    def _record(self, first_token_seconds: float | None, final: dict | None, failed: bool = False):
+        with self._stats_lock:
+            self._stats["requests"] += 1
+            self._stats["errors"] += int(failed)
+            if first_token_seconds is not None:
+                self._stats["first_token_seconds"] += first_token_seconds
+            if final:
+                # load_duration 이 크면 keep_alive 가 짧아 모델이 다시 로드된 것입니다.
+                self._stats["load_seconds"] += final.get("load_duration", 0) / 1e9
+                self._stats["tokens"] += final.get("eval_count", 0)
+
+    @staticmethod
+    def _parse_line(line) -> dict:
+        record = json.loads(line)
+        if record.get("error"):
+            raise OllamaError(record["error"])
+        return record
+
+    @staticmethod
+    def _http_error(status_code: int, text: str) -> OllamaError:
+        try:
+            message = json.loads(text).get("error", text)
+        except (ValueError, AttributeError):
+            message = text
+        return OllamaError(f"HTTP {status_code}: {str(message)[:200]}")
+
+    # --- 동기 ---
+    def stream(self, prompt: str, model: str, options: dict | None = None, should_cancel=None,
+               timeout: float = OLLAMA_READ_TIMEOUT):
+        """
+        생성된 토큰 조각을 도착하는 대로 내보냅니다.
+        should_cancel()이 True를 반환하거나 호출자가 제너레이터를 닫으면 연결을 닫아 생성을 멈춥니다.
+        """
+        started = time.perf_counter()
+        first_token, final, failed = None, None, False
+        try:
+            with self.session.post(self.url, json=self._payload(prompt, model, options), stream=True,
+                                   timeout=(OLLAMA_CONNECT_TIMEOUT, timeout)) as response:
+                if response.status_code >= 400:
+                    raise self._http_error(response.status_code, response.text)
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    if should_cancel and should_cancel():
+                        print("[정보] Ollama 스트리밍 생성을 중단합니다.")
+                        break
+                    record = self._parse_line(line)
+                    token = record.get("response")
+                    if token:
+                        if first_token is None:
+                            first_token = time.perf_counter() - started
+                        yield token
+                    if record.get("done"):
+                        final = record
+                        break
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._record(first_token, final, failed)
+
+    def generate(self, prompt: str, model: str, options: dict | None = None,
+                 timeout: float = OLLAMA_READ_TIMEOUT) -> str:
+        return "".join(self.stream(prompt, model, options, timeout=timeout)).strip()
+
+    def preload(self, model: str):
+        """빈 프롬프트로 요청해 모델을 미리 메모리에 올립니다 (첫 요청의 모델 로드 지연 제거)."""
+        try:
+            self.session.post(self.url, json={"model": model, "keep_alive": self.keep_alive},
+                              timeout=(OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT)).close()
+        except requests.exceptions.RequestException as e:
+            print(f"[경고] Ollama 모델 '{model}' 미리 로드 실패: {e}")
+
+    # --- 비동기 ---
+    def _get_async_client(self):
+        # httpx.AsyncClient 는 처음 사용한 이벤트 루프에 묶이므로, 하나의 루프에서만 사용합니다.
+        if self._async_client is None:
+            import httpx
+            self._async_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(OLLAMA_READ_TIMEOUT, connect=OLLAMA_CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+            )
+        return self._async_client
+
+    async def astream(self, prompt: str, model: str, options: dict | None = None):
+        started = time.perf_counter()
+        first_token, final, failed = None, None, False
+        try:
+            async with self._get_async_client().stream("POST", self.url,
+                                                       json=self._payload(prompt, model, options)) as response:
+                if response.status_code >= 400:
+                    raise self._http_error(response.status_code, (await response.aread()).decode("utf-8", "replace"))
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    record = self._parse_line(line)
+                    token = record.get("response")
+                    if token:
+                        if first_token is None:
+                            first_token = time.perf_counter() - started
+                        yield token
+                    if record.get("done"):
+                        final = record
+                        break
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._record(first_token, final, failed)
+
+    async def agenerate(self, prompt: str, model: str, options: dict | None = None) -> str:
+        return "".join([token async for token in self.astream(prompt, model, options)]).strip()
+
+    async def agenerate_many(self, prompts: list[str], model: str, options: dict | None = None,
+                             concurrency: int | None = None) -> list:
+        """여러 프롬프트를 동시에 생성합니다. 실패한 항목은 예외 객체로 반환합니다 (입력과 같은 순서)."""
+        semaphore = asyncio.Semaphore(concurrency or self.pool_size)
+
+        async def run(prompt):
+            async with semaphore:
+                return await self.agenerate(prompt, model, options)
+
+        return await asyncio.gather(*(run(prompt) for prompt in prompts), return_exceptions=True)
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        answered = max(1, stats["requests"] - stats["errors"])
+        stats["avg_first_token_seconds"] = round(stats.pop("first_token_seconds") / answered, 3)
+        stats["load_seconds"] = round(stats["load_seconds"], 3)
+        return stats
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_ollama_client(url: str) -> OllamaClient:
+    with _clients_lock:
+        if url not in _clients:
+            _clients[url] = OllamaClient(url)
+        return _clients[url]
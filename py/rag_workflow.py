@@ -1,35 +1,280 @@
 # py/rag_workflow.py
 
 import os
-import platform
-from pathlib import Path
+import math
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from langchain_chroma import Chroma
 from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
 from langchain.prompts import ChatPromptTemplate
 from langchain.schema.output_parser import StrOutputParser
 from langchain.schema.document import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from gemini_ai import EMBEDDING_MODEL, DEFAULT_GEMINI_MODEL
+from langchain_core.embeddings import Embeddings
+from langchain_core.runnables import RunnableLambda
+from gemini_ai import EMBEDDING_MODEL, transport_options
+from rate_limiter import rate_limited, estimate_tokens, DeadlineExceeded
+from model_router import route_model, record_latency
+from app_paths import get_notes_dir
+from vector_quant import reduce_dimension
+from embedding_providers import get_embedding_provider
+from worker_pool import interprocess_lock, index_generation, publish_index_commit
+from ingest_queue import IngestionQueue, INGEST_INITIAL_WAIT
+from kv_cache import content_hash
+from flat_index import FlatIndex, get_flat_index, use_flat_index
+from content_store import ContentStore, get_content_store
 
 from typing import TypedDict, List
 from langgraph.graph import StateGraph, END
 
 def _get_db_path() -> str:
     """실행 중인 OS를 감지하여 ChromaDB 저장소의 동적 경로를 반환합니다."""
-    home_dir = Path.home()
-    system = platform.system()
-    if system == "Darwin": # macOS
-        notes_dir = home_dir / "Memordo_Notes"
-    else: # Windows, Linux 등
-        notes_dir = home_dir / "Documents" / "Memordo_Notes"
-    
-    db_path = notes_dir / "chroma_db"
+    db_path = get_notes_dir() / "chroma_db"
     os.makedirs(db_path, exist_ok=True)
     return str(db_path)
 
 # JSON 경로 함수는 현재 코드에서 사용되지 않으므로 삭제해도 무방합니다.
 # def _get_json_path() -> str: ...
 
+# --- LangChain 클라이언트를 전역 Gemini 리미터에 연결 ---
+class RateLimitedEmbeddings(Embeddings):
+    """GoogleGenerativeAIEmbeddings 호출을 rate_limiter를 거치도록 감싸는 래퍼입니다."""
+
+    def __init__(self, model: str, task_type: str):
+        self.model = model
+        self.inner = GoogleGenerativeAIEmbeddings(model=model, task_type=task_type, **transport_options())
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        tokens = sum(estimate_tokens(text) for text in texts)
+        vectors = rate_limited(self.model, lambda: self.inner.embed_documents(texts), tokens)
+        return [reduce_dimension(vector) for vector in vectors]
+
+    def embed_query(self, text: str) -> List[float]:
+        return reduce_dimension(rate_limited(self.model, lambda: self.inner.embed_query(text), estimate_tokens(text)))
+
+    def embed_query_before(self, text: str, deadline: float | None) -> List[float]:
+        """남은 시간을 요청 시간 제한(request_options)으로 넘겨, 마감 시각에 호출 자체가 끝나게 합니다."""
+        def _embed():
+            timeout = _time_left(deadline)
+            inner = self.inner if timeout is None else self.inner.copy(update={"request_options": {"timeout": timeout}})
+            with _until_deadline(deadline):
+                return inner.embed_query(text)
+
+        return reduce_dimension(rate_limited(self.model, _embed, estimate_tokens(text), deadline=deadline))
+
+
+class ProviderEmbeddings(Embeddings):
+    """embedding_providers 의 공급자(로컬 sentence-transformers 등)를 LangChain Embeddings 로 노출합니다."""
+
+    def __init__(self, provider):
+        self.provider = provider
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.provider.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.provider.embed_query(text)
+
+    def embed_query_before(self, text: str, deadline: float | None) -> List[float]:
+        # 로컬 공급자는 이 스레드에서 바로 계산하므로 시작 전에만 남은 시간을 확인합니다.
+        _time_left(deadline)
+        return self.provider.embed_query(text)
+
+
+def _chat_model(model_name: str, temperature: float, timeout: float | None = None) -> ChatGoogleGenerativeAI:
+    """
+    (모델, temperature)별 클라이언트를 재사용합니다. timeout 을 주면 같은 클라이언트를 공유하면서
+    요청 시간 제한만 다른 복사본을 반환합니다 (마감 시각까지 남은 시간을 호출마다 넘기기 위해).
+    """
+    key = (model_name, temperature)
+    with _CACHE_LOCK:
+        if key not in _CHAT_MODEL_CACHE:
+            # 429 재시도는 리미터가 담당하므로 LangChain 내부 재시도는 1회로 제한합니다.
+            _CHAT_MODEL_CACHE[key] = ChatGoogleGenerativeAI(model=model_name, temperature=temperature, max_retries=1,
+                                                            **transport_options())
+        llm = _CHAT_MODEL_CACHE[key]
+    if timeout is None:
+        return llm
+    # 마감이 걸린 호출은 시간 초과 후 재시도하면 마감을 넘기므로 내부 재시도를 끕니다.
+    return llm.copy(update={"timeout": timeout, "max_retries": 0})
+
+
+def _rate_limited_llm(model_name: str, temperature: float, deadline: float | None = None):
+    """
+    ChatGoogleGenerativeAI를 `prompt | llm | parser` 체인에 그대로 끼울 수 있는 Runnable로 감쌉니다.
+    deadline 을 주면 리미터 대기와 요청 시간 제한이 모두 마감 시각에 맞춰지고, 넘기면 DeadlineExceeded 를 던집니다.
+    """
+    key = (model_name, temperature)
+    if deadline is None:
+        with _CACHE_LOCK:
+            if key in _LLM_CACHE:
+                return _LLM_CACHE[key]
+
+    def _invoke(prompt_value):
+        tokens = estimate_tokens(prompt_value.to_string() if hasattr(prompt_value, "to_string") else prompt_value)
+        start = time.perf_counter()
+
+        def _call():
+            # 리미터에서 기다린 뒤의 남은 시간으로 시간 제한을 정합니다.
+            llm = _chat_model(model_name, temperature, _time_left(deadline))
+            with _until_deadline(deadline):
+                return llm.invoke(prompt_value)
+
+        result = rate_limited(model_name, _call, tokens, deadline=deadline)
+        record_latency(model_name, time.perf_counter() - start)
+        return result
+
+    runnable = RunnableLambda(_invoke)
+    if deadline is not None:
+        return runnable  # 요청마다 마감 시각이 다르므로 캐시하지 않습니다.
+    with _CACHE_LOCK:
+        return _LLM_CACHE.setdefault(key, runnable)
+
+
+# --- 클라이언트/저장소/그래프 캐시 (요청마다 새로 만들지 않도록 프로세스 단위로 재사용) ---
+_CACHE_LOCK = threading.Lock()
+_LLM_CACHE = {}          # (model_name, temperature) -> Runnable
+_CHAT_MODEL_CACHE = {}   # (model_name, temperature) -> ChatGoogleGenerativeAI
+_VECTORSTORE_CACHE = {}  # (db_path, provider.key, task_type) -> Chroma
+_COMPILED_WORKFLOW = None
+_INGEST_QUEUE = None     # Chroma 쓰기를 전담하는 단일 writer
+_FLAT_SYNCED = set()     # 이 프로세스에서 Chroma와 문서 수를 맞춰 본 정확 검색 색인 디렉터리
+_SEEN_INDEX_GENERATION = 0  # 이 프로세스의 Chroma 인스턴스가 반영하고 있는 공유 색인 세대 번호
+
+
+def _get_vectorstore(task_type: str) -> Chroma:
+    """
+    task_type('retrieval_document' / 'retrieval_query')별 임베딩 함수를 가진 Chroma 인스턴스를 반환합니다.
+    공급자마다 별도 컬렉션을 쓰므로 서로 다른 모델의 벡터가 섞이지 않습니다.
+    """
+    provider = get_embedding_provider()
+    key = (_get_db_path(), provider.key, task_type)
+    with _CACHE_LOCK:
+        vectorstore = _VECTORSTORE_CACHE.get(key)
+        if vectorstore is None:
+            if provider.name == "gemini":
+                embedding_function = RateLimitedEmbeddings(model=provider.model_name, task_type=task_type)
+            else:
+                embedding_function = ProviderEmbeddings(provider)
+            vectorstore = Chroma(collection_name=provider.collection_name(), persist_directory=key[0],
+                                 embedding_function=embedding_function)
+            _VECTORSTORE_CACHE[key] = vectorstore
+        return vectorstore
+
+
+def _reset_chroma_systems():
+    # chromadb 는 경로별 System(불러 둔 HNSW 세그먼트 포함)을 프로세스 안에서 캐시하므로,
+    # 이 캐시를 비워야 다음 Chroma 인스턴스가 다른 프로세스가 쓴 내용을 디스크에서 다시 읽습니다.
+    try:
+        from chromadb.api.client import SharedSystemClient
+        SharedSystemClient.clear_system_cache()
+    except (ImportError, AttributeError) as e:
+        print(f"[경고] Chroma 클라이언트 캐시를 비우지 못했습니다: {e}")
+
+
+def sync_index_generation():
+    """
+    다중 워커 모드에서 다른 워커가 Chroma 에 커밋했으면(공유 색인 세대 번호가 바뀌었으면)
+    이 워커가 시작할 때 불러 둔 컬렉션을 버리고 다시 엽니다. 요청마다 8바이트만 읽으므로 바뀌지 않았을 때는 비용이 없습니다.
+    """
+    global _SEEN_INDEX_GENERATION
+    generation = index_generation()
+    with _CACHE_LOCK:
+        if generation == _SEEN_INDEX_GENERATION:
+            return
+        _SEEN_INDEX_GENERATION = generation
+        _VECTORSTORE_CACHE.clear()
+        _reset_chroma_systems()
+    print(f"[정보] 다른 워커의 색인 커밋을 반영해 Chroma 컬렉션을 다시 엽니다 (색인 세대 {generation}).")
+
+
+def _publish_own_commit():
+    # 자신의 커밋은 이미 이 프로세스의 컬렉션에 반영되어 있으므로 다시 열지 않습니다.
+    # (쓰기 잠금 안에서 sync_index_generation 을 먼저 호출하므로, 증가 전 세대는 이 프로세스가 본 세대와 같습니다.)
+    global _SEEN_INDEX_GENERATION
+    generation = publish_index_commit()
+    with _CACHE_LOCK:
+        _SEEN_INDEX_GENERATION = generation
+
+
+def reset_clients():
+    """API 키가 바뀌면 이전 키로 만든 LangChain 클라이언트를 버립니다."""
+    with _CACHE_LOCK:
+        _LLM_CACHE.clear()
+        _CHAT_MODEL_CACHE.clear()
+        _VECTORSTORE_CACHE.clear()
+
+
+# --- 요청 마감 시간 ---
+# /api/rag_chat 요청마다 마감 시각(time.monotonic 기준)을 state['deadline'] 으로 넘깁니다.
+# 남은 시간이 부족하면 선택 단계(질문 확장, 문서 검증)를 건너뛰고, 모델 호출에는 남은 시간을 요청 시간 제한으로 넘겨
+# 마감 시각에 호출 자체가 끝나게 합니다 (버려진 호출이 스레드나 리미터 슬롯을 계속 잡고 있지 않도록).
+RAG_DEADLINE_SECONDS = float(os.getenv("RAG_DEADLINE_SECONDS", "45"))
+EXPAND_MIN_BUDGET = float(os.getenv("RAG_EXPAND_MIN_BUDGET", "25"))      # 질문 확장을 하려면 남아 있어야 하는 시간
+VALIDATE_MIN_BUDGET = float(os.getenv("RAG_VALIDATE_MIN_BUDGET", "15"))  # 문서 검증을 하려면 남아 있어야 하는 시간
+GENERATE_RESERVE = float(os.getenv("RAG_GENERATE_RESERVE", "8"))         # 첫 색인을 기다릴 때도 답변 생성용으로 남겨 두는 시간
+MIN_DEADLINE_SECONDS = float(os.getenv("RAG_MIN_DEADLINE_SECONDS", "5"))  # 클라이언트가 요청할 수 있는 최소 시간
+
+
+def new_deadline(timeout_seconds=None) -> float:
+    """
+    요청의 마감 시각을 만듭니다. 클라이언트가 요청한 시간은 유한한 양수여야 하며(아니면 ValueError),
+    [MIN_DEADLINE_SECONDS, RAG_DEADLINE_SECONDS] 범위로 맞춥니다.
+    """
+    if timeout_seconds is None:
+        return time.monotonic() + RAG_DEADLINE_SECONDS
+    if isinstance(timeout_seconds, bool):
+        raise ValueError("timeout_seconds 는 숫자여야 합니다.")
+    try:
+        budget = float(timeout_seconds)
+    except (TypeError, ValueError):
+        raise ValueError("timeout_seconds 는 숫자여야 합니다.") from None
+    if not math.isfinite(budget) or budget <= 0:
+        raise ValueError("timeout_seconds 는 0보다 큰 유한한 값이어야 합니다.")
+    return time.monotonic() + min(max(budget, MIN_DEADLINE_SECONDS), RAG_DEADLINE_SECONDS)
+
+
+def _remaining(state) -> float:
+    deadline = state.get('deadline')
+    return float("inf") if deadline is None else deadline - time.monotonic()
+
+
+def _skip(state, stage: str, reason: str) -> List[dict]:
+    """응답에 포함할 '건너뛴 단계' 목록에 항목을 더한 새 목록을 반환합니다."""
+    print(f"     - [건너뜀] {stage}: {reason}")
+    return list(state.get('skipped_stages') or []) + [{"stage": stage, "reason": reason}]
+
+
+def _time_left(deadline: float | None) -> float | None:
+    """마감 시각까지 남은 시간(초). 마감이 없으면 None, 이미 지났으면 DeadlineExceeded."""
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceeded()
+    return remaining
+
+
+def _is_timeout_error(error: Exception) -> bool:
+    return isinstance(error, TimeoutError) or type(error).__name__ in (
+        "DeadlineExceeded", "Timeout", "ReadTimeout", "ConnectTimeout", "RetryError")
+
+
+@contextmanager
+def _until_deadline(deadline: float | None):
+    """클라이언트 시간 제한(남은 시간)에 걸려 끝난 호출의 예외를 DeadlineExceeded 로 바꿉니다."""
+    try:
+        yield
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        if deadline is not None and (_is_timeout_error(e) or time.monotonic() >= deadline):
+            raise DeadlineExceeded() from e
+        raise
+
+
 class GraphState(TypedDict):
     """
     LangGraph의 상태를 정의하는 TypedDict입니다.
@@ -41,6 +286,12 @@ class GraphState(TypedDict):
     edges: List[dict]
     
     # 노드 실행 결과로 채워지는 값
+    original_question: str
+    routing: dict
+    speculative_result: dict
+    deadline: float              # time.monotonic() 기준 마감 시각 (없으면 제한 없음)
+    skipped_stages: List[dict]   # [{"stage", "reason"}] 응답에 포함
+    partial: bool                # 마감 때문에 답변이 중간에 끊겼거나 생성되지 못했는지
     documents: List[Document]
     vectorstore: Chroma
     top_docs: List[Document]
@@ -101,6 +352,85 @@ PROMPT_TEMPLATES = {
     )
 }
 
+# --- 추측 답변 생성 ---
+# 문서 검증과 동시에 검증 전 상위 문서로 답변을 미리 생성합니다.
+# 검증이 같은 문서 집합을 남기면 그 답변을 그대로 쓰고, 아니면 생성을 취소하고 검증된 문서로 다시 생성합니다.
+SPECULATIVE_ANSWERS = os.getenv("RAG_SPECULATIVE_ANSWERS", "1") == "1"
+SPECULATION_WORKERS = int(os.getenv("RAG_SPECULATION_WORKERS", "4"))
+_SPECULATION_POOL = None
+
+
+class SpeculationCancelled(Exception):
+    pass
+
+
+class SpeculationStats:
+    """
+    추측 답변의 적중률과 절약/낭비된 시간을 집계합니다 (/api/model-stats 에서 조회).
+    적중 시 절약 시간 = min(검증 시간, 생성 시간), 실패 시 낭비 시간 = 취소 전까지 생성에 쓴 시간.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.attempts = 0
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self.wasted_seconds = 0.0
+
+    def record_hit(self, validation_seconds: float, generation_seconds: float):
+        with self._lock:
+            self.attempts += 1
+            self.hits += 1
+            self.saved_seconds += min(validation_seconds, generation_seconds)
+
+    def record_miss(self, wasted_seconds: float):
+        with self._lock:
+            self.attempts += 1
+            self.misses += 1
+            self.wasted_seconds += wasted_seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": SPECULATIVE_ANSWERS,
+                "attempts": self.attempts,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / self.attempts, 3) if self.attempts else None,
+                "saved_seconds": round(self.saved_seconds, 2),
+                "wasted_seconds": round(self.wasted_seconds, 2),
+            }
+
+
+SPECULATION_STATS = SpeculationStats()
+
+
+def speculation_stats() -> dict:
+    return SPECULATION_STATS.snapshot()
+
+
+def _get_speculation_pool() -> ThreadPoolExecutor:
+    global _SPECULATION_POOL
+    with _CACHE_LOCK:
+        if _SPECULATION_POOL is None:
+            _SPECULATION_POOL = ThreadPoolExecutor(max_workers=SPECULATION_WORKERS, thread_name_prefix="memordo-speculate")
+        return _SPECULATION_POOL
+
+
+def _doc_key(doc: Document) -> tuple:
+    return doc.metadata.get('source'), doc.page_content
+
+
+def _speculate(question: str, docs: List[Document], cancelled: threading.Event, deadline: float | None) -> dict:
+    started = time.perf_counter()
+    try:
+        result = _answer_from_docs(question, docs, should_cancel=cancelled.is_set, deadline=deadline)
+        return {"result": result, "seconds": time.perf_counter() - started}
+    except SpeculationCancelled:
+        return {"result": None, "seconds": time.perf_counter() - started}
+
+
 def validate_retrieved_documents(state: GraphState) -> dict:
     print("--- (Node 4) 검색된 문서 유효성 검증 ---")
     question = state['question']
@@ -113,17 +443,51 @@ def validate_retrieved_documents(state: GraphState) -> dict:
 
     # 상위 4개 문서만 선택
     docs_to_validate = top_docs[:4]
-    
-    validation_model_name = "gemini-2.5-flash-lite" 
-    llm = ChatGoogleGenerativeAI(model=validation_model_name, temperature=0)
-    prompt = PROMPT_TEMPLATES["validate_documents"]
-    chain = prompt | llm | StrOutputParser()
-    
+
+    # ✨ 검증이 모든 문서를 통과시킬 것이라 가정하고 답변 생성을 먼저 시작합니다.
+    speculation, cancelled = None, threading.Event()
+    if SPECULATIVE_ANSWERS:
+        speculation = _get_speculation_pool().submit(_speculate, question, docs_to_validate, cancelled,
+                                                     state.get('deadline'))
+
+    validation_started = time.perf_counter()
+    validated_docs = _run_validation(question, docs_to_validate, state.get('deadline'))
+    validation_seconds = time.perf_counter() - validation_started
+
+    if speculation is None:
+        return {"top_docs": validated_docs}
+
+    if {_doc_key(doc) for doc in validated_docs} == {_doc_key(doc) for doc in docs_to_validate}:
+        try:
+            outcome = speculation.result()
+        except Exception as e:
+            # 추측 생성이 실패하면 generate 노드가 평소처럼 다시 생성합니다.
+            print(f"     - [추측] 미리 생성한 답변이 실패하여 다시 생성합니다: {e}")
+            SPECULATION_STATS.record_miss(time.perf_counter() - validation_started)
+            return {"top_docs": validated_docs}
+        SPECULATION_STATS.record_hit(validation_seconds, outcome["seconds"])
+        print(f"     - [추측] 적중: 검증({validation_seconds:.2f}초)과 생성({outcome['seconds']:.2f}초)을 겹쳐 실행했습니다.")
+        return {"top_docs": validated_docs, "speculative_result": outcome["result"]}
+
+    cancelled.set()
+    # 취소는 다음 스트리밍 조각에서 반영되므로 결과를 기다리지 않고 검증 시간만큼을 낭비로 기록합니다.
+    SPECULATION_STATS.record_miss(validation_seconds)
+    print("     - [추측] 실패: 검증 결과가 달라 미리 생성하던 답변을 취소하고 다시 생성합니다.")
+    return {"top_docs": validated_docs}
+
+
+def _run_validation(question: str, docs_to_validate: List[Document], deadline: float | None = None) -> List[Document]:
+    """LLM으로 질문에 도움이 되는 문서만 고릅니다. 오류가 나거나 마감을 넘기면 모든 문서를 유효한 것으로 봅니다."""
     # LLM에 전달할 형식으로 문서 포맷팅
     formatted_docs = []
     for i, doc in enumerate(docs_to_validate):
         formatted_docs.append(f"문서 번호: {i}\n내용: {doc.page_content}\n---")
     documents_str = "\n".join(formatted_docs)
+
+    validation_model_name = route_model("validate_documents", estimate_tokens(documents_str))
+    llm = _rate_limited_llm(validation_model_name, temperature=0, deadline=deadline)
+    prompt = PROMPT_TEMPLATES["validate_documents"]
+    chain = prompt | llm | StrOutputParser()
     
     try:
         response = chain.invoke({"question": question, "documents": documents_str})
@@ -133,7 +497,7 @@ def validate_retrieved_documents(state: GraphState) -> dict:
         
         if response.strip().lower() == 'none':
             print("     - 모든 문서가 질문과 관련이 없는 것으로 판단되었습니다.")
-            return {"top_docs": []}
+            return []
         
         # 유효한 문서 인덱스 파싱
         valid_indices = [int(i.strip()) for i in response.split(',') if i.strip().isdigit()]
@@ -144,135 +508,352 @@ def validate_retrieved_documents(state: GraphState) -> dict:
         validated_sources = [doc.metadata['source'] for doc in validated_docs]
         print(f"     - 유효성 검증 통과 문서: {validated_sources}")
         
-        return {"top_docs": validated_docs}
+        return validated_docs
             
+    except DeadlineExceeded:
+        print("     - 문서 유효성 검증이 마감 시간을 넘겨 모든 문서를 유효한 것으로 간주합니다.")
+        return docs_to_validate
     except Exception as e:
         print(f"     - 문서 유효성 검증 중 오류 발생: {e}. 모든 문서를 유효한 것으로 간주합니다.")
         # 오류 발생 시에는 상위 4개 문서를 그대로 반환하여 답변 생성 시도
-        return {"top_docs": docs_to_validate}
+        return docs_to_validate
 
-def expand_short_notes(state: GraphState) -> dict:
-    print("--- (Node 0) 짧은 메모 보강 시작 ---")
-    notes = state['notes']
-    MIN_CHARS_FOR_EXPANSION = 100
-    updated_notes = []
-    
-    llm = ChatGoogleGenerativeAI(model=DEFAULT_GEMINI_MODEL, temperature=0.5)
-    prompt = PROMPT_TEMPLATES["expand_note"]
-    chain = prompt | llm | StrOutputParser()
+MIN_CHARS_FOR_EXPANSION = 100
 
+
+def expand_short_notes(notes: List[dict]) -> List[dict]:
+    """
+    짧은 메모는 LLM으로 검색용 키워드 구문('retrieval_content')을 만들어 보강하고, 'content'는 원본을 보존합니다.
+    색인 writer 스레드에서 배치 단위로 호출되며, 보강 호출은 묶어서 동시에 보냅니다.
+    """
+    short_notes = [note for note in notes if len(note['content']) < MIN_CHARS_FOR_EXPANSION]
     for note in notes:
-        # 'retrieval_content'를 새로 만들어 검색용으로 사용하고, 'content'는 원본을 보존
-        if len(note['content']) < MIN_CHARS_FOR_EXPANSION:
-            print(f"     - '{note['fileName']}' 보강 필요 (현재 {len(note['content'])}자)")
-            expanded_content = chain.invoke({"original_content": note['content']})
-            note['retrieval_content'] = expanded_content
-            print(f"     - 보강 완료: {expanded_content[:50]}...")
-        else:
-            note['retrieval_content'] = note['content'] # 내용이 충분하면 원본을 그대로 사용
-        updated_notes.append(note)
-        
-    return {"notes": updated_notes}
+        note['retrieval_content'] = note['content']  # 내용이 충분하면 원본을 그대로 사용
+    if not short_notes:
+        return notes
+
+    print(f"     - 짧은 메모 {len(short_notes)}개 보강")
+    llm = _rate_limited_llm(route_model("expand_note"), temperature=0.5)
+    chain = PROMPT_TEMPLATES["expand_note"] | llm | StrOutputParser()
+    results = chain.batch([{"original_content": note['content']} for note in short_notes],
+                          config={"max_concurrency": 4}, return_exceptions=True)
+    for note, expanded_content in zip(short_notes, results):
+        if isinstance(expanded_content, Exception):
+            print(f"     - '{note['fileName']}' 보강 실패, 원문으로 색인합니다: {expanded_content}")
+            continue
+        note['retrieval_content'] = expanded_content
+    return notes
+
+# --- 적응형 라우팅 ---
+# 값싼 신호(질문 길이, 노트 이름 언급, 1위 유사도와 2위와의 차이)로 질문 확장/문서 검증 LLM 호출을 건너뜁니다.
+# RAG_ADAPTIVE_ROUTING=0 이면 항상 모든 단계를 실행합니다.
+ADAPTIVE_ROUTING = os.getenv("RAG_ADAPTIVE_ROUTING", "1") == "1"
+ROUTE_LOOKUP_MAX_WORDS = int(os.getenv("RAG_ROUTE_LOOKUP_MAX_WORDS", "3"))        # 이 이하 단어 수는 키워드 조회로 봄
+ROUTE_DETAILED_MIN_CHARS = int(os.getenv("RAG_ROUTE_DETAILED_MIN_CHARS", "80"))   # 이 이상 길이는 이미 구체적인 질문으로 봄
+ROUTE_CONFIDENT_SIMILARITY = float(os.getenv("RAG_ROUTE_CONFIDENT_SIMILARITY", "0.75"))
+ROUTE_MIN_MARGIN = float(os.getenv("RAG_ROUTE_MIN_MARGIN", "0.08"))
+
+
+def _mentioned_notes(question: str, notes: List[dict]) -> List[str]:
+    """질문에 이름(확장자 제외)이 그대로 들어 있는 노트의 파일명 목록."""
+    lowered = question.lower()
+    mentioned = []
+    for note in notes or []:
+        file_name = note.get('fileName') or ''
+        name = os.path.splitext(file_name)[0].strip().lower()
+        if len(name) >= 2 and name in lowered:
+            mentioned.append(file_name)
+    return mentioned
+
+
+def route_question(state: GraphState) -> dict:
+    print("--- (Node 0) 질문 라우팅 ---")
+    question = state['question']
+    mentioned = _mentioned_notes(question, state.get('notes'))
+    words = len(question.split())
+
+    remaining = _remaining(state)
+    if remaining < EXPAND_MIN_BUDGET:
+        expand, reason = False, f"시간 예산 부족 (남은 {remaining:.1f}초)"
+    elif not ADAPTIVE_ROUTING:
+        expand, reason = True, "적응형 라우팅 꺼짐"
+    elif mentioned:
+        expand, reason = False, f"노트 이름 언급 {mentioned}"
+    elif words <= ROUTE_LOOKUP_MAX_WORDS:
+        expand, reason = False, f"키워드 조회 ({words}단어)"
+    elif len(question) >= ROUTE_DETAILED_MIN_CHARS:
+        expand, reason = False, f"이미 구체적인 질문 ({len(question)}자)"
+    else:
+        expand, reason = True, f"짧고 모호한 질문 ({len(question)}자, {words}단어)"
+
+    print(f"     - [라우팅] 질문 확장: {'실행' if expand else '건너뜀'} ({reason})")
+    routing = {"expand": expand, "expand_reason": reason, "mentioned_notes": mentioned}
+    update = {"original_question": question, "routing": routing}
+    if not expand:
+        update["skipped_stages"] = _skip(state, "expand_question", reason)
+    return update
+
+
+def _after_route_question(state: GraphState) -> str:
+    return "expand_question" if state['routing']['expand'] else "prepare"
+
+
+def route_documents(state: GraphState) -> dict:
+    """1차 검색 결과의 유사도 분포를 보고 LLM 문서 검증이 필요한지 정합니다. 건너뛸 때는 답변에 쓸 문서를 여기서 고릅니다."""
+    print("--- (Node 3.5) 검증 라우팅 ---")
+    top_docs = state.get('top_docs', [])
+    routing = dict(state.get('routing') or {})
+    scores = [doc.metadata.get('score') for doc in top_docs]
+    top1 = scores[0] if scores else None
+    margin = (top1 - scores[1]) if len(scores) > 1 and None not in scores[:2] else None
+    mentioned = set(routing.get('mentioned_notes') or [])
+    named_docs = [doc for doc in top_docs[:4] if doc.metadata.get('source') in mentioned]
+
+    update = {}
+    remaining = _remaining(state)
+    if not top_docs:
+        validate, reason = False, "검색 결과 없음"
+    elif remaining < VALIDATE_MIN_BUDGET:
+        # 검증 없이 검증 대상이던 상위 4개로 답변합니다.
+        validate, reason = False, f"시간 예산 부족 (남은 {remaining:.1f}초)"
+        update["top_docs"] = top_docs[:4]
+    elif not ADAPTIVE_ROUTING:
+        validate, reason = True, "적응형 라우팅 꺼짐"
+    elif named_docs and top_docs[0].metadata.get('source') in mentioned:
+        validate, reason = False, f"언급된 노트가 1위 {[doc.metadata['source'] for doc in named_docs]}"
+        update["top_docs"] = named_docs
+    elif len(top_docs) == 1 and top1 is not None and top1 >= ROUTE_CONFIDENT_SIMILARITY:
+        validate, reason = False, f"유일한 후보 (유사도 {top1:.3f})"
+    elif top1 is not None and margin is not None and top1 >= ROUTE_CONFIDENT_SIMILARITY and margin >= ROUTE_MIN_MARGIN:
+        validate, reason = False, f"1위가 뚜렷함 (유사도 {top1:.3f}, 차이 {margin:.3f})"
+        update["top_docs"] = top_docs[:1]
+    else:
+        top1_text = "없음" if top1 is None else f"{top1:.3f}"
+        margin_text = "없음" if margin is None else f"{margin:.3f}"
+        validate, reason = True, f"후보가 비슷함 (유사도 {top1_text}, 차이 {margin_text})"
+
+    print(f"     - [라우팅] 문서 검증: {'실행' if validate else '건너뜀'} ({reason})")
+    routing.update({"validate": validate, "validate_reason": reason, "top1_similarity": top1, "margin": margin})
+    update["routing"] = routing
+    if not validate:
+        update["skipped_stages"] = _skip(state, "validate_documents", reason)
+    return update
+
+
+def _after_route_documents(state: GraphState) -> str:
+    return "validate_documents" if state['routing']['validate'] else "generate"
+
 
 def expand_question(state: GraphState) -> dict:
     print("--- (Node 1) 질문 확장 시작 ---")
     original_question = state['question']
     
-    llm = ChatGoogleGenerativeAI(model=DEFAULT_GEMINI_MODEL, temperature=0)
+    llm = _rate_limited_llm(route_model("expand_question", estimate_tokens(original_question)), temperature=0,
+                            deadline=state.get('deadline'))
     prompt = PROMPT_TEMPLATES["expand_question"]
     chain = prompt | llm | StrOutputParser()
     
-    expanded_question = chain.invoke({"question": original_question})
+    try:
+        expanded_question = chain.invoke({"question": original_question})
+    except DeadlineExceeded:
+        return {"skipped_stages": _skip(state, "expand_question", "마감 시간 초과, 원본 질문으로 검색")}
     print(f"     - 원본 질문: \"{original_question}\"")
     print(f"     - 확장된 질문: \"{expanded_question}\"")
     
     # 확장된 질문으로 state의 'question'을 업데이트
     return {"question": expanded_question}
 
+def _get_content_store() -> ContentStore:
+    """노트 본문(원본/검색용)을 해시로 보관하는 저장소. Chroma 메타데이터에는 해시만 남깁니다."""
+    return get_content_store(os.path.join(_get_db_path(), "content_store"))
+
+
+def _committed_hash(metadata: dict | None) -> str:
+    metadata = metadata or {}
+    # 이전 형식(원본 내용을 메타데이터에 직접 저장)도 그대로 인식합니다.
+    return metadata.get('content_hash') or content_hash(metadata.get('original_content', ''))
+
+
+def _drop_already_committed(notes: List[dict]) -> List[dict]:
+    """
+    Chroma 에 이미 같은 내용으로 저장된 노트를 뺍니다. 각 워커의 색인 큐는 자기 프로세스의 커밋만 알기 때문에,
+    다른 워커가 먼저 색인한 노트를 다시 임베딩하지 않도록 공유 저장소의 메타데이터를 기준으로 한 번 더 거릅니다.
+    """
+    data = _get_vectorstore("retrieval_document")._collection.get(ids=[note['fileName'] for note in notes],
+                                                                  include=["metadatas"])
+    stored = {doc_id: _committed_hash(metadata) for doc_id, metadata in zip(data['ids'], data['metadatas'])}
+    return [note for note in notes if stored.get(note['fileName']) != content_hash(note['content'])]
+
+
+def _write_ingest_batch(notes: List[dict]) -> int:
+    """
+    색인 writer 스레드 전용: 노트 묶음을 보강/임베딩하여 Chroma와 정확 검색 색인에 함께 upsert 하고, 실제로 쓴 노트 수를 반환합니다.
+    다중 워커 모드에서는 확인부터 커밋까지 파일 잠금 안에서 하므로, 같은 노트를 여러 워커가 중복으로 임베딩하지 않습니다.
+    """
+    with interprocess_lock(os.path.join(_get_db_path(), ".write.lock")):
+        sync_index_generation()
+        notes = _drop_already_committed(notes)
+        if not notes:
+            return 0
+        _upsert_notes(notes)
+        _publish_own_commit()
+        return len(notes)
+
+
+def _upsert_notes(notes: List[dict]):
+    notes = expand_short_notes([dict(note) for note in notes])
+    # 노트 1개를 Document 1개로 매핑 (청크 분할 없음), ID는 파일명 사용
+    ids = [note['fileName'] for note in notes]
+    texts = [note['retrieval_content'] for note in notes]  # 검색용 (보강된) 내용
+    # 본문은 내용 저장소에 두고 메타데이터에는 해시만 넣어, 검색 결과를 읽을 때 큰 본문을 함께 읽지 않도록 합니다.
+    store = _get_content_store()
+    content_hashes = store.put_many([note['content'] for note in notes])
+    retrieval_hashes = store.put_many(texts)  # 보강되지 않은 노트는 원본과 같은 해시라 다시 쓰지 않습니다.
+    metadatas = [{'source': doc_id, 'content_hash': digest, 'retrieval_hash': retrieval_digest}
+                 for doc_id, digest, retrieval_digest in zip(ids, content_hashes, retrieval_hashes)]
+    vectorstore = _get_vectorstore("retrieval_document")
+    # 임베딩은 한 번만 계산해 두 저장소에 같이 씁니다.
+    vectors = vectorstore.embeddings.embed_documents(texts)
+    vectorstore._collection.upsert(ids=ids, embeddings=vectors, metadatas=metadatas)
+    _get_flat_index().upsert(ids, vectors)
+
+
+def _get_flat_index() -> FlatIndex:
+    """
+    현재 임베딩 공급자의 Chroma 컬렉션과 짝을 이루는 정확 검색 색인을 반환합니다.
+    프로세스에서 처음 열 때 문서 수가 Chroma와 다르면 Chroma에 저장된 임베딩으로 다시 만듭니다.
+    """
+    provider = get_embedding_provider()
+    flat_index = get_flat_index(os.path.join(_get_db_path(), f"flat_{provider.collection_name()}"))
+    with _CACHE_LOCK:
+        if flat_index.directory in _FLAT_SYNCED:
+            return flat_index
+        _FLAT_SYNCED.add(flat_index.directory)
+    collection = _get_vectorstore("retrieval_document")._collection
+    if len(flat_index.ids()) != collection.count():
+        data = collection.get(include=["embeddings"])
+        print(f"[정보] 정확 검색 색인을 Chroma에서 다시 만듭니다 ({len(data['ids'])}개).")
+        flat_index.rebuild(data['ids'], data['embeddings'])
+    return flat_index
+
+
+def _load_committed() -> dict:
+    """이미 색인된 노트의 {파일명: 원본 내용 해시} (내용이 바뀐 노트만 다시 색인하기 위해 사용)."""
+    data = _get_vectorstore("retrieval_document").get(include=["metadatas"])
+    return {doc_id: _committed_hash(metadata) for doc_id, metadata in zip(data['ids'], data['metadatas'])}
+
+
+def _hydrate(metadatas: list, documents: list | None = None, scores: list | None = None) -> List[Document]:
+    """
+    검색된 상위 문서의 검색용 내용만 내용 저장소에서 읽어 Document 로 만듭니다 (원본은 답변 생성 때 읽음).
+    scores(코사인 유사도)는 metadata['score'] 로 붙여 검증 라우팅에 사용합니다.
+    """
+    metadatas = [dict(metadata or {}) for metadata in metadatas]
+    documents = documents or [None] * len(metadatas)
+    for metadata, score in zip(metadatas, scores or []):
+        metadata['score'] = score
+    texts = _get_content_store().get_many([metadata.get('retrieval_hash') for metadata in metadatas])
+    hydrated = []
+    for metadata, document in zip(metadatas, documents):
+        text = texts.get(metadata.get('retrieval_hash')) or document or metadata.get('original_content')
+        if text is None:
+            print(f"       - [경고] '{metadata.get('source')}' 의 내용을 찾을 수 없어 건너뜁니다.")
+            continue
+        hydrated.append(Document(page_content=text, metadata=metadata))
+    return hydrated
+
+
+def _distance_to_similarity(distance: float, space: str) -> float:
+    """Chroma 거리를 코사인 유사도로 바꿉니다 (임베딩은 정규화되어 있으므로 l2 제곱 거리 = 2 - 2cos)."""
+    if space == "cosine":
+        return 1.0 - distance
+    if space == "ip":
+        return -distance
+    return 1.0 - distance / 2.0
+
+
+def _load_original_contents(docs: List[Document]) -> dict:
+    """최종 문서들의 {content_hash: 원본 내용} 을 한 번에 읽습니다."""
+    return _get_content_store().get_many([doc.metadata.get('content_hash') for doc in docs])
+
+
+def get_ingest_queue() -> IngestionQueue:
+    global _INGEST_QUEUE
+    with _CACHE_LOCK:
+        if _INGEST_QUEUE is None:
+            _INGEST_QUEUE = IngestionQueue(_write_ingest_batch, _load_committed)
+        return _INGEST_QUEUE
+
+
 def prepare_retrieval(state: GraphState) -> dict:
-    print("--- (Node 2) 검색 준비, 벡터 저장소 로드 및 업데이트 ---")
-    notes = state['notes']
-    edges = state['edges']
-    db_path = _get_db_path()
+    print("--- (Node 2) 검색 준비, 변경된 메모를 색인 큐에 등록 ---")
+    queue = get_ingest_queue()
+    was_empty = queue.is_empty()
+    target_version = queue.submit(state['notes'])
 
-    embedding_function = GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL, task_type="retrieval_document")
-    vectorstore = Chroma(persist_directory=db_path, embedding_function=embedding_function)
-    
-    existing_ids_in_db = set(vectorstore.get()['ids'])
-    
-    notes_to_add = []
-    for note in notes:
-        # --- (수정 1) ---
-        # 청크 ID(_0) 대신 노트 파일명 자체로 DB 존재 여부 확인
-        note_id = note['fileName']
-        if note_id not in existing_ids_in_db:
-            notes_to_add.append(note)
-
-    if notes_to_add:
-        print(f"       - {len(notes_to_add)}개의 신규/업데이트 메모를 발견하여 DB에 추가합니다.")
-        
-        # --- (수정 2) ---
-        # TextSplitter 관련 코드 삭제
-        # text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50) # 삭제
-        
-        all_documents = []
-        all_ids = []
-        
-        # --- (수정 3) ---
-        # 청크 분할 루프를 제거하고, 노트 1개를 Document 1개로 매핑
-        for note in notes_to_add:
-            doc = Document(
-                # page_content에 (보강된) retrieval_content 전체를 저장
-                page_content=note['retrieval_content'], 
-                metadata={
-                    'source': note['fileName'], 
-                    'original_content': note['content'] # 원본 내용은 메타데이터에 보존
-                }
-            )
-            doc_id = note['fileName'] # ID는 파일명 사용
-            
-            all_documents.append(doc)
-            all_ids.append(doc_id)
-
-        if all_documents:
-            # --- (수정 4) ---
-            # 준비된 문서와 ID 리스트를 DB에 추가
-            vectorstore.add_documents(documents=all_documents, ids=all_ids)
-            print(f"       - 신규 메모 {len(all_documents)}개를 (청크 분할 없이) 통문서로 ChromaDB에 추가했습니다.")
-    
-    return {"vectorstore": vectorstore}
+    if target_version > queue.version:
+        if was_empty:
+            # 색인이 완전히 비어 있으면 검색할 것이 없으므로 첫 색인만은 기다립니다.
+            # 기다리는 시간은 답변 생성에 쓸 시간을 남기도록 마감 시각에 맞춰 줄입니다.
+            wait = max(0.0, min(INGEST_INITIAL_WAIT, _remaining(state) - GENERATE_RESERVE))
+            print(f"       - 색인이 비어 있어 첫 색인(버전 {target_version})을 최대 {wait:.1f}초 기다립니다.")
+            queue.wait_for(target_version, wait)
+        else:
+            # 이번 검색은 마지막으로 커밋된 색인을 사용하고, 변경분은 백그라운드에서 반영됩니다.
+            print(f"       - 변경된 메모를 백그라운드 색인에 넘겼습니다 (현재 버전 {queue.version} -> {target_version}).")
+
+    return {"vectorstore": _get_vectorstore("retrieval_document")}
 
 
 def first_pass_retrieval(state: GraphState) -> dict:
     print("--- (Node 3) 1차 검색 수행 ---")
     question = state['question']
     # vectorstore = state['vectorstore'] # <-- (★수정★) state의 객체를 더 이상 사용하지 않습니다.
-    db_path = _get_db_path() # DB 경로를 직접 가져옵니다.
 
     # --- (★수정★) ---
-    # 1. '검색어(Query)' 전용 임베딩 함수를 정의합니다.
-    query_embedding_function = GoogleGenerativeAIEmbeddings(
-        model=EMBEDDING_MODEL, 
-        task_type="retrieval_query"
-    )
-
-    # 2. '검색어용' 임베딩 함수로 새로운 Chroma 클라이언트를 로드합니다.
-    #    이 인스턴스는 오직 '검색(Querying)'에만 사용됩니다.
-    vectorstore_for_query = Chroma(
-        persist_directory=db_path, 
-        embedding_function=query_embedding_function
-    )
+    # '검색어(Query)' 전용 임베딩 함수를 가진 Chroma 인스턴스를 사용합니다.
+    # 이 인스턴스는 오직 '검색(Querying)'에만 사용됩니다.
+    vectorstore_for_query = _get_vectorstore("retrieval_query")
     # ------------------
 
-    if not vectorstore_for_query or vectorstore_for_query._collection.count() == 0:
+    doc_count = vectorstore_for_query._collection.count() if vectorstore_for_query else 0
+    if doc_count == 0:
         print("       - 벡터 저장소가 비어있어 검색을 건너뜁니다.")
         return {"top_docs": []}
 
-    # 3. '검색 전용' 인스턴스로 리트리버를 생성합니다.
-    retriever = vectorstore_for_query.as_retriever(search_kwargs={"k": 10})
-    
     try:
-        top_docs = retriever.invoke(question)
+        query_vector = vectorstore_for_query.embeddings.embed_query_before(question, state.get('deadline'))
+    except DeadlineExceeded:
+        return {"top_docs": [], "skipped_stages": _skip(state, "first_retrieval", "검색어 임베딩이 마감 시간 초과")}
+    except Exception as e:
+        print(f"       - 검색어 임베딩 실패: {e}")
+        return {"top_docs": []}
+
+    collection = vectorstore_for_query._collection
+    if use_flat_index(doc_count):
+        # ✨ 작은/중간 규모 볼트는 HNSW 대신 메모리 매핑 행렬에서 정확한 top-k 를 찾습니다.
+        try:
+            hits = _get_flat_index().search(query_vector, k=10)
+            if not hits:
+                return {"top_docs": []}
+            data = collection.get(ids=[doc_id for doc_id, _ in hits], include=["documents", "metadatas"])
+            rows = {doc_id: (metadata, document)
+                    for doc_id, metadata, document in zip(data['ids'], data['metadatas'], data['documents'])}
+            ordered = [(*rows[doc_id], score) for doc_id, score in hits if doc_id in rows]
+            top_docs = _hydrate([metadata for metadata, _, _ in ordered], [document for _, document, _ in ordered],
+                                [score for _, _, score in ordered])
+            print(f"       - 1차 검색 결과 (정확 검색, 상위 {len(top_docs)}개): {[doc.metadata['source'] for doc in top_docs]}")
+            return {"top_docs": top_docs}
+        except Exception as e:
+            print(f"       - 정확 검색 실패, Chroma 검색으로 대신합니다: {e}")
+
+    # 3. Chroma(HNSW)에서 상위 10개를 찾고, 본문은 내용 저장소에서 읽습니다.
+    try:
+        result = collection.query(query_embeddings=[query_vector], n_results=min(10, doc_count),
+                                  include=["documents", "metadatas", "distances"])
+        space = (collection.metadata or {}).get("hnsw:space", "l2")
+        scores = [_distance_to_similarity(distance, space) for distance in result['distances'][0]]
+        top_docs = _hydrate(result['metadatas'][0], result['documents'][0], scores)
         print(f"       - 1차 검색 결과 (상위 {len(top_docs)}개): {[doc.metadata['source'] for doc in top_docs]}")
         return {"top_docs": top_docs}
     except Exception as e:
@@ -280,21 +861,57 @@ def first_pass_retrieval(state: GraphState) -> dict:
         print("       - 'task_type' 불일치 또는 DB 접근 오류일 수 있습니다.")
         return {"top_docs": []}
 
-def generate_answer(state: GraphState) -> dict:
-    print("--- (Node 6) 최종 답변 생성 ---")
-    question = state['question']
-    top_docs = state.get('top_docs', [])
+def _stream_completion(model_name: str, temperature: float, prompt_value, should_cancel, deadline: float | None):
+    """
+    스트리밍으로 생성하며 조각마다 취소와 마감 시각을 확인합니다. (텍스트, 끝까지 생성했는지)를 반환합니다.
+    should_cancel()이 True 가 되면 스트림을 닫고 SpeculationCancelled 를 던지고,
+    마감 시각을 넘기면 스트림을 닫고 그때까지 받은 부분 답변을 반환합니다.
+    첫 조각이 오기 전이나 조각 사이에 멈춘 경우는 남은 시간으로 건 요청 시간 제한이 호출을 끝냅니다.
+    """
+    parts = []
+
+    def _stop() -> bool:
+        if should_cancel and should_cancel():
+            raise SpeculationCancelled()
+        return deadline is not None and time.monotonic() >= deadline
 
-    unique_docs_map = {(doc.metadata['source'], doc.page_content): doc for doc in top_docs}
+    def _consume():
+        if _stop():  # 리미터에서 기다리는 동안 취소/마감된 경우
+            return False
+        stream = _chat_model(model_name, temperature, _time_left(deadline)).stream(prompt_value)
+        try:
+            with _until_deadline(deadline):
+                for chunk in stream:
+                    if _stop():
+                        return False
+                    parts.append(chunk.content)
+        finally:
+            stream.close()
+        return True
+
+    start = time.perf_counter()
+    try:
+        completed = rate_limited(model_name, _consume, estimate_tokens(prompt_value.to_string()), deadline=deadline)
+    except DeadlineExceeded:
+        completed = False
+    if completed:
+        record_latency(model_name, time.perf_counter() - start)
+    return "".join(parts), completed
+
+
+def _answer_from_docs(question: str, top_docs: List[Document], should_cancel=None, deadline: float | None = None) -> dict:
+    unique_docs_map = {_doc_key(doc): doc for doc in top_docs}
     final_docs = list(unique_docs_map.values())
 
     if not final_docs:
         return {"answer": "죄송합니다, 관련 정보를 노트에서 찾을 수 없습니다.", "sources": []}
 
+    originals = _load_original_contents(final_docs)
     context_parts = []
     for doc in final_docs:
         source_file = doc.metadata.get('source', '알 수 없는 출처')
-        original_content = doc.metadata.get('original_content', doc.page_content)
+        original_content = (originals.get(doc.metadata.get('content_hash'))
+                            or doc.metadata.get('original_content', doc.page_content))
         
         context_part = (
             f"문서명: {source_file}\n"
@@ -306,36 +923,115 @@ def generate_answer(state: GraphState) -> dict:
     context_text = "\n\n---\n\n".join(context_parts)
     
     prompt_template = PROMPT_TEMPLATES["generate_answer"]
-    llm = ChatGoogleGenerativeAI(model=DEFAULT_GEMINI_MODEL, temperature=0.3)
-    chain = prompt_template | llm | StrOutputParser()
-    
-    answer = chain.invoke({"context": context_text, "question": question})
-    
+    model_name = route_model("rag_answer", estimate_tokens(context_text))
     source_names = sorted(list(set([doc.metadata['source'] for doc in final_docs])))
+    if should_cancel is None and deadline is None:
+        llm = _rate_limited_llm(model_name, temperature=0.3)
+        chain = prompt_template | llm | StrOutputParser()
+        answer = chain.invoke({"context": context_text, "question": question})
+        return {"final_context": context_text, "answer": answer, "sources": source_names}
+
+    prompt_value = prompt_template.invoke({"context": context_text, "question": question})
+    answer, completed = _stream_completion(model_name, 0.3, prompt_value, should_cancel, deadline)
+    if completed:
+        return {"final_context": context_text, "answer": answer, "sources": source_names}
+    # 마감 시간 안에 끝내지 못했으면 받은 데까지의 답변과 참고 노트를 돌려줍니다.
+    if answer.strip():
+        answer = f"{answer.rstrip()}\n\n(응답 시간 제한으로 답변이 중간에 끊겼습니다.)"
+    else:
+        answer = f"응답 시간 제한 안에 답변을 만들지 못했습니다. 관련 있어 보이는 노트: {', '.join(source_names)}"
+    return {"final_context": context_text, "answer": answer, "sources": source_names, "partial": True}
+
+
+def generate_answer(state: GraphState) -> dict:
+    print("--- (Node 6) 최종 답변 생성 ---")
+    result = state.get('speculative_result')
+    if result is None:
+        result = _answer_from_docs(state['question'], state.get('top_docs', []), deadline=state.get('deadline'))
+    else:
+        print("     - 검증과 동시에 미리 생성한 답변을 사용합니다.")
+    if result.get('partial'):
+        result = {**result, "skipped_stages": _skip(state, "generate", "마감 시간 초과, 부분 답변 반환")}
     
-    print(f"--- 답변 생성 완료 (참조: {source_names}) ---")
-    return {"final_context": context_text, "answer": answer, "sources": source_names}
+    print(f"--- 답변 생성 완료 (참조: {result['sources']}) ---")
+    return result
 
 def build_rag_workflow():
     workflow = StateGraph(GraphState)
     
-    workflow.add_node("expand_notes", expand_short_notes)
+    workflow.add_node("route_question", route_question)
     workflow.add_node("expand_question", expand_question)
     workflow.add_node("prepare", prepare_retrieval)
     workflow.add_node("first_retrieval", first_pass_retrieval)
+    workflow.add_node("route_documents", route_documents)
     workflow.add_node("validate_documents", validate_retrieved_documents)
     workflow.add_node("generate", generate_answer)
 
-    workflow.set_entry_point("expand_notes")
-
-
-
-    workflow.add_edge("expand_notes", "expand_question")
+    # 짧은 메모 보강은 색인 writer 스레드로 옮겨져 요청 경로에서 빠졌습니다.
+    workflow.set_entry_point("route_question")
+    workflow.add_conditional_edges("route_question", _after_route_question,
+                                   {"expand_question": "expand_question", "prepare": "prepare"})
     workflow.add_edge("expand_question", "prepare")
 
     workflow.add_edge("prepare", "first_retrieval")
-    workflow.add_edge("first_retrieval", "validate_documents")
+    workflow.add_edge("first_retrieval", "route_documents")
+    workflow.add_conditional_edges("route_documents", _after_route_documents,
+                                   {"validate_documents": "validate_documents", "generate": "generate"})
     workflow.add_edge("validate_documents", "generate")
     workflow.add_edge("generate", END)
 
-    return workflow.compile()
\ No newline at end of file
+    return workflow.compile()
+
+
+def get_compiled_workflow():
+    """컴파일된 그래프를 한 번만 만들고 재사용합니다."""
+    global _COMPILED_WORKFLOW
+    with _CACHE_LOCK:
+        if _COMPILED_WORKFLOW is None:
+            _COMPILED_WORKFLOW = build_rag_workflow()
+        return _COMPILED_WORKFLOW
+
+
+def warmup() -> dict:
+    """
+    LLM 클라이언트 생성, 벡터 저장소 열기(HNSW 인덱스 로드 포함), 작은 임베딩 호출, 그래프 컴파일을 미리 수행합니다.
+    구성 요소별 결과를 {"이름": "ready" | "error: ..."} 형태로 반환합니다.
+    """
+    status = {}
+
+    try:
+        for task_type, temperature in [("expand_note", 0.5), ("expand_question", 0),
+                                       ("rag_answer", 0.3), ("validate_documents", 0)]:
+            _rate_limited_llm(route_model(task_type), temperature)
+        status["llm_clients"] = "ready"
+    except Exception as e:
+        status["llm_clients"] = f"error: {e}"
+
+    query_vector = None
+    try:
+        query_store = _get_vectorstore("retrieval_query")
+        query_vector = query_store.embeddings.embed_query("warmup")
+        status["embedding_client"] = "ready"
+    except Exception as e:
+        status["embedding_client"] = f"error: {e}"
+
+    try:
+        _get_vectorstore("retrieval_document")
+        get_ingest_queue().is_empty()  # 색인된 노트의 내용 해시를 미리 읽어 둡니다.
+        _get_flat_index()
+        query_store = _get_vectorstore("retrieval_query")
+        collection = query_store._collection
+        # 비어있지 않다면 쿼리 한 번으로 HNSW 인덱스를 메모리에 올립니다.
+        if query_vector and collection.count() > 0:
+            collection.query(query_embeddings=[query_vector], n_results=1)
+        status["vectorstore"] = "ready"
+    except Exception as e:
+        status["vectorstore"] = f"error: {e}"
+
+    try:
+        get_compiled_workflow()
+        status["workflow_graph"] = "ready"
+    except Exception as e:
+        status["workflow_graph"] = f"error: {e}"
+
+    return status
\ No newline at end of file
@@ -0,0 +1,246 @@
+# py/rate_limiter.py
+
+import os
+import re
+import json
+import time
+import random
+import threading
+from collections import deque
+
+# --- 1. 모델별 한도 설정 ---
+# rpm: 분당 요청 수, tpm: 분당 토큰 수, max_concurrency: 동시 요청 상한
+# GEMINI_RATE_LIMITS 환경변수(JSON)로 모델별 값을 덮어쓸 수 있습니다.
+# 예: GEMINI_RATE_LIMITS='{"gemini-2.5-flash": {"rpm": 30, "tpm": 500000}}'
+DEFAULT_MODEL_LIMITS = {
+    "gemini-2.5-flash": {"rpm": 10, "tpm": 250000, "max_concurrency": 4},
+    "gemini-2.5-flash-lite": {"rpm": 15, "tpm": 250000, "max_concurrency": 6},
+    "models/text-embedding-004": {"rpm": 1500, "tpm": 1000000, "max_concurrency": 8},
+    "default": {"rpm": 10, "tpm": 250000, "max_concurrency": 4},
+}
+
+WINDOW_SECONDS = 60.0
+DEFAULT_RETRIES = 4
+BASE_BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 30.0
+
+
+def _load_model_limits() -> dict:
+    limits = {name: dict(values) for name, values in DEFAULT_MODEL_LIMITS.items()}
+    override = os.getenv("GEMINI_RATE_LIMITS")
+    if override:
+        try:
+            for name, values in json.loads(override).items():
+                limits.setdefault(name, dict(DEFAULT_MODEL_LIMITS["default"])).update(values)
+        except (json.JSONDecodeError, AttributeError) as e:
+            print(f"[경고] GEMINI_RATE_LIMITS 파싱 실패, 기본 한도를 사용합니다: {e}")
+    # 다중 워커 모드(MEMORDO_WORKERS=N)에서는 프로세스마다 리미터가 따로 있으므로 한도를 워커 수로 나눕니다.
+    workers = max(1, int(os.getenv("MEMORDO_WORKERS", "1")))
+    if workers > 1:
+        for values in limits.values():
+            values["rpm"] = max(1, values["rpm"] // workers)
+            values["tpm"] = max(1, values["tpm"] // workers)
+            values["max_concurrency"] = max(1, -(-values["max_concurrency"] // workers))
+    return limits
+
+
+def _normalize_model_name(model_name: str) -> str:
+    """'models/gemini-2.5-flash' 와 'gemini-2.5-flash' 를 같은 버킷으로 취급합니다."""
+    if model_name and model_name.startswith("models/") and "embedding" not in model_name:
+        return model_name[len("models/"):]
+    return model_name or "default"
+
+
+def estimate_tokens(text) -> int:
+    """
+    토크나이저 없이 대략적인 토큰 수를 추정합니다.
+    한글은 대체로 1~2자당 1토큰, 영문은 4자당 1토큰 정도이므로 보수적으로 3자당 1토큰으로 계산합니다.
+    """
+    if text is None:
+        return 1
+    if not isinstance(text, str):
+        text = str(text)
+    return max(1, len(text) // 3)
+
+
+_RATE_LIMIT_TYPES = ("ResourceExhausted", "TooManyRequests")
+# google.api_core 예외의 문자열은 "429 Resource has been exhausted ..." 처럼 상태 코드로 시작합니다.
+_STATUS_429_RE = re.compile(r"^\s*429\b")
+
+
+def _status_code(error: Exception):
+    """예외에 실린 HTTP 상태 코드 (code / status_code / response.status_code 중 정수인 값)."""
+    for value in (getattr(error, "code", None), getattr(error, "status_code", None),
+                  getattr(getattr(error, "response", None), "status_code", None)):
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """
+    Gemini SDK / LangChain 에서 올라오는 할당량 초과(429) 예외인지 판별합니다.
+    상태 코드 429, ResourceExhausted/TooManyRequests 타입, RESOURCE_EXHAUSTED 상태만 인정합니다.
+    ('quota' 같은 단어나 메시지 중간의 숫자 429 는 다른 오류에도 나오므로 보지 않습니다.)
+    LangChain 처럼 원래 예외를 감싸서 다시 던지는 경우를 위해 __cause__ 도 확인합니다.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if type(error).__name__ in _RATE_LIMIT_TYPES or _status_code(error) == 429:
+            return True
+        message = str(error)
+        if "RESOURCE_EXHAUSTED" in message or _STATUS_429_RE.match(message):
+            return True
+        error = error.__cause__
+    return False
+
+
+class DeadlineExceeded(TimeoutError):
+    """요청의 마감 시각(time.monotonic 기준)까지 슬롯을 얻지 못했거나 재시도할 시간이 남지 않았을 때 발생합니다."""
+
+
+# --- 2. 모델별 버킷 (RPM/TPM 슬라이딩 윈도우 + AIMD 동시성) ---
+class _ModelBucket:
+    def __init__(self, model_name: str, rpm: int, tpm: int, max_concurrency: int):
+        self.model_name = model_name
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrency = max(1, max_concurrency)
+        # AIMD로 조정되는 현재 동시성 한도 (실수로 관리하여 가산 증가를 부드럽게 처리)
+        self.concurrency_limit = float(self.max_concurrency)
+        self.in_flight = 0
+        self.events = deque()  # (timestamp, tokens)
+        self.window_tokens = 0
+        self.cond = threading.Condition()
+
+    def _prune(self, now: float):
+        while self.events and now - self.events[0][0] >= WINDOW_SECONDS:
+            _, tokens = self.events.popleft()
+            self.window_tokens -= tokens
+
+    def _wait_seconds(self, tokens: int, now: float) -> float:
+        """지금 요청을 보낼 수 있으면 0, 아니면 기다려야 할 시간(초)을 반환합니다."""
+        if self.in_flight >= int(self.concurrency_limit):
+            return -1  # 동시성 슬롯이 비워질 때까지 notify 대기
+        wait = 0.0
+        if len(self.events) >= self.rpm:
+            wait = max(wait, WINDOW_SECONDS - (now - self.events[0][0]))
+        # 단일 요청이 TPM 자체를 넘는 경우에는 윈도우가 빌 때까지만 기다립니다.
+        if self.window_tokens + tokens > self.tpm and self.events:
+            freed = 0
+            for timestamp, event_tokens in self.events:
+                freed += event_tokens
+                if self.window_tokens - freed + tokens <= self.tpm:
+                    wait = max(wait, WINDOW_SECONDS - (now - timestamp))
+                    break
+            else:
+                wait = max(wait, WINDOW_SECONDS - (now - self.events[-1][0]))
+        return wait
+
+    def acquire(self, tokens: int, deadline: float | None = None):
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                self._prune(now)
+                wait = self._wait_seconds(tokens, now)
+                if wait == 0:
+                    break
+                timeout = None if wait < 0 else wait
+                if deadline is not None:
+                    if now >= deadline:
+                        raise DeadlineExceeded()
+                    timeout = deadline - now if timeout is None else min(timeout, deadline - now)
+                self.cond.wait(timeout=timeout)
+            self.in_flight += 1
+            self.events.append((now, tokens))
+            self.window_tokens += tokens
+
+    def release(self, throttled: bool):
+        with self.cond:
+            self.in_flight -= 1
+            if throttled:
+                # Multiplicative decrease
+                self.concurrency_limit = max(1.0, self.concurrency_limit / 2)
+                print(f"[경고] '{self.model_name}' 할당량 초과 감지 - 동시성 한도를 {int(self.concurrency_limit)}(으)로 낮춥니다.")
+            else:
+                # Additive increase (한도 1회 분량의 성공마다 1씩 증가)
+                self.concurrency_limit = min(float(self.max_concurrency),
+                                             self.concurrency_limit + 1.0 / self.concurrency_limit)
+            self.cond.notify_all()
+
+    def snapshot(self) -> dict:
+        with self.cond:
+            self._prune(time.monotonic())
+            return {
+                "rpm": self.rpm,
+                "tpm": self.tpm,
+                "concurrency_limit": int(self.concurrency_limit),
+                "in_flight": self.in_flight,
+                "requests_in_window": len(self.events),
+                "tokens_in_window": self.window_tokens,
+            }
+
+
+# --- 3. 프로세스 전역 리미터 ---
+class GeminiRateLimiter:
+    """
+    gemini_ai, rag_workflow(LangChain), 그래프 엔드포인트가 함께 사용하는 프로세스 전역 리미터입니다.
+    모델별로 RPM/TPM을 지키고, 429/RESOURCE_EXHAUSTED 응답 시 동시성을 AIMD 방식으로 줄이며
+    지터가 포함된 지수 백오프로 재시도합니다.
+    """
+
+    def __init__(self, model_limits: dict | None = None):
+        self.model_limits = model_limits or _load_model_limits()
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, model_name: str) -> _ModelBucket:
+        key = _normalize_model_name(model_name)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                limits = self.model_limits.get(key, self.model_limits["default"])
+                bucket = _ModelBucket(key, limits["rpm"], limits["tpm"], limits["max_concurrency"])
+                self._buckets[key] = bucket
+            return bucket
+
+    def call(self, model_name: str, fn, estimated_tokens: int = 1, retries: int = DEFAULT_RETRIES,
+             deadline: float | None = None):
+        """
+        fn()을 모델 한도 안에서 실행합니다.
+        할당량 초과 예외는 지터 백오프로 재시도하고, 그 밖의 예외는 그대로 호출자에게 전달합니다.
+        deadline 을 주면 슬롯 대기와 백오프가 마감 시각을 넘길 때 DeadlineExceeded 를 던집니다.
+        """
+        bucket = self._bucket(model_name)
+        for attempt in range(retries + 1):
+            bucket.acquire(estimated_tokens, deadline)
+            try:
+                result = fn()
+            except Exception as e:
+                throttled = is_rate_limit_error(e)
+                bucket.release(throttled=throttled)
+                if not throttled or attempt == retries:
+                    raise
+                # Full jitter: [0, min(cap, base * 2^attempt)] 구간에서 균등 추출
+                backoff = random.uniform(0, min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * (2 ** attempt)))
+                if deadline is not None and time.monotonic() + backoff >= deadline:
+                    raise DeadlineExceeded() from e
+                print(f"[정보] '{bucket.model_name}' 429 응답, {backoff:.2f}초 후 재시도 ({attempt + 1}/{retries})")
+                time.sleep(backoff)
+                continue
+            bucket.release(throttled=False)
+            return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            buckets = list(self._buckets.items())
+        return {name: bucket.snapshot() for name, bucket in buckets}
+
+
+RATE_LIMITER = GeminiRateLimiter()
+
+
+def rate_limited(model_name: str, fn, estimated_tokens: int = 1, deadline: float | None = None):
+    """전역 RATE_LIMITER를 통해 fn()을 실행하는 단축 함수입니다."""
+    return RATE_LIMITER.call(model_name, fn, estimated_tokens, deadline=deadline)
@@ -1,6 +1,37 @@
-from waitress import serve
-from app import app # app.py에서 Flask app 객체를 가져옵니다.
+import os
+import time
+from startup import start_prewarm, IMPORT_TIMER, PROCESS_START
+import worker_pool
 
 # host='0.0.0.0'은 모든 IP에서의 접속을 허용합니다.
 # port=5001은 app.py와 동일하게 설정합니다.
-serve(app, host='0.0.0.0', port=5001)
\ No newline at end of file
+HOST = '0.0.0.0'
+PORT = 5001
+
+
+def load_app():
+    from app import app # app.py에서 Flask app 객체를 가져옵니다.
+
+    print(f"서버 준비 완료 ({time.perf_counter() - PROCESS_START:.2f}초)")
+    if IMPORT_TIMER is not None:
+        print(IMPORT_TIMER.report(top=40))
+
+    # MEMORDO_PREWARM=1 이면 첫 요청 전에 langchain/chromadb 등을 백그라운드에서 미리 로드합니다.
+    # (다중 워커 모드에서는 fork 이후 각 워커 안에서 실행됩니다.)
+    start_prewarm()
+    return app
+
+
+if worker_pool.WORKER_COUNT > 1 and worker_pool.supports_prefork():
+    # ✨ MEMORDO_WORKERS=N 이면 pre-fork 워커 N개가 같은 리스너 소켓을 공유합니다. (kill -HUP 으로 무중단 재시작)
+    if worker_pool.PRELOAD:
+        from app import app
+    worker_pool.PreforkMaster(load_app, HOST, PORT).run()
+else:
+    if worker_pool.WORKER_COUNT > 1:
+        print("[경고] 이 플랫폼은 fork 를 지원하지 않아 단일 프로세스로 실행합니다.")
+        # rate_limiter 가 한도를 워커 수로 나누지 않도록 app import 전에 되돌립니다.
+        os.environ["MEMORDO_WORKERS"] = "1"
+    from waitress import serve
+    # channel_request_lookahead 를 켜야 스트리밍 중 클라이언트 연결 종료를 감지해 생성을 취소할 수 있습니다.
+    serve(load_app(), host=HOST, port=PORT, channel_request_lookahead=1)
@@ -0,0 +1,104 @@
+# py/sbert_encoder.py
+
+import os
+import atexit
+import threading
+import numpy as np
+
+# --- 1. 설정 ---
+# SBERT_BATCH_SIZE            : encode 배치 크기
+# SBERT_PROCESSES             : 2 이상이면 대량 인코딩에 CPU 코어별 다중 프로세스 풀을 사용 (0/1 이면 사용 안 함)
+# SBERT_MULTIPROCESS_MIN_TEXTS: 이 수 이상의 텍스트를 한 번에 인코딩할 때만 다중 프로세스 풀을 사용
+SBERT_BATCH_SIZE = int(os.getenv("SBERT_BATCH_SIZE", "64"))
+SBERT_PROCESSES = int(os.getenv("SBERT_PROCESSES", "0"))
+SBERT_MULTIPROCESS_MIN_TEXTS = int(os.getenv("SBERT_MULTIPROCESS_MIN_TEXTS", "2000"))
+
+
+class SbertEncoder:
+    """
+    sentence-transformers 모델의 배치 인코더입니다.
+    입력을 길이순으로 정렬해 배치마다 패딩을 줄이고, 결과는 원래 순서의 float32 numpy 배열(n, dim)로 돌려줍니다.
+    대량 인코딩은 선택적으로 다중 프로세스 풀에 나눠 보내고, 검색어 인코딩은 풀을 거치지 않고 바로 처리합니다.
+    """
+
+    def __init__(self, model_name: str, batch_size: int = SBERT_BATCH_SIZE, processes: int = SBERT_PROCESSES,
+                 normalize: bool = False, device: str | None = None):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.processes = processes
+        self.normalize = normalize
+        self.device = device
+        self._model = None
+        self._pool = None
+        self._load_lock = threading.Lock()
+        # torch 가 이미 모든 코어를 쓰므로, 같은 프로세스 안의 인코딩은 한 번에 하나씩 실행합니다.
+        self._encode_lock = threading.Lock()
+
+    @property
+    def model(self):
+        # sentence_transformers 는 torch 를 끌어와 로드가 느리므로 첫 사용 시점에 import 합니다.
+        with self._load_lock:
+            if self._model is None:
+                from sentence_transformers import SentenceTransformer
+                self._model = SentenceTransformer(self.model_name, device=self.device)
+                print(f"[정보] SentenceTransformer 모델 '{self.model_name}' 로드 완료.")
+            return self._model
+
+    def dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def _multi_process_pool(self):
+        with self._load_lock:
+            if self._pool is None:
+                self._pool = self._model.start_multi_process_pool(target_devices=["cpu"] * self.processes)
+                atexit.register(self.close)
+                print(f"[정보] SBERT 다중 프로세스 풀 시작 (프로세스 {self.processes}개)")
+            return self._pool
+
+    def encode_batch(self, texts: list[str]) -> np.ndarray:
+        """여러 텍스트를 인코딩해 (len(texts), dim) float32 배열로 반환합니다."""
+        model = self.model
+        if not texts:
+            return np.zeros((0, self.dimension()), dtype=np.float32)
+        processed = [text if text and text.strip() else " " for text in texts]
+        # 긴 텍스트부터 정렬하면 비슷한 길이끼리 한 배치에 모여 패딩 토큰이 줄어듭니다.
+        order = np.argsort([-len(text) for text in processed], kind="stable")
+        ordered = [processed[i] for i in order]
+
+        if self.processes > 1 and len(ordered) >= SBERT_MULTIPROCESS_MIN_TEXTS:
+            vectors = model.encode_multi_process(ordered, self._multi_process_pool(), batch_size=self.batch_size,
+                                                 normalize_embeddings=self.normalize)
+        else:
+            with self._encode_lock:
+                vectors = model.encode(ordered, batch_size=self.batch_size, normalize_embeddings=self.normalize,
+                                       convert_to_numpy=True, show_progress_bar=False)
+
+        result = np.empty_like(vectors, dtype=np.float32)
+        result[order] = vectors
+        return result
+
+    def encode_query(self, text: str) -> np.ndarray:
+        """검색어 하나를 바로 인코딩합니다 (정렬/풀 없이 단일 호출)."""
+        model = self.model
+        with self._encode_lock:
+            vector = model.encode(text if text and text.strip() else " ", normalize_embeddings=self.normalize,
+                                  convert_to_numpy=True, show_progress_bar=False)
+        return vector.astype(np.float32, copy=False)
+
+    def close(self):
+        with self._load_lock:
+            if self._pool is not None:
+                self._model.stop_multi_process_pool(self._pool)
+                self._pool = None
+
+
+_encoders = {}
+_encoders_lock = threading.Lock()
+
+
+def get_sbert_encoder(model_name: str, normalize: bool = False, device: str | None = None) -> SbertEncoder:
+    key = (model_name, normalize, device)
+    with _encoders_lock:
+        if key not in _encoders:
+            _encoders[key] = SbertEncoder(model_name, normalize=normalize, device=device)
+        return _encoders[key]
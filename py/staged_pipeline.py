@@ -0,0 +1,141 @@
+# py/staged_pipeline.py
+
+import time
+import queue
+import threading
+import traceback
+
+PIPELINE_QUEUE_SIZE = 64       # 단계 사이 대기열 크기 (앞 단계가 너무 앞서 나가 메모리를 쓰지 않도록 제한)
+PROGRESS_INTERVAL = 5.0        # 진행 상황 출력 주기(초)
+
+_END = object()
+
+
+class Stage:
+    """
+    파이프라인의 한 단계입니다. fn(batch: list) 은 출력 항목들의 리스트(0개 이상)를 반환합니다.
+    workers 개의 스레드가 입력 대기열에서 최대 batch_size 개씩 모아 fn 을 호출합니다.
+    """
+
+    def __init__(self, name: str, fn, workers: int = 1, batch_size: int = 1, batch_wait: float = 0.2):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait
+        self.items_in = 0
+        self.items_out = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+        self._alive = 0
+
+    def _record(self, items_in: int, items_out: int, seconds: float, failed: bool):
+        with self._lock:
+            self.items_in += items_in
+            self.items_out += items_out
+            self.busy_seconds += seconds
+            self.errors += int(failed)
+
+    def _take_batch(self, inbox: queue.Queue) -> tuple[list, bool]:
+        """(배치, 입력이 끝났는지). 첫 항목은 기다리고, 나머지는 batch_wait 동안만 더 모읍니다."""
+        first = inbox.get()
+        if first is _END:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = inbox.get(timeout=max(0.0, remaining)) if remaining > 0 else inbox.get_nowait()
+            except queue.Empty:
+                break
+            if item is _END:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self, inbox: queue.Queue, outbox: queue.Queue | None):
+        ended = False
+        while not ended:
+            batch, ended = self._take_batch(inbox)
+            if batch:
+                started = time.perf_counter()
+                try:
+                    outputs = self.fn(batch) or []
+                except Exception as e:
+                    print(f"[오류] 파이프라인 단계 '{self.name}' 처리 실패 ({len(batch)}개): {e}")
+                    traceback.print_exc()
+                    self._record(len(batch), 0, time.perf_counter() - started, failed=True)
+                    continue
+                self._record(len(batch), len(outputs), time.perf_counter() - started, failed=False)
+                if outbox is not None:
+                    for output in outputs:
+                        outbox.put(output)
+        # 종료 표시는 같은 단계의 다른 워커도 받을 수 있도록 되돌려 놓고, 마지막 워커가 다음 단계로 넘깁니다.
+        inbox.put(_END)
+        with self._lock:
+            self._alive -= 1
+            last = self._alive == 0
+            if last:
+                self.finished_at = time.perf_counter()
+        if last and outbox is not None:
+            outbox.put(_END)
+
+    def summary(self) -> str:
+        elapsed = ((self.finished_at or time.perf_counter()) - (self.started_at or time.perf_counter())) or 1e-9
+        return (f"{self.name:<10} 입력 {self.items_in:>7} 출력 {self.items_out:>7} 오류 {self.errors:>4} "
+                f"처리량 {self.items_in / elapsed:>8.1f}/초 (작업 시간 {self.busy_seconds:.1f}초, 워커 {self.workers})")
+
+
+def run_pipeline(source, stages: list[Stage], queue_size: int = PIPELINE_QUEUE_SIZE,
+                 progress_interval: float = PROGRESS_INTERVAL, label: str = "파이프라인") -> list:
+    """
+    source 의 항목을 단계들에 차례로 흘려보내고 마지막 단계의 출력을 모아 반환합니다.
+    단계 사이는 크기가 제한된 대기열로 연결되어, 느린 단계가 있으면 앞 단계가 자동으로 속도를 맞춥니다.
+    """
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages] + [queue.Queue()]
+    threads = []
+    started = time.perf_counter()
+    for index, stage in enumerate(stages):
+        stage.started_at = started
+        stage._alive = stage.workers
+        for worker in range(stage.workers):
+            thread = threading.Thread(target=stage._run, args=(queues[index], queues[index + 1]),
+                                      name=f"pipeline-{stage.name}-{worker}", daemon=True)
+            thread.start()
+            threads.append(thread)
+
+    done = threading.Event()
+
+    def report():
+        while not done.wait(progress_interval):
+            elapsed = time.perf_counter() - started
+            parts = [f"{stage.name} {stage.items_in}(대기 {queues[i].qsize()})" for i, stage in enumerate(stages)]
+            print(f"[정보] {label} {elapsed:.0f}초: " + " → ".join(parts))
+
+    reporter = threading.Thread(target=report, name="pipeline-progress", daemon=True)
+    reporter.start()
+
+    def feed():
+        for item in source:
+            queues[0].put(item)
+        queues[0].put(_END)
+
+    feeder = threading.Thread(target=feed, name="pipeline-source", daemon=True)
+    feeder.start()
+
+    results = []
+    while True:
+        item = queues[-1].get()
+        if item is _END:
+            break
+        results.append(item)
+    done.set()
+
+    print(f"[정보] {label} 완료 ({time.perf_counter() - started:.1f}초)")
+    for stage in stages:
+        print(f"    {stage.summary()}")
+    return results
@@ -0,0 +1,148 @@
+# py/startup.py
+
+import os
+import sys
+import time
+import importlib
+import threading
+from importlib.abc import MetaPathFinder, Loader
+
+# --- 1. 설정 ---
+# MEMORDO_IMPORT_TIMING=1 : 모듈별 import 시간을 수집하여 `-X importtime` 형식으로 출력
+# MEMORDO_PREWARM=1       : 서버 시작 직후 백그라운드 스레드에서 무거운 모듈을 미리 로드
+IMPORT_TIMING_ENABLED = os.getenv("MEMORDO_IMPORT_TIMING", "0") == "1"
+PREWARM_ENABLED = os.getenv("MEMORDO_PREWARM", "0") == "1"
+
+# 첫 요청 때 로드되는 무거운 모듈 (langchain, langgraph, chromadb, google-genai 등을 끌어옴)
+HEAVY_MODULES = ["google.generativeai", "rag_workflow"]
+
+PROCESS_START = time.perf_counter()
+
+_lazy_lock = threading.Lock()
+_lazy_timings = []  # (module_name, seconds)
+
+
+# --- 2. -X importtime 스타일 import 타이머 ---
+class _TimingLoader(Loader):
+    def __init__(self, inner, recorder):
+        self.inner = inner
+        self.recorder = recorder
+
+    def create_module(self, spec):
+        return self.inner.create_module(spec)
+
+    def exec_module(self, module):
+        self.recorder.enter()
+        start = time.perf_counter()
+        try:
+            self.inner.exec_module(module)
+        finally:
+            self.recorder.leave(module.__name__, time.perf_counter() - start)
+
+    def __getattr__(self, name):
+        # get_resource_reader 등 로더 고유 기능은 원래 로더에 위임
+        return getattr(self.inner, name)
+
+
+class ImportTimer(MetaPathFinder):
+    """
+    sys.meta_path 맨 앞에 끼워져 모든 import의 self/cumulative 시간을 기록합니다.
+    출력 형식은 `python -X importtime` 과 동일합니다 (단위: 마이크로초).
+    """
+
+    def __init__(self):
+        self.records = []  # (self_us, cumulative_us, depth, name)
+        self._local = threading.local()
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def enter(self):
+        self._stack().append(0.0)  # 자식 import에 쓰인 누적 시간
+
+    def leave(self, name, elapsed):
+        stack = self._stack()
+        children = stack.pop()
+        if stack:
+            stack[-1] += elapsed
+        self.records.append((int((elapsed - children) * 1e6), int(elapsed * 1e6), len(stack), name))
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimingLoader(spec.loader, self)
+                return spec
+        return None
+
+    def install(self):
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+        return self
+
+    def report(self, top: int | None = None) -> str:
+        lines = ["import time: self [us] | cumulative | imported package"]
+        records = self.records
+        if top:
+            records = sorted(records, key=lambda r: r[1], reverse=True)[:top]
+        for self_us, cumulative_us, depth, name in records:
+            lines.append(f"import time: {self_us:>9} | {cumulative_us:>10} | {'  ' * depth}{name}")
+        return "\n".join(lines)
+
+
+IMPORT_TIMER = ImportTimer().install() if IMPORT_TIMING_ENABLED else None
+
+
+# --- 3. 지연 import ---
+def lazy_import(module_name: str):
+    """
+    모듈을 처음 필요할 때 import 하고 소요 시간을 기록합니다.
+    이미 로드된 모듈은 sys.modules 에서 바로 반환합니다.
+    """
+    module = sys.modules.get(module_name)
+    if module is not None:
+        return module
+    with _lazy_lock:
+        module = sys.modules.get(module_name)
+        if module is not None:
+            return module
+        start = time.perf_counter()
+        module = importlib.import_module(module_name)
+        elapsed = time.perf_counter() - start
+        _lazy_timings.append((module_name, elapsed))
+        print(f"[정보] 지연 로드: '{module_name}' ({elapsed:.2f}초)")
+        return module
+
+
+def _prewarm(module_names):
+    for module_name in module_names:
+        try:
+            lazy_import(module_name)
+        except Exception as e:
+            print(f"[경고] 사전 로드 실패 ('{module_name}'): {e}")
+    print(f"[정보] 백그라운드 사전 로드 완료 (서버 시작 후 {time.perf_counter() - PROCESS_START:.2f}초)")
+
+
+def start_prewarm(module_names=None, force: bool = False):
+    """MEMORDO_PREWARM=1 이거나 force=True 이면 데몬 스레드에서 무거운 모듈을 미리 로드합니다."""
+    if not (PREWARM_ENABLED or force):
+        return None
+    thread = threading.Thread(target=_prewarm, args=(module_names or HEAVY_MODULES,),
+                              name="memordo-prewarm", daemon=True)
+    thread.start()
+    return thread
+
+
+def startup_report() -> dict:
+    report = {
+        "uptime_seconds": round(time.perf_counter() - PROCESS_START, 3),
+        "lazy_imports": [{"module": name, "seconds": round(sec, 3)} for name, sec in _lazy_timings],
+    }
+    if IMPORT_TIMER is not None:
+        report["importtime"] = IMPORT_TIMER.report(top=40).splitlines()
+    return report
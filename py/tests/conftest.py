@@ -0,0 +1,7 @@
+# py/tests/conftest.py
+
+import os
+import sys
+
+# py/ 의 모듈들은 같은 디렉터리에서 서로를 평평하게 import 하므로, 테스트에서도 py/ 를 경로에 넣습니다.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
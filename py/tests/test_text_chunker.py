@@ -0,0 +1,111 @@
+# py/tests/test_text_chunker.py
+
+import os
+import tempfile
+import unittest
+
+from text_chunker import chunk_text, estimate_tokens, iter_blocks, iter_file_chunks, split_sentences
+
+
+def section(title: str, count: int) -> str:
+    return f"# {title}\n\n" + " ".join(f"{title} 문장 {i} 입니다." for i in range(count)) + "\n\n"
+
+
+def shared_sentences(previous: str, following: str) -> list[str]:
+    """previous 의 마지막 문장들 중 following 의 첫 문장들과 같은 가장 긴 부분 (겹침)."""
+    tail, head = split_sentences(previous.replace("\n", " ")), split_sentences(following.replace("\n", " "))
+    for size in range(min(len(tail), len(head)), 0, -1):
+        if tail[-size:] == head[:size]:
+            return head[:size]
+    return []
+
+
+class SplitSentencesTest(unittest.TestCase):
+    def test_korean_endings_split_sentences(self):
+        self.assertEqual(split_sentences("정말 맛있었다 그래서 기뻤어요 다음에 또 올까 생각했다"),
+                         ["정말 맛있었다", "그래서 기뻤어요", "다음에 또 올까", "생각했다"])
+
+    def test_one_letter_word_da_is_not_a_sentence_end(self):
+        self.assertEqual(split_sentences("모두 다 먹었다 그리고 잤다"), ["모두 다 먹었다", "그리고 잤다"])
+        self.assertEqual(split_sentences("나는 밥을 모두 다 먹었다."), ["나는 밥을 모두 다 먹었다."])
+
+    def test_punctuation_and_closing_quotes(self):
+        self.assertEqual(split_sentences('Hello world. He said "fine." Then left! 좋아요'),
+                         ["Hello world.", 'He said "fine."', "Then left!", "좋아요"])
+
+    def test_text_without_sentence_end_is_one_sentence(self):
+        self.assertEqual(split_sentences("  제목 없는 메모  "), ["제목 없는 메모"])
+
+
+class IterBlocksTest(unittest.TestCase):
+    def test_block_kinds_and_paragraph_joining(self):
+        lines = ["# 제목", "", "첫 줄이 이어지고", "다음 줄에서 끝납니다.", "", "```python", "x = 1", "", "y = 2", "```",
+                 "- 목록 항목"]
+        self.assertEqual(list(iter_blocks(lines)), [
+            ("heading", "# 제목"),
+            ("text", "첫 줄이 이어지고 다음 줄에서 끝납니다."),
+            ("code", "```python\nx = 1\n\ny = 2\n```"),
+            ("text", "- 목록 항목"),
+        ])
+
+    def test_unclosed_code_fence_is_kept(self):
+        self.assertEqual(list(iter_blocks(["```", "print(1)"])), [("code", "```\nprint(1)")])
+
+
+class ChunkTextTest(unittest.TestCase):
+    def test_empty_text_has_no_chunks(self):
+        self.assertEqual(chunk_text(""), [])
+        self.assertEqual(chunk_text(" \n\n "), [])
+
+    def test_chunks_respect_max_tokens(self):
+        text = section("가", 40) + section("나", 25)
+        chunks = chunk_text(text, max_tokens=30, overlap_tokens=8)
+        self.assertGreater(len(chunks), 3)
+        for chunk in chunks:
+            self.assertLessEqual(estimate_tokens(chunk), 30)
+
+    def test_heading_starts_new_chunk_without_overlap_across_it(self):
+        chunks = chunk_text(section("가", 40) + section("나", 3), max_tokens=30, overlap_tokens=8)
+        second = [chunk for chunk in chunks if "나 문장" in chunk]
+        self.assertEqual(len(second), 1)
+        self.assertTrue(second[0].startswith("# 나\n"))
+        self.assertNotIn("가 문장", second[0])
+        self.assertTrue(chunks[0].startswith("# 가\n"))
+
+    def test_overlap_is_bounded_by_overlap_tokens(self):
+        chunks = chunk_text(section("가", 60), max_tokens=30, overlap_tokens=8)
+        for previous, following in zip(chunks, chunks[1:]):
+            overlap = shared_sentences(previous, following)
+            self.assertTrue(overlap, "같은 절 안의 다음 청크는 앞 청크의 마지막 문장으로 시작해야 합니다")
+            self.assertLessEqual(sum(estimate_tokens(sentence) for sentence in overlap), 8)
+
+    def test_zero_overlap_shares_nothing(self):
+        chunks = chunk_text(section("가", 60), max_tokens=30, overlap_tokens=0)
+        for previous, following in zip(chunks, chunks[1:]):
+            self.assertEqual(shared_sentences(previous, following), [])
+        sentences = [s for chunk in chunks for s in split_sentences(chunk.replace("\n", " ")) if "문장" in s]
+        self.assertEqual(len(sentences), 60)
+
+    def test_oversized_code_fence_is_split_on_line_boundaries(self):
+        lines = [f"x{i} = compute({i}, alpha, beta)" for i in range(40)]
+        code = "```python\n" + "\n".join(lines) + "\n```"
+        chunks = chunk_text(code + "\n", max_tokens=40, overlap_tokens=0)
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(estimate_tokens(chunk), 40)
+        # 줄 중간에서 잘리지 않고, 순서대로 이어 붙이면 원래 코드 블록이 됩니다.
+        self.assertEqual("\n".join(chunks), code)
+
+    def test_file_chunks_match_string_chunks(self):
+        text = section("가", 30) + "```\ncode line\n```\n\n" + section("나", 10)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "note.md")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+            expected = chunk_text(text, max_tokens=30, overlap_tokens=8)
+            self.assertEqual(list(iter_file_chunks(path, False, 30, 8)), expected)
+            self.assertEqual(list(iter_file_chunks(path, True, 30, 8)), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
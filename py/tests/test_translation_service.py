@@ -0,0 +1,95 @@
+# py/tests/test_translation_service.py
+
+import unittest
+
+from translation_service import TranslationService, _segment_overhead, _wrap_segment
+
+
+class FakeTranslationService(TranslationService):
+    """실제 번역 대신 reply(text) 로 응답을 만들고, 보낸 요청을 기록합니다."""
+
+    def __init__(self, reply, batch_chars: int = 4500):
+        super().__init__(concurrency=1, batch_chars=batch_chars, retries=1)
+        self.reply = reply
+        self.sent = []
+
+    def _request(self, text: str, src: str, dest: str) -> str:
+        self.sent.append(text)
+        return self.reply(text)
+
+
+def upper(text: str) -> str:
+    return text.upper()
+
+
+class TranslateBatchTest(unittest.TestCase):
+    def test_single_segment_is_sent_without_tags(self):
+        service = FakeTranslationService(upper)
+        self.assertEqual(service._translate_batch(["안녕"], "ko", "en"), ["안녕".upper()])
+        self.assertEqual(service.sent, ["안녕"])
+
+    def test_segments_are_wrapped_in_numbered_tags(self):
+        service = FakeTranslationService(upper)
+        result = service._translate_batch(["a", "b c", "d"], "ko", "en")
+        self.assertEqual(result, ["A", "B C", "D"])
+        self.assertEqual(service.sent, ["<s0>a</s0>\n<s1>b c</s1>\n<s2>d</s2>\n"])
+
+    def test_tags_mangled_by_translator_are_accepted(self):
+        # 번역기가 태그 대소문자를 바꾸고 안쪽에 공백을 넣은 경우
+        def mangle(text):
+            return text.upper().replace("<S", "< S ").replace("</S", "</ s ")
+        service = FakeTranslationService(mangle)
+        self.assertEqual(service._translate_batch(["a", "b"], "ko", "en"), ["A", "B"])
+        self.assertEqual(len(service.sent), 1)
+
+    def test_segments_in_different_order_are_matched_by_index(self):
+        service = FakeTranslationService(lambda text: "<s1>second</s1> <s0>first</s0>" if "<s0>" in text else text)
+        self.assertEqual(service._translate_batch(["one", "two"], "ko", "en"), ["first", "second"])
+
+    def test_only_missing_segment_is_requested_again(self):
+        def drop_second(text):
+            if "<s0>" in text:
+                return upper(text.replace("<s1>", "").replace("</s1>", ""))
+            return f"single:{text}"
+        service = FakeTranslationService(drop_second)
+        result = service._translate_batch(["a", "b", "c"], "ko", "en")
+        self.assertEqual(result, ["A", "single:b", "C"])
+        self.assertEqual(service.sent[1:], ["b"])
+
+    def test_duplicate_index_is_requested_again(self):
+        def duplicate(text):
+            if "<s0>" in text:
+                return "<s0>A</s0><s0>A again</s0><s1>B</s1>"
+            return f"single:{text}"
+        service = FakeTranslationService(duplicate)
+        self.assertEqual(service._translate_batch(["a", "b"], "ko", "en"), ["single:a", "B"])
+        self.assertEqual(service.sent[1:], ["a"])
+
+    def test_out_of_range_index_is_ignored(self):
+        def extra(text):
+            if "<s0>" in text:
+                return "<s0>A</s0><s1>B</s1><s7>noise</s7>"
+            return f"single:{text}"
+        service = FakeTranslationService(extra)
+        self.assertEqual(service._translate_batch(["a", "b"], "ko", "en"), ["A", "B"])
+        self.assertEqual(len(service.sent), 1)
+
+
+class MakeBatchesTest(unittest.TestCase):
+    def test_batches_count_tag_overhead(self):
+        texts = ["x" * 20] * 5
+        limit = 2 * 20 + _segment_overhead(0) + _segment_overhead(1)
+        service = FakeTranslationService(upper, batch_chars=limit)
+        batches = service._make_batches(texts)
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+        for batch in batches:
+            request = "".join(_wrap_segment(i, text) for i, text in enumerate(batch))
+            self.assertLessEqual(len(request), limit)
+
+    def test_oversized_segment_gets_its_own_batch(self):
+        service = FakeTranslationService(upper, batch_chars=10)
+        self.assertEqual(service._make_batches(["a", "y" * 50, "b"]), [["a"], ["y" * 50], ["b"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,223 @@
+# py/text_chunker.py
+
+import io
+import os
+import re
+import mmap
+
+# --- 1. 설정 ---
+# CHUNK_MAX_TOKENS    : 청크 하나의 최대 토큰 수 (추정치). 번역 후 SBERT 입력 한도(256 wordpiece) 안에 들도록 여유를 둡니다.
+# CHUNK_OVERLAP_TOKENS: 앞 청크의 마지막 문장들을 다음 청크 앞에 다시 넣는 토큰 수 (0 이면 겹치지 않음)
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "200"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "40"))
+
+# 문장 끝 후보: 마침표류 또는 한국어 종결 어미(…다/요/죠/까) 뒤의 공백.
+# 어미 글자가 한 글자 단어('모두 다 먹었다'의 '다')인 경우는 split_sentences 에서 다시 붙입니다.
+_SENTENCE_END_RE = re.compile(r"[.!?…。！？다요죠까][\"'”’)\]]?(\s+)")
+_TERMINALS = ".!?…。！？:;"
+_KOREAN_ENDINGS = "다요죠까"
+_CLOSERS = "\"'”’)]"
+
+# 문단을 끊는 줄: 코드 펜스(그룹 1), 제목(그룹 2), 목록 항목, 표의 행, 빈 줄
+_STRUCTURE_RE = re.compile(r"\s{0,3}(`{3,}|~{3,})|\s{0,3}(#{1,6})\s|\s*(?:[-*+]|\d+[.)])\s|\s*\||\s*$")
+_HEADING_RE = re.compile(r"^\s{0,3}#{1,6}\s")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    토큰 수 추정치: 단어 수(공백 수 + 1) + 한글 2글자당 1 (UTF-8 에서 3바이트인 글자마다 추가 바이트 2개를 4로 나눔).
+    실제 토크나이저 결과와 정확히 같지는 않지만, 토크나이저를 불러오지 않고 C 수준 문자열 연산만으로 셀 수 있습니다.
+    들여쓰기가 많은 코드는 조금 크게 세어지므로 청크가 한도를 넘는 쪽으로는 틀리지 않습니다.
+    """
+    return text.count(" ") + text.count("\n") + 1 + (len(text.encode("utf-8")) - len(text)) // 4
+
+
+def split_sentences(paragraph: str) -> list[str]:
+    paragraph = paragraph.strip()
+    sentences = []
+    start = 0
+    for match in _SENTENCE_END_RE.finditer(paragraph):
+        end = match.start(1)
+        ending = paragraph[match.start()]
+        if ending in _KOREAN_ENDINGS and not (match.start() > start and "가" <= paragraph[match.start() - 1] <= "힣"):
+            continue  # 한 글자 단어 '다/요/…' 뒤의 공백은 문장 끝이 아님
+        sentences.append(paragraph[start:end])
+        start = match.end()
+    if start < len(paragraph):
+        sentences.append(paragraph[start:])
+    return sentences
+
+
+def _ends_sentence(line: str) -> bool:
+    """줄 끝이 문장 끝인지 (아니면 다음 줄과 이어진 문단으로 봄)."""
+    line = line.rstrip().rstrip(_CLOSERS)
+    if not line:
+        return False
+    last = line[-1]
+    return last in _TERMINALS or (last in _KOREAN_ENDINGS and len(line) > 1 and "가" <= line[-2] <= "힣")
+
+
+def iter_blocks(lines):
+    """
+    마크다운 줄들을 (종류, 텍스트) 블록으로 묶습니다. 종류는 'heading', 'code', 'text' 입니다 (목록 항목과 표의 행은 각각 하나의 'text').
+    문단의 줄바꿈은 문장이 끝난 줄에서만 끊고, 코드 블록은 닫는 펜스까지 하나로 묶습니다.
+    """
+    paragraph = []
+    fence = None
+    code = []
+    for line in lines:
+        line = line.rstrip("\r\n").lstrip("\ufeff")
+        if fence is not None:
+            code.append(line)
+            if line.strip().startswith(fence):
+                yield "code", "\n".join(code)
+                fence, code = None, []
+            continue
+
+        stripped = line.strip()
+        match = _STRUCTURE_RE.match(line)
+        if match:
+            if paragraph:
+                yield "text", " ".join(paragraph)
+                paragraph = []
+            if match.group(1):
+                fence, code = match.group(1), [line]
+                continue
+            if match.group(2):
+                yield "heading", stripped
+                continue
+            if not stripped:
+                continue
+            # 목록 항목과 표의 행은 각각 새 단위로 시작합니다. 이어지는 줄은 아래 문단 처리로 붙습니다.
+
+        paragraph.append(stripped)
+        if _ends_sentence(stripped):
+            yield "text", " ".join(paragraph)
+            paragraph = []
+    if paragraph:
+        yield "text", " ".join(paragraph)
+    if code:  # 닫히지 않은 코드 블록
+        yield "code", "\n".join(code)
+
+
+def _split_oversized(unit: str, max_tokens: int, count_tokens, separator: str) -> list[tuple[str, int]]:
+    """max_tokens 보다 긴 단위(문장/코드 블록)를 단어 또는 줄 경계에서 잘라 (텍스트, 토큰 수) 목록으로 반환합니다."""
+    pieces, current, size = [], [], 0
+    for part in unit.split(separator):
+        tokens = count_tokens(part)
+        if current and size + tokens > max_tokens:
+            pieces.append((separator.join(current), size))
+            current, size = [], 0
+        current.append(part)
+        size += tokens
+    if current:
+        pieces.append((separator.join(current), size))
+    return pieces
+
+
+def iter_chunks(lines, max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+                count_tokens=estimate_tokens):
+    """
+    줄 단위 입력(파일 객체, 줄 리스트 등)을 읽으면서 청크를 하나씩 만들어 내는 생성기입니다.
+    문단/목록 항목/코드 블록을 max_tokens 까지 모으고, 넘치는 문단만 문장 단위로 나눠 채웁니다.
+    다음 청크는 앞 청크의 마지막 문장들(overlap_tokens 이내)로 시작합니다.
+    제목을 만나면 청크를 끊고 새 청크를 그 제목으로 시작하며, 제목 경계를 넘어서는 겹치지 않습니다.
+    """
+    units = []  # [텍스트, 토큰 수, 종류, 앞 단위와 같은 문단인지]
+    size = 0
+
+    def emit():
+        parts = []
+        for text, _, _, same_paragraph in units:
+            if parts:
+                parts.append(" " if same_paragraph else "\n")
+            parts.append(text)
+        return "".join(parts)
+
+    def sentences_of(text, same_paragraph):
+        # 문단을 문장 단위로 나눕니다 (max_tokens 보다 긴 문장은 단어 경계에서 자름).
+        result = []
+        for sentence in split_sentences(text):
+            tokens = count_tokens(sentence)
+            pieces = [(sentence, tokens)] if tokens <= max_tokens else \
+                _split_oversized(sentence, max_tokens, count_tokens, " ")
+            for piece, piece_tokens in pieces:
+                result.append([piece, piece_tokens, "sentence", bool(result) or same_paragraph])
+        return result
+
+    def overlap_tail():
+        # 제목은 겹침에 넣지 않습니다 (다음 청크도 같은 절이면 제목이 이미 앞 청크에 있음).
+        tail, tail_size = [], 0
+        for unit in reversed(units):
+            if unit[2] == "heading":
+                break
+            if tail_size + unit[1] > overlap_tokens:
+                if unit[2] == "text":  # 통째로 넣은 문단은 마지막 문장들만 겹침에 씁니다.
+                    for sentence in reversed(sentences_of(unit[0], unit[3])):
+                        if tail_size + sentence[1] > overlap_tokens:
+                            break
+                        tail.insert(0, sentence)
+                        tail_size += sentence[1]
+                break
+            tail.insert(0, unit)
+            tail_size += unit[1]
+        return tail, tail_size
+
+    def add(unit):
+        nonlocal units, size
+        if units and size + unit[1] > max_tokens:
+            yield emit()
+            units, size = overlap_tail()
+            # 겹침을 넣으면 넘치는 경우에는 겹침을 줄입니다.
+            while units and size + unit[1] > max_tokens:
+                size -= units.pop(0)[1]
+        units.append(unit)
+        size += unit[1]
+
+    for kind, block in iter_blocks(lines):
+        tokens = count_tokens(block)
+        if kind == "heading":
+            if units and any(unit[2] != "heading" for unit in units):
+                yield emit()
+                units, size = [], 0
+            units.append([block, tokens, kind, False])
+            size += tokens
+        elif size + tokens <= max_tokens:
+            # 대부분의 문단은 문장으로 나누지 않고 통째로 들어갑니다.
+            units.append([block, tokens, kind, False])
+            size += tokens
+        elif kind == "code":
+            pieces = [(block, tokens)] if tokens <= max_tokens else _split_oversized(block, max_tokens, count_tokens, "\n")
+            for piece, piece_tokens in pieces:
+                yield from add([piece, piece_tokens, kind, False])
+        else:
+            for sentence in sentences_of(block, False):
+                yield from add(sentence)
+
+    if units:
+        yield emit()
+
+
+def chunk_text(text: str, max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> list[str]:
+    if not text or not text.strip():
+        return []
+    return list(iter_chunks(io.StringIO(text), max_tokens, overlap_tokens))
+
+
+def _mmap_lines(path: str):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for raw in iter(mm.readline, b""):
+                yield raw.decode("utf-8", errors="replace")
+
+
+def iter_file_chunks(path: str, use_mmap: bool = False, max_tokens: int = CHUNK_MAX_TOKENS,
+                     overlap_tokens: int = CHUNK_OVERLAP_TOKENS):
+    """파일 전체를 메모리에 올리지 않고 청크를 만듭니다. use_mmap 이면 파일을 메모리 매핑해 줄 단위로 읽습니다."""
+    if use_mmap:
+        yield from iter_chunks(_mmap_lines(path), max_tokens, overlap_tokens)
+        return
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        yield from iter_chunks(f, max_tokens, overlap_tokens)
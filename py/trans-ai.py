@@ -1,22 +1,29 @@
 import json
 import datetime
 import time
+import threading
 import requests
 import os
 from pathlib import Path
-from googletrans import Translator, LANGUAGES # googletrans 패키지 설치 필요: pip install googletrans==4.0.0-rc1
-from requests.exceptions import RequestException
-import httpx # googletrans의 타임아웃 설정을 위해 필요할 수 있음
+from googletrans import LANGUAGES # googletrans 패키지 설치 필요: pip install googletrans==4.0.0-rc1 (번역 요청은 translation_service 가 담당)
 import traceback # 상세 오류 로깅용
 import re # 점수 추출 등 필요
 
 # --- RAG 관련 라이브러리 ---
 # pip install sentence-transformers chromadb
-from sentence_transformers import SentenceTransformer
+import numpy as np
 import chromadb
+from content_store import get_content_store
+from translation_service import get_translation_service, TRANSLATE_RETRIES
+from staged_pipeline import Stage, run_pipeline
+from sbert_encoder import get_sbert_encoder
+from index_manifest import IndexManifest, ManifestEntry
+from text_chunker import chunk_text
+from ollama_client import get_ollama_client, OllamaError
+from kv_cache import content_hash
 
 # --- 상수 정의 ---
-OLLAMA_API_URL = "http://localhost:11434/api/generate"
+OLLAMA_API_URL = os.getenv("OLLAMA_API_URL", "http://localhost:11434/api/generate")  # mock_llm_server.py 로 바꿔 부하 테스트 가능
 DEFAULT_OLLAMA_MODEL = "llama3.1:8b"
 
 # 경로 설정 (스크립트 위치 기준 상대 경로 또는 필요시 절대 경로 사용)
@@ -24,13 +31,13 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__)) # 스크립트가 있는 
 DOC_DIR = os.path.join(BASE_DIR, "Doc")      # 문서 디렉토리
 LOG_DIR = os.path.join(BASE_DIR, "log")      # 로그 디렉토리
 CHROMA_DB_PATH = os.path.join(BASE_DIR, "chroma_db_st_google") # ChromaDB 저장 경로
+CONTENT_STORE_PATH = os.path.join(CHROMA_DB_PATH, "content_store") # 청크 본문(한국어/영어) 저장 경로
 LOG_FILENAME = os.path.join(LOG_DIR, "interaction_log_st_google.jsonl")
 
 # --- SentenceTransformer 모델 설정 ---
 # 영어 임베딩에 적합한 모델 선택 (Hugging Face 모델 허브에서 확인 가능)
 # 예: 'all-MiniLM-L6-v2', 'all-mpnet-base-v2' 등
 SBERT_MODEL_NAME = 'all-MiniLM-L6-v2'
-SBERT_MODEL = None # 전역 변수로 모델 관리
 
 # --- ChromaDB 클라이언트 및 컬렉션 설정 ---
 CHROMA_CLIENT = None
@@ -39,18 +46,13 @@ CHROMA_COLLECTION = None
 
 # --- 유틸리티 함수: SentenceTransformer 모델 로더 ---
 def get_sbert_model():
-    global SBERT_MODEL
-    if SBERT_MODEL is None:
-        try:
-            SBERT_MODEL = SentenceTransformer(SBERT_MODEL_NAME)
-            print(f"SentenceTransformer 모델 '{SBERT_MODEL_NAME}' 로드 완료.")
-        except Exception as e:
-            print(f"[치명적 오류] SentenceTransformer 모델 '{SBERT_MODEL_NAME}' 로드 실패: {e}")
-            # 프로그램 지속이 어려우므로 예외 발생 또는 종료 처리 필요
-            raise SystemExit(f"SBERT 모델 로드 실패: {e}")
-    return SBERT_MODEL
+    try:
+        return get_sbert_encoder(SBERT_MODEL_NAME).model # 배치 인코더(sbert_encoder)가 모델을 한 번만 로드
+    except Exception as e:
+        print(f"[치명적 오류] SentenceTransformer 모델 '{SBERT_MODEL_NAME}' 로드 실패: {e}")
+        # 프로그램 지속이 어려우므로 예외 발생 또는 종료 처리 필요
+        raise SystemExit(f"SBERT 모델 로드 실패: {e}")
 
-# --- 유틸리티 함수: ChromaDB 초기화 ---
 def initialize_chromadb():
     global CHROMA_CLIENT, CHROMA_COLLECTION
     if CHROMA_CLIENT is None:
@@ -73,113 +75,97 @@ def initialize_chromadb():
             raise SystemExit(f"ChromaDB 컬렉션 가져오기/생성 실패: {e}")
     return CHROMA_COLLECTION
 
-# --- 번역 함수 (기존 코드와 거의 동일, 약간의 디버그 메시지 수정 가능) ---
-def detect_language(text):
-    if not text or not isinstance(text, str) or not text.strip():
-        return None
-    try:
-        translator = Translator()
-        detected = translator.detect(text)
-        return detected.lang
-    except Exception as e:
-        print(f"[Warning] 언어 감지 실패: {e} (텍스트: '{text[:30]}...')")
-        return None
-
-def translate_text(text, src_lang, dest_lang, retries=3, delay=1):
+# --- 번역 함수 (translation_service 로 위임) ---
+def translate_text(text, src_lang, dest_lang):
+    """
+    단일 텍스트 번역. 번역 서비스(translation_service)를 거치므로 클라이언트 재사용과 영구 캐시가 적용됩니다.
+    'auto' 소스는 별도 언어 감지 요청 없이 번역 요청에서 함께 감지합니다. 실패 시 "Error: ..." 문자열을 반환합니다.
+    """
     if not text or not isinstance(text, str) or not text.strip():
         return "" # 빈 문자열 반환 일관성 유지
 
-    source_language = src_lang
-    if source_language is None or str(source_language).lower() == 'auto':
-        detected_src = detect_language(text)
-        if detected_src and detected_src in LANGUAGES:
-            source_language = detected_src
-        else:
-            # 기본 추정: 한국어->영어 또는 영어->한국어
-            source_language = 'ko' if dest_lang == 'en' else 'en'
-            print(f"[Warning] 언어 감지 실패/미지원 ('{detected_src}'). 소스 언어 '{source_language}' (목표: '{dest_lang}')로 가정.")
-
     if dest_lang not in LANGUAGES:
         error_msg = f"Error: 유효하지 않은 목적 언어 코드: {dest_lang}"
         print(f"[Error] {error_msg}")
         return error_msg
 
+    source_language = 'auto' if src_lang is None else str(src_lang).lower()
     if source_language == dest_lang:
         return text
 
-    translator = Translator()
-    for attempt in range(retries):
-        try:
-            # translator = Translator(timeout=httpx.Timeout(10.0)) # 필요시 타임아웃
-            translation = translator.translate(text, src=source_language, dest=dest_lang)
-            if translation and hasattr(translation, 'text') and translation.text is not None:
-                return translation.text
-            else:
-                error_msg = f"번역 결과가 예상과 다릅니다 (시도 {attempt+1}/{retries}). 입력: '{text[:50]}...', 결과: {translation}"
-                print(f"[Warning] {error_msg}")
-        except (RequestException, httpx.RequestError) as e:
-            error_msg = f"번역 중 네트워크 오류 (시도 {attempt+1}/{retries}): {type(e).__name__} - {e}"
-            print(f"[Warning] {error_msg}")
-        except AttributeError as e: # 가끔 googletrans 내부에서 발생
-             error_msg = f"번역 처리 중 속성 오류 (시도 {attempt+1}/{retries}): {e}"
-             print(f"[Warning] {error_msg}")
-        except Exception as e:
-            error_msg = f"번역 중 예상치 못한 오류 (시도 {attempt+1}/{retries}): {type(e).__name__} - {e}"
-            print(f"[Warning] {error_msg}")
-            # traceback.print_exc() # 상세 디버깅 필요 시
-
-        if attempt < retries - 1:
-            current_delay = delay * (2 ** attempt) # Exponential backoff
-            print(f"{current_delay}초 후 번역 재시도...")
-            time.sleep(current_delay)
-        else:
-            final_error = f"Error: {retries}번 시도 후 번역 실패. 입력: '{text[:50]}...'"
-            print(f"[Error] {final_error}")
-            return final_error
-    return f"Error: 번역 루프 후 예기치 않게 실패. 입력: '{text[:50]}...'"
+    translated = get_translation_service().translate_many([text], source_language, dest_lang)[0]
+    if translated is None:
+        final_error = f"Error: {TRANSLATE_RETRIES}번 시도 후 번역 실패. 입력: '{text[:50]}...'"
+        print(f"[Error] {final_error}")
+        return final_error
+    return translated
 
 
 # --- 임베딩 생성 함수 (SentenceTransformer 사용) ---
 def get_embedding_for_text_en(text_en):
-    """영문 텍스트에 대한 SentenceTransformer 임베딩 벡터를 반환."""
+    """영문 텍스트(검색어)에 대한 SentenceTransformer 임베딩 벡터를 반환. 배치/풀 없이 단일 호출로 처리합니다."""
     if not text_en or not isinstance(text_en, str) or not text_en.strip():
         # print("[Warning] 임베딩을 위한 영어 텍스트가 비어있거나 유효하지 않습니다.")
         return None
     try:
-        sbert_model = get_sbert_model() # 모델 로더 호출
-        # 모델이 GPU를 사용하도록 설정되어 있다면 자동으로 활용됨
-        embedding = sbert_model.encode(text_en, convert_to_tensor=False) # numpy array
-        return embedding.tolist() # ChromaDB 저장을 위해 리스트로 변환
+        get_sbert_model() # 모델 로더 호출
+        return get_sbert_encoder(SBERT_MODEL_NAME).encode_query(text_en).tolist() # 검색 쿼리용 리스트
     except Exception as e:
         print(f"[오류] SentenceTransformer 임베딩 생성 중 오류 ('{text_en[:50]}...'): {e}")
         # traceback.print_exc()
         return None
 
 
-# --- Ollama 쿼리 함수 (기존과 동일) ---
-def query_ollama(prompt, model=DEFAULT_OLLAMA_MODEL, url=OLLAMA_API_URL, timeout=180):
-    headers = {"Content-Type": "application/json"}
-    data = {"prompt": prompt, "model": model, "stream": False}
-    try:
-        response = requests.post(url, headers=headers, data=json.dumps(data), timeout=timeout)
-        response.raise_for_status()
+def get_embeddings_for_texts_en(texts_en):
+    """
+    영문 텍스트 여러 개를 길이순 배치로 임베딩합니다 (인덱싱용, SBERT_PROCESSES 로 다중 프로세스 선택).
+    반환값은 (len(texts_en), dim) float32 numpy 배열입니다.
+    """
+    return get_sbert_encoder(SBERT_MODEL_NAME).encode_batch(texts_en)
+
+
+_CHROMA_ACCEPTS_NUMPY = True
+
+
+def upsert_embeddings_to_collection(collection, embeddings, metadatas, ids):
+    """
+    float32 배열을 그대로 ChromaDB에 upsert 합니다 (같은 ID의 바뀐 청크는 덮어씀).
+    numpy 배열을 받지 않는 chromadb 버전이면 이 경계에서 한 번만 리스트로 바꿉니다.
+    """
+    global _CHROMA_ACCEPTS_NUMPY
+    if _CHROMA_ACCEPTS_NUMPY:
         try:
-            json_data = response.json()
-        except json.JSONDecodeError as e:
-            error_msg = f"Error: Ollama JSON 응답 디코딩 오류: {e}. 상태: {response.status_code}. 응답 텍스트: '{response.text[:100]}...'"
-            print(f"[Error] {error_msg}")
-            return error_msg
-        
-        if "response" in json_data and json_data["response"] is not None:
-            return json_data["response"].strip()
-        elif "error" in json_data:
-            error_msg = f"Error: Ollama API가 오류를 반환했습니다: {json_data['error']}"
-            print(f"[Error] {error_msg}")
-            return error_msg
-        else:
-            error_msg = f"Error: 예상치 못한 Ollama 응답 형식 또는 null 응답. 수신: {str(json_data)[:200]}..."
-            print(f"[Error] {error_msg}")
-            return error_msg
+            collection.upsert(embeddings=embeddings, metadatas=metadatas, ids=ids)
+            return
+        except ValueError as e:
+            if "list" not in str(e).lower():
+                raise
+            _CHROMA_ACCEPTS_NUMPY = False
+    collection.upsert(embeddings=embeddings.tolist(), metadatas=metadatas, ids=ids)
+
+
+# --- Ollama 쿼리 함수 ---
+# 연결 풀/스트리밍/keep_alive 는 ollama_client 가 담당합니다 (OLLAMA_KEEP_ALIVE, OLLAMA_OPTIONS 환경변수로 조정).
+def query_ollama(prompt, model=DEFAULT_OLLAMA_MODEL, url=OLLAMA_API_URL, timeout=180, on_token=None):
+    """
+    프롬프트를 Ollama에 보내 전체 응답 문자열을 반환합니다. 실패하면 "Error: ..." 문자열을 반환합니다.
+    timeout 은 토큰 사이 최대 대기 시간(초)이며, on_token 을 주면 생성된 조각을 도착하는 대로 넘깁니다.
+    """
+    try:
+        pieces = []
+        for token in get_ollama_client(url).stream(prompt, model, timeout=timeout):
+            pieces.append(token)
+            if on_token:
+                on_token(token)
+        return "".join(pieces).strip()
+    except OllamaError as e:
+        error_msg = f"Error: Ollama API가 오류를 반환했습니다: {e}"
+        print(f"[Error] {error_msg}")
+        return error_msg
+    except json.JSONDecodeError as e:
+        error_msg = f"Error: Ollama JSON 응답 디코딩 오류: {e}"
+        print(f"[Error] {error_msg}")
+        return error_msg
     except requests.exceptions.Timeout:
         error_msg = f"Error: Ollama 요청 시간 초과 ({timeout}초)."
         print(f"[Error] {error_msg}")
@@ -458,160 +444,261 @@ def read_document_content(filepath):
         print(f"[오류] 파일 읽기 오류 ({filepath}): {e}")
         return None
 
-# --- [수정됨] 문서 청킹 함수 ---
-def chunk_text_by_sentences(text, sentences_per_chunk=5):
-    """텍스트를 문장 단위로 청킹하는 간단한 함수 (nltk 필요 없음)"""
-    if not text or not isinstance(text, str) or not text.strip():
-        return []
-    
-    # 문장 구분자로 '.', '!', '?', '\n' 등을 고려할 수 있음
-    # 좀 더 정교한 문장 분리는 nltk.sent_tokenize 등을 사용할 수 있지만, 여기서는 간단히 구현
-    delimiters = ".!?\n" # 문장 구분자
-    sentences = []
-    current_sentence = ""
-    for char in text:
-        current_sentence += char
-        if char in delimiters:
-            if current_sentence.strip():
-                sentences.append(current_sentence.strip())
-            current_sentence = ""
-    if current_sentence.strip(): # 마지막 문장 처리
-        sentences.append(current_sentence.strip())
-
-    if not sentences:
-        return [text] # 문장 분리 안되면 원본 텍스트를 단일 청크로
-
-    chunks = []
-    current_chunk_sentences = []
-    for i, sentence in enumerate(sentences):
-        current_chunk_sentences.append(sentence)
-        if (i + 1) % sentences_per_chunk == 0 or (i + 1) == len(sentences):
-            chunks.append(" ".join(current_chunk_sentences))
-            current_chunk_sentences = []
-    return chunks
-
 # --- [수정됨] 문서 인덱싱 함수 (SentenceTransformer + ChromaDB) ---
+# --- 인덱싱 파이프라인 설정 ---
+# 읽기 → 청킹/색인 기록 비교 → 번역(스레드 풀) → 임베딩(큰 배치) → DB upsert(배치) 단계를 크기 제한 대기열로 연결합니다.
+INDEX_READ_WORKERS = int(os.getenv("INDEX_READ_WORKERS", "4"))
+INDEX_TRANSLATE_WORKERS = int(os.getenv("INDEX_TRANSLATE_WORKERS", "4"))    # 동시에 번역하는 파일 수
+INDEX_EMBED_BATCH = int(os.getenv("INDEX_EMBED_BATCH", "256"))              # 한 번에 임베딩하는 청크 수
+INDEX_ADD_BATCH = int(os.getenv("INDEX_ADD_BATCH", "512"))                  # 한 번에 DB에 추가하는 청크 수
+
+
+def chunk_ids_for(filepath_str, count):
+    return [f"{filepath_str}_chunk_{chunk_idx}" for chunk_idx in range(count)]
+
+
 def index_documents(doc_dir):
     """
     '/Doc' 디렉토리의 .md 파일을 청킹하고, 각 청크를 영어로 번역 후
     SentenceTransformer로 임베딩하여 ChromaDB에 저장합니다.
+    색인 기록(index_manifest)과 비교해 새로 생기거나 바뀐 파일의 바뀐 청크만 처리하고,
+    삭제되거나 짧아진 파일의 남는 청크는 DB에서 지웁니다.
+    처리는 단계별 파이프라인으로 겹쳐 실행하며, 단계마다 처리량을 출력합니다.
     """
     print(f"\n--- '{doc_dir}' 내 .md 파일 벡터 인덱싱 시작 (SentenceTransformer, ChromaDB) ---")
+    started = time.perf_counter()
     doc_paths = get_document_paths(doc_dir)
-    if not doc_paths:
-        print("인덱싱할 .md 파일이 없습니다.")
-        return
 
     collection = initialize_chromadb() # 컬렉션 가져오기/생성
     if not collection:
         print("[오류] ChromaDB 컬렉션을 초기화할 수 없어 인덱싱을 중단합니다.")
         return
 
-    # (선택적) 기존 로그에서 이미 처리된 파일 경로 로드 (중복 방지용 - ChromaDB ID로도 가능)
-    # 여기서는 ChromaDB ID를 기준으로 중복을 피하도록 구현
-    
-    total_files = len(doc_paths)
-    indexed_file_count = 0
-    skipped_file_count = 0
-    error_file_count = 0
-    total_chunks_processed = 0
-
-    for file_idx, filepath in enumerate(doc_paths, 1):
-        filepath_str = str(filepath)
-        print(f"\n  ({file_idx}/{total_files}) 파일 처리 중: {filepath.name}")
-
-        # 파일 내용 읽기
-        content_ko = read_document_content(filepath)
-        if content_ko is None or not content_ko.strip():
-            print(f"    - 내용을 읽을 수 없거나 비어있어 건너<0xEB><0x84>니다.")
-            error_file_count += 1
-            continue
-
-        # 1. 내용 청킹 (한국어 기준)
-        # 예시: 문장 5개씩 청킹 (청킹 전략은 내용에 따라 조절 필요)
-        text_chunks_ko = chunk_text_by_sentences(content_ko, sentences_per_chunk=7)
-        if not text_chunks_ko:
-            print(f"    - 텍스트 청킹 결과가 없어 건너<0xEB><0x84>니다.")
-            error_file_count += 1
-            continue
-        
-        print(f"    - 원본 한국어 문서 청크 수: {len(text_chunks_ko)}")
-
-        # 각 청크에 대한 정보 저장 리스트
-        chunk_embeddings = []
-        chunk_metadatas = []
-        chunk_ids = []
-        processed_chunks_for_this_file = 0
-
-        for chunk_idx, chunk_ko in enumerate(text_chunks_ko):
-            chunk_id_str = f"{filepath_str}_chunk_{chunk_idx}"
-
-            # ChromaDB에서 해당 ID가 이미 있는지 확인하여 중복 방지
-            # get()은 ID가 없으면 빈 리스트를 반환하므로 results['ids'] 등으로 확인
-            existing_entry = collection.get(ids=[chunk_id_str])
-            if existing_entry and existing_entry['ids'] and chunk_id_str in existing_entry['ids']:
-                # print(f"      - 청크 ID '{chunk_id_str}'는 이미 DB에 존재하여 건너<0xEB><0x84>니다.")
-                skipped_file_count += (1 if chunk_idx == 0 else 0) # 파일 단위로 스킵 카운트 (대략적)
-                continue
+    manifest = IndexManifest(CHROMA_DB_PATH)
+    plan = manifest.plan(doc_paths)
+
+    # 디렉터리에서 사라진 파일의 청크 삭제
+    if plan.removed:
+        collection.delete(ids=[chunk_id for entry in plan.removed
+                               for chunk_id in chunk_ids_for(entry.path, len(entry.chunk_hashes))])
+        manifest.remove_many([entry.path for entry in plan.removed])
+        print(f"  삭제된 파일 {len(plan.removed)}개의 청크를 DB에서 제거했습니다.")
 
-            # 2. 한국어 청크 -> 영어로 번역
-            # print(f"      - 청크 {chunk_idx + 1} 번역 중...")
-            chunk_en = translate_text(chunk_ko, 'ko', 'en')
-            if chunk_en.startswith("Error:") or not chunk_en.strip() :
-                print(f"      - 청크 {chunk_idx + 1} 번역 실패: {chunk_en}. 이 청크는 건너<0xEB><0x84>니다.")
+    print(f"  총 파일 {len(doc_paths)}개 중 변경 확인 대상 {len(plan.changed)}개 (변경 없음 {plan.unchanged}개)")
+    if not plan.changed:
+        print(f"--- 벡터 인덱싱 완료: 변경된 파일 없음 ({time.perf_counter() - started:.1f}초) ---")
+        return
+
+    get_sbert_model() # 임베딩 단계가 시작되기 전에 모델을 미리 로드
+
+    counts_lock = threading.Lock()
+    counts = {"error_files": 0, "same_content_files": 0, "failed_chunks": 0, "deleted_chunks": 0}
+    file_states = {}  # 경로 -> 기록할 ManifestEntry 와 이번에 저장해야 하는 청크 순번
+
+    def count(key, amount=1):
+        with counts_lock:
+            counts[key] += amount
+
+    # 1. 파일 읽기 + 청킹 + 이전 기록과 청크 해시 비교 (바뀐 청크만 다음 단계로)
+    def read_and_diff(items):
+        jobs = []
+        for filepath_str, stat, previous in items:
+            filename = os.path.basename(filepath_str)
+            content_ko = read_document_content(filepath_str)
+            if content_ko is None or not content_ko.strip():
+                print(f"    - '{filename}': 내용을 읽을 수 없거나 비어있어 건너뜁니다.")
+                count("error_files")
+                # 이전 내용의 청크가 검색에 계속 나오지 않도록 지웁니다.
+                if previous is None:
+                    collection.delete(where={"source_filepath": filepath_str})
+                else:
+                    stale = chunk_ids_for(filepath_str, len(previous.chunk_hashes))
+                    if stale:
+                        collection.delete(ids=stale)
+                        count("deleted_chunks", len(stale))
+                # 청크가 없는 기록(tombstone)을 남겨, 다시 바뀌기 전까지는 다른 파일처럼 stat 만으로 건너뜁니다.
+                with counts_lock:
+                    file_states[filepath_str] = {
+                        "entry": manifest_entry_for(filepath_str, stat, content_hash(content_ko or ""), []),
+                        "pending": set(),
+                    }
                 continue
-            
-            # 3. 번역된 영어 청크 -> 임베딩 생성
-            # print(f"      - 청크 {chunk_idx + 1} 임베딩 중...")
-            embedding = get_embedding_for_text_en(chunk_en)
-            if embedding is None:
-                print(f"      - 청크 {chunk_idx + 1} 임베딩 생성 실패. 이 청크는 건너<0xEB><0x84>니다.")
+            file_hash = content_hash(content_ko)
+            if previous and previous.complete and previous.content_hash == file_hash:
+                # 수정 시각만 바뀐 파일: 기록만 갱신
+                count("same_content_files")
+                entry = manifest_entry_for(filepath_str, stat, file_hash, previous.chunk_hashes)
+                with counts_lock:
+                    file_states[filepath_str] = {"entry": entry, "pending": set()}
                 continue
 
-            chunk_embeddings.append(embedding)
-            chunk_metadatas.append({
-                "source_filepath": filepath_str, # 전체 파일 경로
-                "filename": filepath.name,       # 파일명
-                "chunk_id_in_doc": chunk_idx,    # 문서 내 청크 순번
-                "original_text_ko": chunk_ko,    # 원본 한국어 청크
-                "translated_text_en": chunk_en   # 번역된 영어 청크 (임베딩 대상)
-            })
-            chunk_ids.append(chunk_id_str) # ChromaDB용 고유 ID
-            processed_chunks_for_this_file += 1
-            total_chunks_processed +=1
-
-            # (선택적) 일정 개수마다 ChromaDB에 add (메모리 관리)
-            if len(chunk_ids) >= 50: # 예: 50개 청크마다 DB에 저장
-                try:
-                    collection.add(embeddings=chunk_embeddings, metadatas=chunk_metadatas, ids=chunk_ids)
-                    print(f"      - {len(chunk_ids)}개 청크 묶음 DB에 추가 완료.")
-                    chunk_embeddings, chunk_metadatas, chunk_ids = [], [], [] # 리스트 초기화
-                except Exception as db_e:
-                    print(f"      - 다수 청크 DB 추가 중 오류: {db_e}")
-                    # 오류 발생 시 해당 묶음은 실패 처리. 필요시 개별 재시도 로직 추가 가능
-
-        # 파일 내 남은 청크들 저장
-        if chunk_ids:
-            try:
-                collection.add(embeddings=chunk_embeddings, metadatas=chunk_metadatas, ids=chunk_ids)
-                print(f"      - 남은 {len(chunk_ids)}개 청크 DB에 추가 완료.")
-            except Exception as db_e:
-                print(f"      - 파일 마지막 청크 DB 추가 중 오류: {db_e}")
-        
-        if processed_chunks_for_this_file > 0:
-            indexed_file_count +=1
-            print(f"    - 파일 '{filepath.name}'에서 {processed_chunks_for_this_file}개 청크 처리 완료.")
-        elif not any(collection.get(ids=[f"{filepath_str}_chunk_{i}"])['ids'] for i in range(len(text_chunks_ko))): # 스킵도 아니고 처리된 것도 없으면 오류로 간주
-            error_file_count +=1
-            print(f"    - 파일 '{filepath.name}' 처리 중 유효한 청크를 DB에 저장하지 못했습니다.")
+            text_chunks_ko = chunk_text(content_ko) # 토큰 수 기준 청크 (CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS)
+            chunk_hashes = [content_hash(chunk_ko) for chunk_ko in text_chunks_ko]
+            ids = chunk_ids_for(filepath_str, len(text_chunks_ko))
+            if previous is None:
+                # 기록이 없는 파일(이전 버전에서 색인된 파일 포함)은 남아 있을 수 있는 청크를 먼저 지웁니다.
+                collection.delete(where={"source_filepath": filepath_str})
+                old_hashes = []
+            else:
+                old_hashes = previous.chunk_hashes
+                stale = chunk_ids_for(filepath_str, len(old_hashes))[len(text_chunks_ko):]
+                if stale:
+                    collection.delete(ids=stale)
+                    count("deleted_chunks", len(stale))
+
+            changed = [chunk_idx for chunk_idx, digest in enumerate(chunk_hashes)
+                       if chunk_idx >= len(old_hashes) or old_hashes[chunk_idx] != digest]
+            with counts_lock:
+                file_states[filepath_str] = {
+                    "entry": manifest_entry_for(filepath_str, stat, file_hash, chunk_hashes),
+                    "pending": set(changed),
+                }
+            if changed:
+                jobs.append({
+                    "filepath": filepath_str,
+                    "filename": filename,
+                    "chunks": [(ids[chunk_idx], chunk_idx, text_chunks_ko[chunk_idx]) for chunk_idx in changed],
+                })
+        return jobs
+
+    # 2. 파일의 바뀐 청크를 묶어서 번역 (캐시된 청크는 요청하지 않음), 청크 단위로 다음 단계에 전달
+    def translate(jobs):
+        translated = []
+        for job in jobs:
+            translations = get_translation_service().translate_many([chunk_ko for _, _, chunk_ko in job["chunks"]], 'ko', 'en')
+            for (chunk_id, chunk_idx, chunk_ko), chunk_en in zip(job["chunks"], translations):
+                if not chunk_en or not chunk_en.strip():
+                    print(f"      - '{job['filename']}' 청크 {chunk_idx + 1} 번역 실패. 이 청크는 건너뜁니다.")
+                    count("failed_chunks")
+                    continue
+                translated.append({"id": chunk_id, "filepath": job["filepath"], "filename": job["filename"],
+                                   "chunk_idx": chunk_idx, "ko": chunk_ko, "en": chunk_en})
+        return translated
+
+    # 3. 번역된 영어 청크를 큰 배치로 임베딩
+    def embed(chunks):
+        embeddings = get_embeddings_for_texts_en([chunk["en"] for chunk in chunks]) # float32 (n, dim)
+        return [{**chunk, "embedding": embeddings[i]} for i, chunk in enumerate(chunks)]
+
+    # 4. ChromaDB에 배치로 upsert (본문은 내용 저장소로)
+    def add(chunks):
+        metadatas = [{
+            "source_filepath": chunk["filepath"],  # 전체 파일 경로
+            "filename": chunk["filename"],         # 파일명
+            "chunk_id_in_doc": chunk["chunk_idx"], # 문서 내 청크 순번
+            "original_text_ko": chunk["ko"],       # 원본 한국어 청크 (저장 직전 내용 저장소로 옮김)
+            "translated_text_en": chunk["en"],     # 번역된 영어 청크 (임베딩 대상, 저장 직전 내용 저장소로 옮김)
+        } for chunk in chunks]
+        upsert_embeddings_to_collection(collection, np.stack([chunk["embedding"] for chunk in chunks]),
+                                     externalize_chunk_texts(metadatas), [chunk["id"] for chunk in chunks])
+        return [(chunk["filepath"], chunk["chunk_idx"]) for chunk in chunks]
+
+    stored = run_pipeline(plan.changed, [
+        Stage("read", read_and_diff, workers=INDEX_READ_WORKERS),
+        Stage("translate", translate, workers=INDEX_TRANSLATE_WORKERS),
+        Stage("embed", embed, batch_size=INDEX_EMBED_BATCH, batch_wait=1.0),
+        Stage("upsert", add, batch_size=INDEX_ADD_BATCH, batch_wait=1.0),
+    ], label="벡터 인덱싱")
+
+    # 저장되지 못한 청크는 해시를 None 으로 기록해 다음 실행에서 다시 시도합니다.
+    for filepath_str, chunk_idx in stored:
+        file_states[filepath_str]["pending"].discard(chunk_idx)
+    entries = []
+    for state in file_states.values():
+        entry = state["entry"]
+        entry.chunk_hashes = [None if chunk_idx in state["pending"] else digest
+                              for chunk_idx, digest in enumerate(entry.chunk_hashes)]
+        entries.append(entry)
+    manifest.record_many(entries)
+
+    print(f"\n--- 벡터 인덱싱 완료 ({time.perf_counter() - started:.1f}초) ---")
+    print(f"  총 파일 수: {len(doc_paths)} (변경 없음 {plan.unchanged}, 내용 동일 {counts['same_content_files']}, 삭제 {len(plan.removed)})")
+    print(f"  새 청크가 인덱싱된 파일 수: {len({filepath_str for filepath_str, _ in stored})}")
+    print(f"  오류 발생 파일 수: {counts['error_files']} (번역 실패 청크: {counts['failed_chunks']})")
+    print(f"  DB의 총 청크 수: {collection.count()} (이번 실행에서 저장: {len(stored)}, 삭제: {counts['deleted_chunks']})")
+    translation_stats = get_translation_service().stats()
+    print(f"  번역 요청 수: {translation_stats['requests']} (캐시 적중 구간: {translation_stats['cache_hits']})")
+
+
+def manifest_entry_for(filepath_str, stat, file_hash, chunk_hashes):
+    return ManifestEntry(filepath_str, stat.st_mtime_ns, stat.st_size, file_hash, list(chunk_hashes))
+
+
+WATCH_POLL_SECONDS = float(os.getenv("INDEX_WATCH_POLL_SECONDS", "5"))
+WATCH_DEBOUNCE_SECONDS = 1.0
+
+
+def watch_documents(doc_dir):
+    """
+    문서 디렉터리를 감시하다가 .md 파일이 바뀌면 증분 인덱싱을 실행합니다 (Ctrl+C 로 종료).
+    watchdog 패키지가 있으면 파일 시스템 이벤트를, 없으면 주기적 확인(색인 기록 비교, 변경 없으면 stat 만)을 사용합니다.
+    """
+    changed = threading.Event()
+    observer = None
+    try:
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+
+        class _Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                paths = [getattr(event, "src_path", ""), getattr(event, "dest_path", "")]
+                if any(str(path).endswith(".md") for path in paths):
+                    changed.set()
+
+        observer = Observer()
+        observer.schedule(_Handler(), doc_dir, recursive=True)
+        observer.start()
+        print(f"[정보] '{doc_dir}' 감시 시작 (파일 시스템 이벤트). Ctrl+C 로 종료합니다.")
+    except ImportError:
+        print(f"[정보] '{doc_dir}' 감시 시작 ({WATCH_POLL_SECONDS:.0f}초마다 확인, watchdog 미설치). Ctrl+C 로 종료합니다.")
+
+    index_documents(doc_dir)
+    try:
+        while True:
+            if observer is not None:
+                changed.wait()
+                time.sleep(WATCH_DEBOUNCE_SECONDS)  # 저장 중 연달아 오는 이벤트를 한 번으로 묶음
+                changed.clear()
+            else:
+                time.sleep(WATCH_POLL_SECONDS)
+                plan = IndexManifest(CHROMA_DB_PATH).plan(get_document_paths(doc_dir))
+                if not plan.changed and not plan.removed:
+                    continue
+            index_documents(doc_dir)
+    except KeyboardInterrupt:
+        print("\n[정보] 문서 감시를 종료합니다.")
+    finally:
+        if observer is not None:
+            observer.stop()
+            observer.join()
 
 
-    print(f"\n--- 벡터 인덱싱 완료 ---")
-    print(f"  처리 시도한 총 파일 수: {total_files}")
-    print(f"  성공적으로 일부라도 인덱싱된 파일 수: {indexed_file_count}")
-    print(f"  건너뛴 파일 수 (일부 청크라도 이미 존재 시): {skipped_file_count}") # 이 카운트는 정확하지 않을 수 있음
-    print(f"  오류 발생 파일 수: {error_file_count}")
-    print(f"  DB에 추가/확인된 총 청크 수 (대략): {collection.count()} (이번 실행에서 처리: {total_chunks_processed})")
+def externalize_chunk_texts(metadatas):
+    """
+    청크 메타데이터의 본문(한국어/영어)을 내용 저장소로 옮기고 해시만 남깁니다.
+    ChromaDB 메타데이터가 작아져 검색 시 상위 결과의 본문만 따로 읽게 됩니다.
+    """
+    store = get_content_store(CONTENT_STORE_PATH)
+    ko_hashes = store.put_many([meta["original_text_ko"] for meta in metadatas])
+    en_hashes = store.put_many([meta["translated_text_en"] for meta in metadatas])
+    stored = []
+    for meta, ko_hash, en_hash in zip(metadatas, ko_hashes, en_hashes):
+        meta = {key: value for key, value in meta.items() if key not in ("original_text_ko", "translated_text_en")}
+        meta["original_hash"] = ko_hash
+        meta["translated_hash"] = en_hash
+        stored.append(meta)
+    return stored
+
+
+def load_chunk_texts(metadatas):
+    """검색된 청크들의 (한국어, 영어) 본문을 내용 저장소에서 한 번에 읽습니다. 이전 형식(메타데이터에 본문 저장)도 지원합니다."""
+    store = get_content_store(CONTENT_STORE_PATH)
+    texts = store.get_many([meta.get(key) for meta in metadatas for key in ("original_hash", "translated_hash")])
+    return [
+        (texts.get(meta.get("original_hash")) or meta.get('original_text_ko', ''),
+         texts.get(meta.get("translated_hash")) or meta.get('translated_text_en', ''))
+        for meta in metadatas
+    ]
 
 
 # --- [수정됨] 벡터 기반 관련 문서 검색 함수 (SentenceTransformer + ChromaDB) ---
@@ -649,7 +736,7 @@ def find_related_documents_by_vector_similarity(query_ko, top_n=3):
         results = collection.query(
             query_embeddings=[query_embedding], # 리스트 형태로 전달
             n_results=top_n,
-            include=["metadatas", "documents", "distances"] # documents는 저장된 원본 청크 (여기서는 translated_text_en)
+            include=["metadatas", "distances"] # 본문은 메타데이터의 해시로 내용 저장소에서 읽음
         )
     except Exception as e:
         print(f"[오류] 벡터 DB 검색 중 오류 발생: {e}")
@@ -663,17 +750,15 @@ def find_related_documents_by_vector_similarity(query_ko, top_n=3):
     retrieved_contexts = []
     ids = results.get('ids')[0]
     metadatas = results.get('metadatas')[0]
-    # 'documents'는 ChromaDB에 저장 시 'documents' 파라미터로 전달한 텍스트 리스트를 의미.
-    # 우리는 메타데이터에 'translated_text_en'와 'original_text_ko'를 저장했으므로 이를 활용.
-    # documents_retrieved = results.get('documents')[0] if results.get('documents') else [None] * len(ids)
+    # 본문은 메타데이터에 해시('original_hash', 'translated_hash')로만 있으므로 상위 결과의 본문만 읽어 옵니다.
+    chunk_texts = load_chunk_texts(metadatas)
     distances = results.get('distances')[0]
 
     print(f"상위 {len(ids)}개 관련 문서 청크 정보 (벡터 유사도 기준):")
     for i in range(len(ids)):
         meta = metadatas[i]
         filename = meta.get('filename', 'N/A')
-        # original_ko_chunk = meta.get('original_text_ko', '') # 원본 한국어 청크
-        translated_en_chunk = meta.get('translated_text_en', '') # 번역된 영어 청크 (컨텍스트로 사용)
+        original_ko_chunk, translated_en_chunk = chunk_texts[i] # 번역된 영어 청크는 컨텍스트로 사용
         distance = distances[i]
 
         print(f"  - {filename} (Distance: {distance:.4f})")
@@ -684,7 +769,7 @@ def find_related_documents_by_vector_similarity(query_ko, top_n=3):
             "filepath": meta.get('source_filepath', 'N/A'),
             "filename": filename,
             "context_text_en": translated_en_chunk, # 컨텍스트로 사용할 영어 텍스트
-            "original_text_ko": meta.get('original_text_ko', ''), # 참고용 원본 한국어
+            "original_text_ko": original_ko_chunk, # 참고용 원본 한국어
             "score": 1 - distance # 코사인 거리 -> 유사도 (0~1, 클수록 유사)
         })
     
@@ -707,14 +792,17 @@ def main():
         traceback.print_exc()
         return
 
-
     model_to_use = DEFAULT_OLLAMA_MODEL # LLM 모델
+    # 메뉴를 고르는 동안 LLM 모델을 미리 메모리에 올려 첫 요청의 모델 로드 지연을 없앱니다.
+    threading.Thread(target=get_ollama_client(OLLAMA_API_URL).preload, args=(model_to_use,),
+                     name="ollama-preload", daemon=True).start()
 
     task_mapping = {
         '1': 'summarize', '2': 'memo', '3': 'keyword', '4': 'chat',
         '5': 'comparison', # 키워드 로그 기반 비교
         '6': 'index',      # 문서 벡터 인덱싱 (SentenceTransformer + ChromaDB)
         '7': 'related_task_vector_rag', # 벡터 RAG 기반 작업
+        '8': 'watch',      # 문서 감시 + 증분 인덱싱
     }
 
     # 로그/문서 디렉토리 생성 (이미 맨 위에서 처리)
@@ -733,6 +821,7 @@ def main():
         print("--- 문서 관리 & RAG ---")
         print(f"6. 문서 벡터 인덱싱 (index) ['{DOC_DIR}' 내 .md -> 영어 번역 -> SBERT 임베딩 -> ChromaDB 저장]")
         print(f"7. 주제 관련 작업 (RAG) [벡터 DB 검색 기반, 영어 컨텍스트 활용]")
+        print(f"8. 문서 감시 (watch) ['{DOC_DIR}' 변경 시 바뀐 파일만 자동 재인덱싱, Ctrl+C 로 종료]")
         print("exit: 종료")
         print("="*32)
 
@@ -758,6 +847,11 @@ def main():
                 index_documents(DOC_DIR) # 인덱싱 함수는 내부적으로 메시지 출력
                 log_this_interaction = False # 인덱싱 작업은 일반 로그에 남기지 않음
 
+            elif choice == '8':
+                task_name = "watch_vector_db"
+                watch_documents(DOC_DIR) # Ctrl+C 로 감시를 끝내면 메뉴로 돌아옴
+                log_this_interaction = False
+
             elif choice == '7':
                 task_name = task_mapping[choice] # related_task_vector_rag
                 user_query_ko = input("질문 또는 정리할 주제를 입력하세요 (한국어): ")
@@ -0,0 +1,166 @@
+# py/translation_service.py
+
+import os
+import re
+import queue
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from kv_cache import content_hash, get_cache
+
+# --- 1. 설정 ---
+# TRANSLATE_CONCURRENCY : 동시에 보내는 번역 요청 수
+# TRANSLATE_BATCH_CHARS : 한 요청에 묶는 최대 글자 수 (Google 번역 웹 API 한도 약 5000자)
+# TRANSLATE_RETRIES     : 배치 하나의 최대 시도 횟수
+TRANSLATE_CONCURRENCY = int(os.getenv("TRANSLATE_CONCURRENCY", "4"))
+TRANSLATE_BATCH_CHARS = int(os.getenv("TRANSLATE_BATCH_CHARS", "4500"))
+TRANSLATE_RETRIES = int(os.getenv("TRANSLATE_RETRIES", "3"))
+BASE_BACKOFF_SECONDS = 1.0
+
+CACHE_NAMESPACE = "translation"
+# 여러 구간을 한 요청으로 보낼 때 구간마다 번호 붙은 태그(<s0>…</s0>)로 감쌉니다.
+# 번역 후 번호로 구간을 찾아 맞추고, 빠지거나 깨진 번호의 구간만 따로 다시 요청합니다.
+# 번역기가 태그 안에 공백을 넣거나 대소문자를 바꾸는 경우도 받아들입니다.
+_SEGMENT_RE = re.compile(r"<\s*s\s*(\d+)\s*>(.*?)<\s*/\s*s\s*\1\s*>", re.IGNORECASE | re.DOTALL)
+
+
+def _wrap_segment(index: int, text: str) -> str:
+    return f"<s{index}>{text}</s{index}>\n"
+
+
+def _segment_overhead(index: int) -> int:
+    return len(_wrap_segment(index, ""))
+
+
+class TranslationService:
+    """
+    googletrans 클라이언트 하나를 재사용하는 번역기입니다.
+    여러 구간을 글자 수 한도까지 한 요청으로 묶고, 묶음들은 동시 요청 수 제한 안에서 병렬로 보냅니다.
+    결과는 (src, dest, 원문 해시) 키로 kv_cache 에 영구 저장되므로 같은 문장은 다시 요청하지 않습니다.
+    """
+
+    def __init__(self, concurrency: int = TRANSLATE_CONCURRENCY, batch_chars: int = TRANSLATE_BATCH_CHARS,
+                 retries: int = TRANSLATE_RETRIES):
+        self.batch_chars = batch_chars
+        self.retries = retries
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="translate")
+        self._stats_lock = threading.Lock()
+        self.requests = 0      # 실제로 보낸 번역 요청 수
+        self.cache_hits = 0    # 캐시에서 찾은 구간 수
+
+    def _translator(self):
+        with self._client_lock:
+            if self._client is None:
+                from googletrans import Translator
+                self._client = Translator()
+            return self._client
+
+    def _request(self, text: str, src: str, dest: str) -> str:
+        with self._stats_lock:
+            self.requests += 1
+        translation = self._translator().translate(text, src=src, dest=dest)
+        if translation is None or getattr(translation, "text", None) is None:
+            raise ValueError(f"번역 결과가 예상과 다릅니다: {translation}")
+        return translation.text
+
+    def _translate_batch(self, batch: list[str], src: str, dest: str) -> list[str]:
+        if len(batch) == 1:
+            return [self._request(batch[0], src, dest)]
+        translated = self._request("".join(_wrap_segment(i, text) for i, text in enumerate(batch)), src, dest)
+        found = {}
+        for match in _SEGMENT_RE.finditer(translated):
+            index = int(match.group(1))
+            if index < len(batch):
+                # 같은 번호가 두 번 나오면 어느 쪽이 맞는지 알 수 없으므로 그 구간은 다시 요청합니다.
+                found[index] = None if index in found else match.group(2).strip()
+        missing = [i for i in range(len(batch)) if found.get(i) is None]
+        if missing:
+            print(f"[경고] 묶음 번역에서 {len(missing)}/{len(batch)}개 구간의 태그가 맞지 않아 구간별로 다시 요청합니다.")
+            for i in missing:
+                found[i] = self._request(batch[i], src, dest)
+        return [found[i] for i in range(len(batch))]
+
+    def _make_batches(self, texts: list[str]) -> list[list[str]]:
+        batches, current, size = [], [], 0
+        for text in texts:
+            if current and size + len(text) + _segment_overhead(len(current)) > self.batch_chars:
+                batches.append(current)
+                current, size = [], 0
+            size += len(text) + _segment_overhead(len(current))
+            current.append(text)
+        if current:
+            batches.append(current)
+        return batches
+
+    def translate_many(self, texts: list[str], src: str, dest: str) -> list[str | None]:
+        """
+        texts 를 번역해 같은 순서로 반환합니다. 모든 시도가 실패한 구간은 None 입니다.
+        src 가 'auto' 이면 언어 감지를 따로 요청하지 않고 번역 요청에서 함께 감지합니다.
+        """
+        unique = list(dict.fromkeys(text for text in texts if text and text.strip()))
+        keys = {text: content_hash(src, dest, text) for text in unique}
+        cache = get_cache()
+        cached = cache.get_many(CACHE_NAMESPACE, list(keys.values()))
+        results = {text: cached[keys[text]] for text in unique if keys[text] in cached}
+        with self._stats_lock:
+            self.cache_hits += len(results)
+
+        missing = [text for text in unique if text not in results]
+        if missing:
+            translated = self._run_batches(self._make_batches(missing), src, dest)
+            cache.set_many(CACHE_NAMESPACE, {keys[text]: value for text, value in translated.items()})
+            results.update(translated)
+
+        return [(text if not (text and text.strip()) else results.get(text)) for text in texts]
+
+    def _run_batches(self, batches: list[list[str]], src: str, dest: str) -> dict:
+        """
+        묶음들을 병렬로 보냅니다. 실패한 묶음은 지터 백오프 후 타이머로 다시 제출하므로,
+        기다리는 동안 작업 스레드를 붙잡지 않고 다른 묶음이 계속 진행됩니다.
+        """
+        done = queue.Queue()
+
+        def run(batch, attempt):
+            try:
+                done.put((batch, attempt, self._translate_batch(batch, src, dest), None))
+            except Exception as e:
+                done.put((batch, attempt, None, e))
+
+        for batch in batches:
+            self._pool.submit(run, batch, 0)
+
+        translated, outstanding = {}, len(batches)
+        while outstanding:
+            batch, attempt, result, error = done.get()
+            if error is None:
+                translated.update(zip(batch, result))
+                outstanding -= 1
+                continue
+            if attempt + 1 < self.retries:
+                delay = random.uniform(0, BASE_BACKOFF_SECONDS * (2 ** attempt))
+                print(f"[경고] 번역 실패 ({len(batch)}개 구간, 시도 {attempt + 1}/{self.retries}): "
+                      f"{type(error).__name__} - {error}. {delay:.1f}초 후 재시도")
+                threading.Timer(delay, self._pool.submit, (run, batch, attempt + 1)).start()
+                continue
+            print(f"[오류] {self.retries}번 시도 후 번역 실패 ({len(batch)}개 구간): {error}")
+            outstanding -= 1
+        return translated
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {"requests": self.requests, "cache_hits": self.cache_hits}
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_translation_service() -> TranslationService:
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = TranslationService()
+        return _service
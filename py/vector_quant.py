@@ -0,0 +1,295 @@
+# py/vector_quant.py
+
+import os
+import sqlite3
+import threading
+import numpy as np
+
+from app_paths import get_cache_dir
+
+# --- 1. 설정 ---
+# EMBEDDING_OUTPUT_DIM: 임베딩을 앞쪽 N차원만 남기고 다시 정규화합니다 (0 또는 미설정이면 모델 기본 768차원 그대로).
+#   text-embedding-004 는 Matryoshka 방식으로 학습되어 앞쪽 차원만으로도 대부분의 검색 품질이 유지됩니다 (256 권장).
+#   설정하면 벡터 공간이 바뀌므로 Chroma 컬렉션(langchain_d{N})을 새로 만들며, 노트를 다시 임베딩해야 검색 결과가 나옵니다.
+# EMBEDDING_STORAGE_TIER: 메모리에 올려 두는 검색용 벡터의 저장 방식 (i8 / f16 / f32)
+# EMBEDDING_STORE_FULL: 1(기본)이면 양자화 값과 함께 float32 벡터도 저장해 상위 후보를 원래 정밀도로 다시 채점합니다.
+#   0 이면 양자화 값만 저장해 디스크를 더 줄이고 (i8 기준 float32 대비 약 1/4), 근사 점수를 그대로 씁니다.
+#   f32 저장 방식에서는 양자화 값이 곧 원래 정밀도이므로 따로 저장하지 않습니다.
+# EMBEDDING_RESCORE_FACTOR: 근사 점수로 top-k * factor 개 후보를 고른 뒤 원래 정밀도로 다시 채점합니다.
+# EMBEDDING_SCORE_BLOCK_ROWS: 점수 계산 때 한 번에 float32 로 펼치는 행 수 (메모리 사용량 상한)
+EMBEDDING_OUTPUT_DIM = int(os.getenv("EMBEDDING_OUTPUT_DIM", "0")) or None
+STORAGE_TIER = os.getenv("EMBEDDING_STORAGE_TIER", "i8").lower()
+STORE_FULL = os.getenv("EMBEDDING_STORE_FULL", "1") == "1"
+RESCORE_FACTOR = int(os.getenv("EMBEDDING_RESCORE_FACTOR", "4"))
+SCORE_BLOCK_ROWS = int(os.getenv("EMBEDDING_SCORE_BLOCK_ROWS", "2048"))
+STORE_DB_FILENAME = "memordo_vectors.sqlite3"
+
+SUPPORTED_TIERS = ("i8", "f16", "f32")
+
+
+def reduce_dimension(vector, dim: int | None = None) -> list[float]:
+    """앞쪽 dim 차원만 남기고 L2 정규화합니다. dim 이 없거나 벡터가 이미 그보다 짧으면 그대로 반환합니다."""
+    dim = dim or EMBEDDING_OUTPUT_DIM
+    if not dim or vector is None or len(vector) <= dim:
+        return vector
+    truncated = np.asarray(vector[:dim], dtype=np.float32)
+    norm = float(np.linalg.norm(truncated))
+    return (truncated / norm if norm else truncated).tolist()
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+# --- 2. 양자화 ---
+def quantize(matrix: np.ndarray, tier: str = STORAGE_TIER) -> tuple[np.ndarray, np.ndarray]:
+    """
+    (n, d) float 행렬을 저장 방식에 맞게 변환해 (codes, scales)를 반환합니다.
+    i8 은 행마다 대칭 스케일(max|x| / 127)을 쓰고, f16/f32 의 scales 는 모두 1 입니다.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    if tier == "i8":
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    dtype = np.float16 if tier == "f16" else np.float32
+    return matrix.astype(dtype), np.ones(len(matrix), dtype=np.float32)
+
+
+def dequantize(codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    return codes.astype(np.float32) * scales[:, None]
+
+
+def _row_blocks(n: int, block_rows: int = SCORE_BLOCK_ROWS):
+    block_rows = max(1, block_rows)
+    for start in range(0, n, block_rows):
+        yield start, min(n, start + block_rows)
+
+
+class QuantizedMatrix:
+    """
+    메모리에는 양자화된 벡터만 두고 근사 점수로 후보를 고른 뒤,
+    full_lookup(ids) 가 돌려주는 원래 정밀도 벡터로 상위 후보만 다시 채점합니다.
+    """
+
+    def __init__(self, ids: list[str], codes: np.ndarray, scales: np.ndarray, full_lookup=None):
+        self.ids = list(ids)
+        self.codes = codes
+        self.scales = scales
+        self.full_lookup = full_lookup
+        # 코사인 유사도를 내적 하나로 계산할 수 있도록 역양자화 후 노름을 미리 구해 둡니다 (블록 단위로 펼침).
+        self._norms = np.ones(len(self.ids), dtype=np.float32)
+        for start, stop in _row_blocks(len(self.ids)):
+            norms = np.linalg.norm(dequantize(codes[start:stop], scales[start:stop]), axis=1)
+            norms[norms == 0] = 1.0
+            self._norms[start:stop] = norms
+
+    @classmethod
+    def from_vectors(cls, ids: list[str], vectors, tier: str = STORAGE_TIER, full_lookup=None):
+        codes, scales = quantize(np.asarray(vectors, dtype=np.float32), tier)
+        return cls(ids, codes, scales, full_lookup)
+
+    def nbytes(self) -> int:
+        return int(self.codes.nbytes + self.scales.nbytes)
+
+    def _unit_block(self, start: int, stop: int) -> np.ndarray:
+        """start:stop 행을 역양자화해 단위 벡터로 만든 float32 블록입니다."""
+        return dequantize(self.codes[start:stop], self.scales[start:stop]) / self._norms[start:stop, None]
+
+    def _approx_scores(self, query: np.ndarray) -> np.ndarray:
+        query = np.asarray(query, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        scores = np.empty(len(self.ids), dtype=np.float32)
+        for start, stop in _row_blocks(len(self.ids)):
+            scores[start:stop] = self.codes[start:stop].astype(np.float32) @ query
+        return scores * self.scales / self._norms
+
+    def search(self, query, k: int = 10, rescore: bool = True) -> list[tuple[str, float]]:
+        """코사인 유사도 상위 k 개를 (id, 점수)로 반환합니다."""
+        if not self.ids:
+            return []
+        scores = self._approx_scores(query)
+        candidates = min(len(self.ids), k * RESCORE_FACTOR if rescore and self.full_lookup else k)
+        top = np.argpartition(-scores, candidates - 1)[:candidates]
+
+        if rescore and self.full_lookup:
+            candidate_ids = [self.ids[i] for i in top]
+            full = self.full_lookup(candidate_ids)
+            exact = cosine_against(query, np.asarray([full[cid] for cid in candidate_ids], dtype=np.float32))
+            order = np.argsort(-exact)[:k]
+            return [(candidate_ids[i], float(exact[i])) for i in order]
+
+        order = top[np.argsort(-scores[top])][:k]
+        return [(self.ids[i], float(scores[i])) for i in order]
+
+    def pairs_above(self, threshold: float, margin: float = 0.02) -> list[tuple[str, str, float]]:
+        """
+        유사도가 threshold 를 넘는 모든 쌍을 찾습니다.
+        행렬 전체를 float32 로 펼치지 않고 블록 쌍(i <= j)마다 근사 유사도를 계산하며,
+        full_lookup 이 있으면 근사 점수가 threshold - margin 을 넘는 쌍만 원래 정밀도로 다시 확인합니다.
+        """
+        if len(self.ids) < 2:
+            return []
+        cutoff = threshold if self.full_lookup is None else threshold - margin
+        rows, cols, approx = [], [], []
+        blocks = list(_row_blocks(len(self.ids)))
+        for bi, (row_start, row_stop) in enumerate(blocks):
+            left = self._unit_block(row_start, row_stop)
+            for col_start, col_stop in blocks[bi:]:
+                right = left if col_start == row_start else self._unit_block(col_start, col_stop)
+                sims = left @ right.T
+                mask = sims > cutoff
+                if col_start == row_start:
+                    mask = np.triu(mask, k=1)
+                i, j = np.nonzero(mask)
+                rows.extend((i + row_start).tolist())
+                cols.extend((j + col_start).tolist())
+                approx.extend(sims[i, j].tolist())
+        if not rows:
+            return []
+
+        if self.full_lookup is None:
+            return [(self.ids[i], self.ids[j], float(sim)) for i, j, sim in zip(rows, cols, approx)]
+
+        involved = sorted(set(rows) | set(cols))
+        full = self.full_lookup([self.ids[i] for i in involved])
+        exact = {i: np.asarray(full[self.ids[i]], dtype=np.float32) for i in involved}
+        exact = {i: vec / (np.linalg.norm(vec) or 1.0) for i, vec in exact.items()}
+        result = []
+        for i, j in zip(rows, cols):
+            sim = float(exact[i] @ exact[j])
+            if sim > threshold:
+                result.append((self.ids[i], self.ids[j], sim))
+        return result
+
+
+def cosine_against(query, matrix: np.ndarray) -> np.ndarray:
+    query = np.asarray(query, dtype=np.float32)
+    query = query / (np.linalg.norm(query) or 1.0)
+    return normalize_rows(np.asarray(matrix, dtype=np.float32)) @ query
+
+
+# --- 3. 영속 저장소 ---
+class VectorStore:
+    """
+    내용 해시 -> 임베딩을 SQLite에 저장합니다.
+    검색용 양자화 벡터(codes, scale)와 함께, store_full 이면 float32 벡터도 저장하고
+    재채점할 후보만 그 열에서 읽습니다. 저장하지 않은 행의 full 열은 빈 BLOB 입니다.
+    """
+
+    def __init__(self, path: str | None = None, tier: str = STORAGE_TIER, store_full: bool = STORE_FULL):
+        if tier not in SUPPORTED_TIERS:
+            print(f"[경고] 지원하지 않는 EMBEDDING_STORAGE_TIER '{tier}', i8 을 사용합니다.")
+            tier = "i8"
+        self.tier = tier
+        # f32 는 양자화 값이 곧 원래 정밀도이므로 따로 저장하지 않습니다.
+        self.store_full = store_full and tier != "f32"
+        self.path = path or os.path.join(get_cache_dir(), STORE_DB_FILENAME)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS vectors ("
+                " key TEXT PRIMARY KEY, tier TEXT NOT NULL, dim INTEGER NOT NULL,"
+                " codes BLOB NOT NULL, scale REAL NOT NULL, full BLOB NOT NULL DEFAULT x'')"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _select(self, columns: str, keys: list[str]) -> list[tuple]:
+        rows = []
+        conn = self._connect()
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            rows.extend(conn.execute(
+                f"SELECT key, {columns} FROM vectors WHERE key IN ({','.join('?' * len(batch))})", batch
+            ).fetchall())
+        return rows
+
+    def put_many(self, items: dict):
+        """{key: vector} 를 저장합니다."""
+        items = {key: vec for key, vec in items.items() if vec is not None and len(vec)}
+        if not items:
+            return
+        keys = list(items)
+        matrix = np.asarray([items[key] for key in keys], dtype=np.float32)
+        codes, scales = quantize(matrix, self.tier)
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO vectors (key, tier, dim, codes, scale, full) VALUES (?, ?, ?, ?, ?, ?)",
+                [(key, self.tier, matrix.shape[1], codes[i].tobytes(), float(scales[i]),
+                  matrix[i].tobytes() if self.store_full else b"")
+                 for i, key in enumerate(keys)],
+            )
+
+    def get_quantized(self, keys: list[str]) -> dict:
+        """{key: (codes, scale)} — 저장 방식이 현재 설정과 다른 행은 없는 것으로 취급합니다."""
+        dtype = {"i8": np.int8, "f16": np.float16, "f32": np.float32}[self.tier]
+        return {
+            key: (np.frombuffer(codes, dtype=dtype), scale)
+            for key, tier, codes, scale in self._select("tier, codes, scale", keys) if tier == self.tier
+        }
+
+    def get_full(self, keys: list[str]) -> dict:
+        """원래 정밀도 벡터가 저장된 키만 반환합니다."""
+        return {key: np.frombuffer(full, dtype=np.float32) for key, full in self._select("full", keys) if full}
+
+    def nbytes_per_row(self) -> float:
+        """행 하나가 실제로 차지하는 평균 디스크 크기(바이트)입니다 (SQLite 페이지/색인 오버헤드 포함)."""
+        conn = self._connect()
+        rows = conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+        if not rows:
+            return 0.0
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        pages = conn.execute("PRAGMA page_count").fetchone()[0] - conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return page_size * pages / rows
+
+    def load_matrix(self, ids: list[str], keys: list[str]) -> QuantizedMatrix:
+        """ids[i] 의 벡터가 keys[i] 에 저장되어 있을 때, 재채점이 연결된 QuantizedMatrix 를 만듭니다."""
+        quantized = self.get_quantized(keys)
+        present = [(doc_id, key) for doc_id, key in zip(ids, keys) if key in quantized]
+        if not present:
+            return QuantizedMatrix([], np.zeros((0, 0), dtype=np.int8), np.zeros(0, dtype=np.float32))
+        key_of = dict(present)
+        codes = np.stack([quantized[key][0] for _, key in present])
+        scales = np.asarray([quantized[key][1] for _, key in present], dtype=np.float32)
+        if not self.store_full:
+            return QuantizedMatrix([doc_id for doc_id, _ in present], codes, scales)
+
+        def full_lookup(doc_ids):
+            # store_full 을 켜기 전에 저장된 행은 원래 정밀도 벡터가 없으므로 양자화 값을 그대로 씁니다.
+            full = self.get_full([key_of[doc_id] for doc_id in doc_ids])
+            result = {}
+            for doc_id in doc_ids:
+                vector = full.get(key_of[doc_id])
+                if vector is None:
+                    code, scale = quantized[key_of[doc_id]]
+                    vector = code.astype(np.float32) * scale
+                result[doc_id] = vector
+            return result
+
+        return QuantizedMatrix([doc_id for doc_id, _ in present], codes, scales, full_lookup)
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_vector_store() -> VectorStore:
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = VectorStore()
+        return _default_store
@@ -0,0 +1,92 @@
+# py/warmup.py
+
+import os
+import sys
+import time
+import threading
+
+import gemini_ai
+from startup import lazy_import
+
+# --- 1. 구성 요소 상태 ---
+# pending: 아직 준비 전 / warming: 준비 중 / ready: 준비 완료 / error: ...: 실패
+COMPONENTS = ["gemini_client", "rag_workflow_module", "llm_clients", "embedding_client", "vectorstore", "workflow_graph"]
+
+_state = {name: "pending" for name in COMPONENTS}
+_state_lock = threading.Lock()
+_warmup_lock = threading.Lock()
+_last_warmup = {"started_at": None, "seconds": None}
+
+
+def _set(name: str, value: str):
+    with _state_lock:
+        _state[name] = value
+
+
+def reset():
+    """API 키가 바뀌었을 때 호출합니다. 이전 키로 만든 클라이언트 캐시를 비우고 상태를 초기화합니다."""
+    rag_workflow = sys.modules.get("rag_workflow")
+    if rag_workflow is not None:
+        rag_workflow.reset_clients()
+    with _state_lock:
+        for name in COMPONENTS:
+            _state[name] = "pending"
+
+
+# --- 2. 워밍업 실행 ---
+def run_warmup() -> dict:
+    """
+    첫 채팅 요청이 치르던 초기화 비용(클라이언트 생성, Chroma/HNSW 로드, 그래프 컴파일)을 미리 치릅니다.
+    동시에 여러 번 호출되면 먼저 시작한 워밍업이 끝날 때까지 기다린 뒤 상태를 반환합니다.
+    """
+    with _warmup_lock:
+        started = time.perf_counter()
+        _last_warmup["started_at"] = time.time()
+
+        _set("gemini_client", "warming")
+        if gemini_ai.LLM_CLIENT is None:
+            api_key = gemini_ai.GEMINI_API_KEY or os.getenv("GOOGLE_API_KEY")
+            if not api_key or not gemini_ai.initialize_ai_client(api_key):
+                _set("gemini_client", "error: AI client has not been initialized")
+                for name in COMPONENTS[1:]:
+                    _set(name, "pending")
+                return readiness()
+        _set("gemini_client", "ready")
+
+        _set("rag_workflow_module", "warming")
+        try:
+            rag_workflow = lazy_import("rag_workflow")
+            _set("rag_workflow_module", "ready")
+        except Exception as e:
+            _set("rag_workflow_module", f"error: {e}")
+            return readiness()
+
+        for name in COMPONENTS[2:]:
+            _set(name, "warming")
+        for name, value in rag_workflow.warmup().items():
+            _set(name, value)
+
+        _last_warmup["seconds"] = round(time.perf_counter() - started, 3)
+        print(f"[정보] 워밍업 완료 ({_last_warmup['seconds']}초): {snapshot()}")
+        return readiness()
+
+
+def start_warmup_async():
+    thread = threading.Thread(target=run_warmup, name="memordo-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+# --- 3. 준비 상태 조회 ---
+def snapshot() -> dict:
+    with _state_lock:
+        return dict(_state)
+
+
+def readiness() -> dict:
+    components = snapshot()
+    return {
+        "ready": all(value == "ready" for value in components.values()),
+        "components": components,
+        "last_warmup": dict(_last_warmup),
+    }
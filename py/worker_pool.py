@@ -0,0 +1,315 @@
+# py/worker_pool.py
+
+import os
+import sys
+import json
+import mmap
+import time
+import signal
+import socket
+import struct
+import threading
+import contextlib
+import multiprocessing
+
+# --- 1. 설정 ---
+# MEMORDO_WORKERS         : 워커 프로세스 수 (1 이면 기존처럼 단일 프로세스)
+# MEMORDO_THREADS         : 워커 하나의 waitress 스레드 수
+# MEMORDO_GRACEFUL_TIMEOUT: 종료/재시작 시 진행 중인 요청을 기다리는 최대 시간(초)
+# MEMORDO_PRELOAD=1       : 마스터에서 app 을 미리 import 한 뒤 fork (메모리 공유는 늘지만 재시작 시 코드가 다시 로드되지 않음)
+# MEMORDO_RESPAWN_BACKOFF : 워커가 빨리 죽을 때 다시 띄우기 전 대기 시간의 시작값(초). 연속으로 죽을 때마다 두 배 (최대 MEMORDO_RESPAWN_BACKOFF_MAX)
+# MEMORDO_QUICK_FAILURE_SECONDS: 시작 후 이 시간 안에 죽으면 '빠른 실패'로 셉니다 (그보다 오래 살았으면 카운트 초기화)
+# MEMORDO_MAX_QUICK_FAILURES  : 빠른 실패가 연속 이 횟수에 이르면 다시 띄우기를 포기하고 마스터를 종료합니다
+WORKER_COUNT = max(1, int(os.getenv("MEMORDO_WORKERS", "1")))
+WORKER_THREADS = int(os.getenv("MEMORDO_THREADS", "8"))
+GRACEFUL_TIMEOUT = float(os.getenv("MEMORDO_GRACEFUL_TIMEOUT", "30"))
+PRELOAD = os.getenv("MEMORDO_PRELOAD", "0") == "1"
+RESPAWN_BACKOFF = float(os.getenv("MEMORDO_RESPAWN_BACKOFF", "0.5"))
+RESPAWN_BACKOFF_MAX = float(os.getenv("MEMORDO_RESPAWN_BACKOFF_MAX", "30"))
+QUICK_FAILURE_SECONDS = float(os.getenv("MEMORDO_QUICK_FAILURE_SECONDS", "10"))
+MAX_QUICK_FAILURES = int(os.getenv("MEMORDO_MAX_QUICK_FAILURES", "5"))
+
+SHARED_STATE_SIZE = 16384
+_HEADER = struct.Struct("<Q")  # 세대 번호 (내용이 바뀔 때마다 증가)
+_INDEX_GENERATION = struct.Struct("<Q")  # 색인 세대 번호 (어느 워커든 Chroma 에 커밋할 때마다 증가)
+_DATA_OFFSET = _HEADER.size + _INDEX_GENERATION.size
+
+
+# --- 2. 워커 간 공유 상태 ---
+class SharedState:
+    """
+    fork 전에 만든 익명 공유 메모리(mmap)로 워커들이 작은 런타임 상태(API 키 등)를 공유합니다.
+    디스크에는 아무것도 쓰지 않으며, 요청마다 세대 번호 8바이트만 읽어 변경 여부를 확인합니다.
+    색인 세대 번호는 따로 두어, 색인 커밋이 API 키 같은 상태를 다시 읽게 만들지 않습니다.
+    """
+
+    def __init__(self, size: int = SHARED_STATE_SIZE):
+        self.size = size
+        self._mm = mmap.mmap(-1, size)
+        self._lock = multiprocessing.Lock()
+
+    def generation(self) -> int:
+        return _HEADER.unpack_from(self._mm, 0)[0]
+
+    def index_generation(self) -> int:
+        return _INDEX_GENERATION.unpack_from(self._mm, _HEADER.size)[0]
+
+    def bump_index_generation(self) -> int:
+        with self._lock:
+            generation = self.index_generation() + 1
+            _INDEX_GENERATION.pack_into(self._mm, _HEADER.size, generation)
+            return generation
+
+    def read(self) -> dict:
+        with self._lock:
+            raw = self._mm[_DATA_OFFSET:self.size].split(b"\0", 1)[0]
+        return json.loads(raw) if raw else {}
+
+    def update(self, **values) -> int:
+        with self._lock:
+            raw = self._mm[_DATA_OFFSET:self.size].split(b"\0", 1)[0]
+            state = json.loads(raw) if raw else {}
+            state.update(values)
+            data = json.dumps(state).encode("utf-8") + b"\0"
+            if len(data) > self.size - _DATA_OFFSET:
+                raise ValueError("공유 상태가 너무 큽니다.")
+            generation = _HEADER.unpack_from(self._mm, 0)[0] + 1
+            self._mm[_DATA_OFFSET:_DATA_OFFSET + len(data)] = data
+            _HEADER.pack_into(self._mm, 0, generation)
+            return generation
+
+
+SHARED_STATE = None  # 다중 워커 모드에서만 마스터가 만듭니다.
+_seen_generation = 0
+_local_lock = threading.RLock()
+
+
+def publish_state(**values):
+    """이 워커가 받은 상태 변경(예: /api/initialize 의 API 키)을 다른 워커에 알립니다."""
+    global _seen_generation
+    if SHARED_STATE is not None:
+        _seen_generation = SHARED_STATE.update(**values)
+
+
+def poll_state() -> dict | None:
+    """다른 워커가 상태를 바꿨으면 새 상태를, 아니면 None 을 반환합니다."""
+    global _seen_generation
+    if SHARED_STATE is None:
+        return None
+    generation = SHARED_STATE.generation()
+    if generation == _seen_generation:
+        return None
+    _seen_generation = generation
+    return SHARED_STATE.read()
+
+
+def index_generation() -> int:
+    """모든 워커가 공유하는 색인 세대 번호 (단일 프로세스 모드에서는 항상 0)."""
+    return 0 if SHARED_STATE is None else SHARED_STATE.index_generation()
+
+
+def publish_index_commit() -> int:
+    """
+    이 워커가 공유 색인(Chroma)에 커밋했음을 다른 워커에 알리고 새 색인 세대 번호를 반환합니다.
+    다른 워커는 세대 번호가 바뀐 것을 보고 시작할 때 불러 둔 색인을 다시 엽니다.
+    """
+    return 0 if SHARED_STATE is None else SHARED_STATE.bump_index_generation()
+
+
+@contextlib.contextmanager
+def interprocess_lock(path: str):
+    """여러 워커가 같은 파일 기반 저장소(Chroma 등)에 동시에 쓰지 않도록 잠급니다. POSIX 이외에서는 프로세스 내 잠금만 겁니다."""
+    try:
+        import fcntl
+    except ImportError:
+        with _local_lock:
+            yield
+        return
+    with _local_lock, open(path, "a") as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+# --- 3. 워커 프로세스 ---
+def _busy_channels(server) -> int:
+    from waitress.channel import HTTPChannel
+    return sum(
+        1 for channel in list(server.map.values())
+        if isinstance(channel, HTTPChannel) and (channel.requests or channel.total_outbufs_len)
+    )
+
+
+def _run_worker(sock: socket.socket, load_app, worker_id: int):
+    from waitress.server import create_server
+
+    app = load_app()
+    # channel_request_lookahead 를 켜야 스트리밍 중 클라이언트 연결 종료를 감지해 생성을 취소할 수 있습니다.
+    server = create_server(app, sockets=[sock], threads=WORKER_THREADS, channel_request_lookahead=1)
+
+    def graceful_exit():
+        # 리스너 소켓은 asyncore 루프 스레드에서 닫아야 하므로 trigger 로 넘깁니다.
+        server.trigger.pull_trigger(server.close)
+        deadline = time.monotonic() + GRACEFUL_TIMEOUT
+        while time.monotonic() < deadline and _busy_channels(server):
+            time.sleep(0.1)
+        server.task_dispatcher.shutdown(timeout=5)
+        print(f"[워커 {worker_id}/{os.getpid()}] 종료")
+        sys.stdout.flush()
+        os._exit(0)
+
+    def on_term(signum, frame):
+        threading.Thread(target=graceful_exit, name="memordo-drain", daemon=True).start()
+
+    signal.signal(signal.SIGTERM, on_term)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C 는 마스터가 받아 SIGTERM 으로 전달합니다.
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    print(f"[워커 {worker_id}/{os.getpid()}] 요청 대기 (스레드 {WORKER_THREADS})")
+    server.run()
+    os._exit(0)
+
+
+# --- 4. 마스터 (pre-fork) ---
+class PreforkMaster:
+    """
+    리스너 소켓을 한 번 만들고 워커들을 fork 합니다.
+    SIGHUP: 새 워커를 먼저 띄운 뒤 기존 워커를 순서대로 drain (무중단 재시작)
+    SIGTERM/SIGINT: 모든 워커를 drain 후 종료. 비정상 종료된 워커는 다시 띄웁니다.
+    시작 직후 계속 죽는 워커(import 오류, 포트 문제 등)는 점점 길게 기다렸다 띄우고,
+    연속 MAX_QUICK_FAILURES 번이면 포기하고 종료합니다 (fork 폭주 방지).
+    """
+
+    def __init__(self, load_app, host: str, port: int, workers: int = WORKER_COUNT):
+        self.load_app = load_app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.sock = None
+        self.children = {}   # pid -> worker_id
+        self.started = {}    # pid -> 시작 시각 (time.monotonic)
+        self.retiring = set()
+        self.respawn_at = []  # 다시 띄울 예정 시각 (backoff 대기 중인 워커)
+        self.quick_failures = 0
+        self.gave_up = False
+        self._next_id = 0
+        self._reload = False
+        self._stop = False
+
+    def _listen(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(1024)
+        sock.set_inheritable(True)
+        self.sock = sock
+
+    def _spawn(self):
+        self._next_id += 1
+        worker_id = self._next_id
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _run_worker(self.sock, self.load_app, worker_id)
+            finally:
+                os._exit(1)
+        self.children[pid] = worker_id
+        self.started[pid] = time.monotonic()
+        return pid
+
+    def _terminate(self, pids):
+        for pid in pids:
+            self.retiring.add(pid)
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(pid, signal.SIGTERM)
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker_id = self.children.pop(pid, None)
+            started = self.started.pop(pid, None)
+            if pid in self.retiring:
+                self.retiring.discard(pid)
+            elif worker_id is not None and not self._stop:
+                self._schedule_respawn(worker_id, pid, status, started)
+
+    def _schedule_respawn(self, worker_id: int, pid: int, status: int, started: float | None):
+        now = time.monotonic()
+        if started is not None and now - started < QUICK_FAILURE_SECONDS:
+            self.quick_failures += 1
+        else:
+            self.quick_failures = 0
+        if self.quick_failures >= MAX_QUICK_FAILURES:
+            print(f"[오류] 워커가 시작 후 {QUICK_FAILURE_SECONDS:g}초 안에 연속 {self.quick_failures}번 종료되었습니다 "
+                  f"(마지막: {worker_id}/{pid}, status={status}). 다시 시작하지 않고 마스터를 종료합니다.")
+            self.gave_up = True
+            self._stop = True
+            return
+        delay = min(RESPAWN_BACKOFF_MAX, RESPAWN_BACKOFF * 2 ** (self.quick_failures - 1)) if self.quick_failures else 0.0
+        print(f"[경고] 워커 {worker_id}/{pid} 비정상 종료 (status={status}), {delay:.1f}초 후 다시 시작합니다.")
+        self.respawn_at.append(now + delay)
+
+    def _respawn_due(self):
+        now = time.monotonic()
+        due = [at for at in self.respawn_at if at <= now]
+        self.respawn_at = [at for at in self.respawn_at if at > now]
+        for _ in due:
+            self._spawn()
+
+    def _wait_all(self, timeout: float):
+        deadline = time.monotonic() + timeout
+        while self.children and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        for pid in list(self.children):
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(pid, signal.SIGKILL)
+        self._reap()
+
+    def run(self):
+        global SHARED_STATE
+        self._listen()
+        SHARED_STATE = SharedState()
+        signal.signal(signal.SIGHUP, lambda *_: setattr(self, "_reload", True))
+        signal.signal(signal.SIGTERM, lambda *_: setattr(self, "_stop", True))
+        signal.signal(signal.SIGINT, lambda *_: setattr(self, "_stop", True))
+
+        for _ in range(self.workers):
+            self._spawn()
+        print(f"[마스터 {os.getpid()}] http://{self.host}:{self.port} 에서 워커 {self.workers}개 실행 "
+              f"(재시작: kill -HUP {os.getpid()})")
+
+        while not self._stop:
+            if self._reload:
+                self._reload = False
+                old = list(self.children)
+                self.respawn_at = []  # 새 세대를 전부 띄우므로 대기 중인 재시작은 필요 없습니다.
+                self.quick_failures = 0
+                print(f"[마스터] 재시작: 새 워커 {self.workers}개를 띄운 뒤 기존 워커 {len(old)}개를 drain 합니다.")
+                for _ in range(self.workers):
+                    self._spawn()
+                self._terminate(old)
+            self._reap()
+            if not self._stop:
+                self._respawn_due()
+            try:
+                time.sleep(0.5)
+            except InterruptedError:
+                pass
+
+        print("[마스터] 종료: 진행 중인 요청이 끝나기를 기다립니다.")
+        self._terminate(list(self.children))
+        self._wait_all(GRACEFUL_TIMEOUT + 5)
+        self.sock.close()
+        if self.gave_up:
+            sys.exit(1)
+
+
+def supports_prefork() -> bool:
+    return hasattr(os, "fork") and sys.platform != "win32"
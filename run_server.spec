@@ -4,7 +4,7 @@
 
 a = Analysis(
     ['py/run_server.py'],
-    pathex=[],
+    pathex=['py'],
     binaries=[],
     datas=[('py/.env', '.')],
     hiddenimports=[
@@ -15,7 +15,9 @@ a = Analysis(
         'langgraph',
         'chromadb',
         'google.generativeai',
-        'numpy'
+        'numpy',
+        # app.py 에서 importlib 로 지연 로드하므로 정적 분석에 잡히지 않는 모듈
+        'rag_workflow',
     ],
     hookspath=[],
     hooksconfig={},
@@ -34,7 +36,7 @@ exe = EXE(
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
+    upx=False,  # UPX 압축 해제 비용이 콜드 스타트를 늦추므로 사용하지 않음
     console=False,
     disable_windowed_traceback=False,
     argv_emulation=False,
@@ -48,7 +50,7 @@ coll = COLLECT(
     a.zipfiles,
     a.datas,
     strip=False,
-    upx=True,
+    upx=False,
     upx_exclude=[],
     name='memordo_ai_backend',
 )
\ No newline at end of file